@@ -1,62 +1,248 @@
-""" 
+"""
     Author: Casey Betts, 2023
     This file contains the function to return a pandas dataframe of a given ArcPro layer
-    Note: This script does not support nested layers, so the target layer must not be nested in a group layer 
+    Note: This script does not support nested layers, so the target layer must not be nested in a group layer
+    Layers are read through NumPy structured arrays (TableToNumPyArray), only the requested fields and in chunks if asked,
+    and the arcpy calls are kept in ArcpyReader so an in-memory reader can stand in for them without ArcGIS
 """
 
-import arcpy
+import numpy as np
 import pandas as pd
 
-def create_dataframe(layer_name):
-    """ Searches the map contents for the given layer and returns a dataframe from it """
 
-    # Set variables to current project and map
-    aprx = arcpy.mp.ArcGISProject("current")
-    map = aprx.activeMap
-    
-    # Search layers for the active orders
-    for layer in map.listLayers():
+# Low cardinality text fields, pass them as categories to read_layer to get categoricals
+CATEGORY_FIELDS = ["sap_customer_identifier", "responsiveness_level"]
+
+# Geometry options and the structured array tokens read for them
+GEOMETRY_TOKENS = {"xy": "SHAPE@XY", "centroid": "SHAPE@TRUECENTROID"}
+
+# Field types that cannot be read into a structured array
+SKIPPED_FIELD_TYPES = ["Geometry", "Blob", "Raster"]
+
+# Placeholders for nulls in the structured array, turned back into missing values in the dataframe
+# Each integer type gets the smallest value of the numpy type TableToNumPyArray reads it into
+# The text placeholder is a single control character: it fits any field width, and numpy would drop a NUL (leaving "", a real value)
+NULL_INTEGERS = {"SmallInteger": np.iinfo(np.int16).min, "Integer": np.iinfo(np.int32).min, "BigInteger": np.iinfo(np.int64).min}
+NULL_TEXT = "\x01"
+
+
+class ArcpyReader():
+    """ The arcpy calls used to read layers """
+
+    def __init__(self):
+        import arcpy
+        self.arcpy = arcpy
+
+    def feature_layers(self):
+        """ Returns the feature layers of the active map of the current project """
+
+        map = self.arcpy.mp.ArcGISProject("current").activeMap
+
+        return [layer for layer in map.listLayers() if layer.isFeatureLayer]
+
+    def map_layers(self):
+        """ Returns every layer (feature or not) and standalone table of the active map of the current project """
+
+        map = self.arcpy.mp.ArcGISProject("current").activeMap
+
+        return map.listLayers() + map.listTables()
+
+    def name_string(self, layer):
+        return self.arcpy.Describe(layer).nameString
+
+    def fields(self, layer):
+        """ Returns a list of (name, type) of the fields of the layer """
+
+        return [(field.name, field.type) for field in self.arcpy.ListFields(layer) if field.name]
+
+    def object_id_field(self, layer):
+        return self.arcpy.Describe(layer).OIDFieldName
+
+    def object_ids(self, layer, where_clause=None):
+        """ Returns a sorted numpy array of the object ids of the layer's rows """
+
+        return np.sort(self.arcpy.da.TableToNumPyArray(layer, ["OID@"], where_clause=where_clause)["OID@"])
+
+    def read_array(self, layer, fields, where_clause=None, null_value=None):
+        """ Returns a structured numpy array of the given fields (geometry tokens included) """
+
+        if any(field.startswith("SHAPE@") for field in fields):
+            return self.arcpy.da.FeatureClassToNumPyArray(layer, fields, where_clause=where_clause, null_value=null_value)
+
+        return self.arcpy.da.TableToNumPyArray(layer, fields, where_clause=where_clause, null_value=null_value)
+
+    def read_wkt(self, layer, where_clause=None):
+        """ Returns a dictionary of object id/geometry WKT """
+
+        with self.arcpy.da.SearchCursor(layer, ["OID@", "SHAPE@WKT"], where_clause=where_clause) as cursor:
+            return dict(cursor)
+
+    def message(self, text):
+        self.arcpy.AddMessage(text)
+
+
+def null_values(field_types):
+    """ Returns the null_value mapping used for the given (name, type) fields """
+
+    nulls = dict()
+    for name, field_type in field_types:
+        if field_type in NULL_INTEGERS:
+            nulls[name] = NULL_INTEGERS[field_type]
+        elif field_type in ["Single", "Double"]:
+            nulls[name] = np.nan
+        elif field_type in ["String", "GUID", "GlobalID"]:
+            nulls[name] = NULL_TEXT
+
+    return nulls
+
 
-        if layer.isFeatureLayer:
+def array_to_dataframe(array, field_types, categories):
+    """
+    Returns a dataframe of the structured array with nulls restored and the given text fields as categoricals
 
-            if layer.name == layer_name:
-                break
+    :param array: Numpy structured array read from the layer
+    :param field_types: Dict, field name/arcpy field type
+    :param categories: List, fields to convert to categoricals, none if None
+    """
 
-    # Read the geo database table into pandas dataframe
-    fields = [f.name for f in arcpy.ListFields(layer)]
+    columns = dict()
+
+    for name in array.dtype.names:
+        values = array[name]
+
+        # Geometry points are a nested (x, y) record
+        if values.dtype.names:
+            columns["SHAPE_X"], columns["SHAPE_Y"] = values[values.dtype.names[0]], values[values.dtype.names[1]]
+            continue
+
+        series = pd.Series(values)
+        field_type = field_types.get(name)
+
+        if field_type in NULL_INTEGERS and (values == NULL_INTEGERS[field_type]).any():
+            series = series.astype("Int64").mask(values == NULL_INTEGERS[field_type])
+        elif values.dtype.kind == "U":
+            series = series.astype(object).mask(values == NULL_TEXT, None)
+
+        if categories and name in categories:
+            series = series.astype("category")
+
+        columns[name] = series
+
+    return pd.DataFrame(columns)
+
+
+def read_layer(layer, fields=None, geometry=None, chunk_size=None, categories=None, where_clause=None, reader=None):
+    """
+    Returns a dataframe of the layer, or a generator of dataframes of chunk_size rows when chunk_size is given
+
+    :param layer: Feature Layer, the layer to read
+    :param fields: List, field names to read (every field that fits a structured array if None)
+    :param geometry: String, None to skip the geometry, 'xy' or 'centroid' for SHAPE_X/SHAPE_Y columns, 'wkt' for a SHAPE_WKT column
+    :param chunk_size: Int, number of rows per dataframe
+    :param categories: List, text fields converted to categoricals (e.g. CATEGORY_FIELDS), none if None
+    :param where_clause: String, SQL where clause selecting the rows
+    :param reader: ArcpyReader or a stand-in with the same methods, the arcpy calls (ArcpyReader if None)
+    """
+
+    reader = reader or ArcpyReader()
+    field_types = dict(reader.fields(layer))
+
+    if fields is None:
+        fields = [name for name, field_type in field_types.items() if field_type not in SKIPPED_FIELD_TYPES]
+    else:
+        missing = [field for field in fields if field not in field_types]
+        if missing:
+            raise Exception(f"Fields not found in the layer: {', '.join(missing)}")
+
+    if geometry not in [None, "wkt"] and geometry not in GEOMETRY_TOKENS:
+        raise ValueError(f"Unknown geometry option '{geometry}', use None, 'wkt' or one of {', '.join(GEOMETRY_TOKENS)}")
+
+    read_fields = list(fields) + ([GEOMETRY_TOKENS[geometry]] if geometry in GEOMETRY_TOKENS else []) + (["OID@"] if geometry == "wkt" else [])
+    nulls = null_values([(field, field_types[field]) for field in fields])
+
+    def read(chunk_where):
+        df = array_to_dataframe(reader.read_array(layer, read_fields, chunk_where, nulls), field_types, categories)
+
+        if geometry == "wkt":
+            shapes = reader.read_wkt(layer, chunk_where)
+            df["SHAPE_WKT"] = df.pop("OID@").map(shapes)
+
+        return df
+
+    if chunk_size is None:
+        return read(where_clause)
+
+    return read_chunks(layer, read, chunk_size, where_clause, reader)
+
+
+def read_chunks(layer, read, chunk_size, where_clause, reader):
+    """ Yields the dataframes of consecutive object id ranges of chunk_size rows """
+
+    object_ids = reader.object_ids(layer, where_clause)
+    oid_field = reader.object_id_field(layer)
+    start = 0
+
+    for first in range(0, len(object_ids), chunk_size):
+        ids = object_ids[first:first + chunk_size]
+        chunk_where = f"{oid_field} >= {ids[0]} AND {oid_field} <= {ids[-1]}"
+        if where_clause:
+            chunk_where = f"({where_clause}) AND {chunk_where}"
+
+        # The index runs on across chunks
+        df = read(chunk_where)
+        df.index = pd.RangeIndex(start, start + len(df))
+        start += len(df)
+
+        yield df
+
+
+def create_dataframe(layer_name, fields=None, reader=None, **options):
+    """
+    Searches the map contents for the given feature layer and returns a dataframe from it
+
+    :param layer_name: String, name of the layer in the active map
+    :param fields: List, field names to read (all fields if None)
+    :param reader: ArcpyReader or a stand-in with the same methods, the arcpy calls (ArcpyReader if None)
+    :param options: geometry, chunk_size, categories and where_clause, see read_layer
+    """
+
+    reader = reader or ArcpyReader()
+
+    # Search layers for the active orders
+    for layer in reader.feature_layers():
+        if getattr(layer, "name", layer) == layer_name:
+            return read_layer(layer, fields, reader=reader, **options)
 
-    with arcpy.da.SearchCursor(layer, fields) as cursor:
-        df = pd.DataFrame(list(cursor), columns=fields)
+    raise Exception(f"Feature layer '{layer_name}' not found in the active map.")
 
-    return df
 
-def find_layer(nameString):
-    """ Returns the layer with the given namestring """
+def find_layer(nameString, reader=None):
+    """
+    Returns the layer or standalone table of the active map with the given namestring, any kind of layer is searched
 
-    arcpy.AddMessage("Looking for: " + nameString)
+    :param nameString: String, the namestring of the layer (e.g. from a tool parameter)
+    :param reader: ArcpyReader or a stand-in with the same methods, the arcpy calls (ArcpyReader if None)
+    """
 
-    # Set variables to current project and map
-    aprx = arcpy.mp.ArcGISProject("current")
-    map = aprx.activeMap
+    reader = reader or ArcpyReader()
+    reader.message("Looking for: " + nameString)
 
-    for layer in map.listLayers():
+    for layer in reader.map_layers():
 
-        if arcpy.Describe(layer).nameString == nameString:
+        if reader.name_string(layer) == nameString:
             return layer
-    
-    arcpy.AddMessage("Could not find " + nameString)
 
-def create_dataframe_from_param(layer):
-    """ Returns a dataframe from the given layer """
+    reader.message("Could not find " + nameString)
 
-    # Read the geo database table into pandas dataframe
-    fields = [f.name for f in arcpy.ListFields(layer)]
 
-    while True:
-        if '' in fields: fields.remove('')
-        else: break
+def create_dataframe_from_param(layer, fields=None, reader=None, **options):
+    """
+    Returns a dataframe from the given layer
 
-    with arcpy.da.SearchCursor(layer, fields) as cursor:
-        df = pd.DataFrame(list(cursor), columns=fields)
+    :param layer: Feature Layer, the layer to read
+    :param fields: List, field names to read (all fields if None)
+    :param reader: ArcpyReader or a stand-in with the same methods, the arcpy calls (ArcpyReader if None)
+    :param options: geometry, chunk_size, categories and where_clause, see read_layer
+    """
 
-    return df
+    return read_layer(layer, fields, reader=reader, **options)
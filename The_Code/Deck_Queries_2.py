@@ -3,10 +3,21 @@
 
 import arcpy
 import os
-import json
-import shutil
+import pandas as pd
 
 from datetime import datetime
+from deck_audit.adapters import read_arcpy_chunks
+from deck_audit.columns import ColumnCalculator, ColumnSpec
+from deck_audit.config import load_config
+from deck_audit.hotlist import load_hotlist
+from deck_audit.incremental import AuditSnapshot, snapshot_key
+from deck_audit.instrumentation import RunRecorder
+from deck_audit.priority import ORDER_FIELDS, REASON_FIELDS
+from deck_audit.publish import ShapefilePublisher
+from deck_audit.results_store import FLAG_COLUMNS, ResultsStore, flag_orders
+from deck_audit.row_filter import export_surviving_rows
+from deck_audit.rules import CHECK_PREFIX, RuleSet
+from deck_audit.schema_plan import SchemaPlanner, export_planned_rows
 from helper_functions import *
 from math import floor 
 from pathlib import Path
@@ -15,21 +26,25 @@ from pathlib import Path
 class Rivedo():
     """ Object used to produce the Rivedo shapefile """
 
-    def __init__(self, active_orders_ufp, hotlist, path, username):
+    def __init__(self, active_orders_ufp, hotlist, path, username, single_pass=True, incremental=False, profile=False, explain=False):
         """ Load and initiate data and vars. Runs main program. 
         
             :param active_orders_ufp: Feature Layer, active orders ufp layer
             :param hotlist: Feature Layer, the hotlist layer
             :param path: String, path to the folder where the config and output folder is kept
+            :param single_pass: Boolean, filter the orders, fill the new columns and write the output in one export rather than through a temp feature class with one CalculateField per column
+            :param incremental: Boolean, diff the orders against the last run's snapshot and only recompute the new columns of inserted and updated orders (implies single_pass), the whole output is still written
+            :param profile: Boolean, run cProfile over the workflow and save the stats next to the run log
+            :param explain: Boolean, also write the reason codes of every flagged order to Rivedo_Reasons.parquet next to the results database
         """
 
         self.config_path = os.path.join(path + "\\The_Code")
         config_name = "Sensitive_Parameters.json"
+        self.config_file = os.path.join(self.config_path, config_name)
 
-
-        # Load .json config file
-        with open(os.path.join(self.config_path, config_name), 'r', errors="ignore") as input:
-            self.config = json.load(input)
+        # Load the .json config file (validated, and only re-read when it has changed since the last run in this session)
+        self.settings = load_config(self.config_file).require("query_input", "customer_info", "new_column_input", "new_mapping_for_existing_fields")
+        self.config = self.settings.parameters
 
         # Define the paths to the parameters and the outputs
         self.temp_loc = arcpy.env.workspace
@@ -38,96 +53,150 @@ class Rivedo():
         self.output_loc = path + r"\Shapefile"
         self.output_name = "Rivedo_orders"
         self.staging_location = os.path.join(path, "Shapefile_Staging")
+        self.versions_location = os.path.join(path, "Shapefile_Versions")
+        self.snapshot_location = os.path.join(os.path.dirname(self.temp_loc), "Rivedo_snapshot")
+        self.hotlist_index_file = os.path.join(os.path.dirname(self.temp_loc), "Rivedo_hotlist.npz")
+        self.schema_plans = SchemaPlanner(os.path.join(os.path.dirname(self.temp_loc), "Rivedo_schema_plans.json"))
         self.active_orders_ufp = active_orders_ufp
         self.hotlist = hotlist
         self.row_count = 0
         self.username = username
-        self.metrics = dict()
+        self.single_pass = single_pass or incremental
+        self.incremental = incremental
+        self.metrics = None
+        self.removed = dict()
+        self.snapshot_counts = None
+        self.plan = None
+        self.kept_orders = None
+        self.run_log_file = "Rivedo_Log.jsonl"
+        self.results_file = "Rivedo_Results.sqlite"
+        self.reasons_file = "Rivedo_Reasons.parquet"
+        self.explain = explain or self.config.get("explain", False)
+        self.published = False
+
+        # Staging and versions sit next to the shared folder so the publish is a rename on the same volume
+        self.publisher = ShapefilePublisher(self.output_loc, self.output_name, self.staging_location, self.versions_location,
+                                            self.config.get("publish_versions", 3))
+
+        # Times each stage of the run, written next to Rivedo_Log.txt at the end
+        self.recorder = RunRecorder("Rivedo", profile, username=username, single_pass=self.single_pass, incremental=incremental)
+
+        # The run is logged even when a stage fails, with the error
+        try:
+            # Produce active customer dict
+            with self.recorder.stage("produce_cust_info") as stage:
+                self.active_cust_info = self.produce_cust_info()
+                stage["rows_out"] = len(self.active_cust_info)
+
+            # Get the active map document and data frame
+            self.project = arcpy.mp.ArcGISProject("CURRENT")
+            self.map = self.project.activeMap
+
+            # Load the hotlist solis, from the saved index unless the hotlist has changed since the last run
+            with self.recorder.stage("hotlist") as stage:
+                hotlist_solis = load_hotlist(self.hotlist, self.hotlist_index_file)
+                stage["rows_out"] = len(hotlist_solis)
+
+            # Compile the rules used to remove orders before any columns are computed and the metrics, the "rules" config section or the legacy settings
+            self.rules = RuleSet.from_config(self.config, {"hotlist": hotlist_solis})
+
+            # Call functions
+            self.run_workflow()
+
+        except Exception as error:
+            self.log_stages(error)
+            raise
+
+        self.log_stages()
 
-        # Produce active customer dict
-        self.active_cust_info = self.produce_cust_info()
+    def add_columns_to_feature_class(self, active_customer_info):
+        """
+        Adds the given columns to the given feature layer
 
-        # Get the active map document and data frame
-        self.project = arcpy.mp.ArcGISProject("CURRENT")
-        self.map = self.project.activeMap
+        :param active_customer_info: Dictionary, dictionary with key/value pairs of customer id/customer name
+        """
 
-        # Create hotlist soli list and where clause string
-        hotlist_solis = self.get_field_values(self.hotlist, "soli")
+        for new_column in self.settings.new_columns:
 
-        # Create vars for the rivedo priority and high_low from the configs 
-        rivedo_priority = self.config["new_column_input"]["Rivedo_Priority"]["field_name"]
-        high_low = self.config["new_column_input"]["High_Low"]["field_name"]
+            code_block = self.column_code_block(new_column, active_customer_info)
 
-        # Create a list of where clauses to select rows to delete
-        self.delete_clauses = ["tasking_priority" + f" = {rivedo_priority} And {high_low} <> 'Low' And {high_low} <> 'High' ", 
-                              "tasking_priority" + " IN " + "(" + ",".join(str(num) for num in self.config["excluded_priorities"]) + ")", 
-                              "ge01 = 0 And wv01 = 0 And wv02 = 0 And wv03 = 0",
-                              "sap_customer_identifier" + " IN " + "(" + ",".join("'"+str(num)+"'" for num in self.config["customer_info"]["idi_customers"]) + ")", 
-                              "external_id" + " IN " + "(" + ",".join("'"+str(num)+"'" for num in hotlist_solis) + ")"]
+            # Add column to feature class
+            arcpy.AddMessage("Adding Column: " + new_column.field_name)
+            arcpy.management.CalculateField(self.temp_feature_class, new_column.field_name, new_column.expression, "PYTHON3", code_block, new_column.field_type)
 
-        # Call functions
-        self.run_workflow()
+    def column_calculator(self, active_customer_info):
+        """
+        Returns the ColumnCalculator of all new columns of the config
 
-    def add_columns_to_feature_class(self, active_customer_info):
+        :param active_customer_info: Dictionary, dictionary with key/value pairs of customer id/customer name
         """
-        Adds the given columns to the given feature layer
 
+        specs = [ColumnSpec(new_column.field_name, new_column.field_type, new_column.expression, self.column_code_block(new_column, active_customer_info))
+                 for new_column in self.settings.new_columns]
+
+        return ColumnCalculator(specs)
+
+    def column_code_block(self, new_column, active_customer_info):
+        """
+        Returns the code block string for the given new column
+
+        :param new_column: NewColumn, the entry of the new_column_input config
         :param active_customer_info: Dictionary, dictionary with key/value pairs of customer id/customer name
         """
 
-        for new_column in self.config["new_column_input"]:
-            
-            # Create column specific vars
-            field_name = self.config["new_column_input"][new_column]["field_name"]
-            expression = self.config["new_column_input"][new_column]["expression"]
-            config_reqs = self.config["new_column_input"][new_column]["config_reqs"]
-            field_type = self.config["new_column_input"][new_column]["field_type"]
-
-            # Create code block string
-            with open(os.path.join(self.config_path, self.config["new_column_input"][new_column]['column_function']), 'r') as data:
-                column_function = data.read()
-            
-            if config_reqs == "active_customer_info":
-                code_block = "active_customer_info = " + str(active_customer_info) + "\n"
-            else:
-                code_block = config_reqs + " = " + str(self.config[config_reqs]) + "\n"
+        config_reqs = new_column.config_reqs
 
-            code_block = code_block + column_function
+        # Read the column function
+        with open(os.path.join(self.config_path, new_column.column_function), 'r') as data:
+            column_function = data.read()
+        
+        if config_reqs == "active_customer_info":
+            code_block = "active_customer_info = " + str(active_customer_info) + "\n"
+        elif config_reqs == "query_input":
+            code_block = self.customer_index_code_block()
+        else:
+            code_block = config_reqs + " = " + str(self.config[config_reqs]) + "\n"
 
-            # Add column to feature class
-            arcpy.AddMessage("Adding Column: " + field_name)
-            arcpy.management.CalculateField(self.temp_feature_class, field_name, expression, "PYTHON3", code_block, field_type)
+        return code_block + column_function
+
+    def customer_index_code_block(self):
+        """
+        Returns the code block lines that load the compiled customer index as 'index'
+        The index is read from the config file so the code block stays the same size however many customers there are
+        """
+
+        # The code block runs on every tool run in the same Pro session, only add the folder to sys.path once
+        return ("import sys\n"
+                f"if r\"{self.config_path}\" not in sys.path:\n"
+                f"    sys.path.append(r\"{self.config_path}\")\n"
+                "from deck_audit.customer_index import CustomerIndex\n"
+                f"index = CustomerIndex.from_file(r\"{self.config_file}\")\n")
+
+    def plan_output_schema(self, calculator):
+        """
+        Returns the SchemaPlan of the output shapefile: the fields moved to the front, the new columns, then the other fields,
+        with their shapefile names. The plan is only worked out again when the schema of the active orders or the new columns change
+
+        :param calculator: ColumnCalculator, the new columns
+        """
+
+        source_fields = [(field.name, field.type, field.length) for field in arcpy.ListFields(self.active_orders_ufp)
+                         if field.editable and field.type not in ['OID', 'Geometry']]
+        new_columns = [(spec.field_name, spec.field_type) for spec in calculator.specs]
+
+        plan = self.schema_plans.plan(source_fields, new_columns, self.config["new_mapping_for_existing_fields"])
+        arcpy.AddMessage("New field order: " + str(plan.output_names) + (" (cached)" if plan.cached else ""))
+
+        return plan
 
     def produce_field_mapping(self):
         """
-        Creates a field mapping as input for creating a new feature class
+        Creates a field mapping as input for creating a new feature class from the temp feature class
 
         """
         arcpy.env.overwriteOutput = True
 
-        # Get a list of all field names minus the existing ones that will be moved
-        fields = arcpy.ListFields(self.temp_name)
-        field_names = [field.name for field in fields if field.type not in ['OID', 'Geometry'] + self.config["new_mapping_for_existing_fields"]]
-
-        # Determine the new field order
-        number_of_fields_to_move = min(len(self.config["new_column_input"]), len(field_names))  # Ensure we don't try to move more fields than exist
-        arcpy.AddMessage("number of new fields: " + str(number_of_fields_to_move))
-        new_field_order = self.config["new_mapping_for_existing_fields"] + field_names[-number_of_fields_to_move:] + field_names[:-number_of_fields_to_move]
-        arcpy.AddMessage("New field order: " + str(new_field_order))
-
-        # Create a FieldMappings object
-        field_mappings = arcpy.FieldMappings()
-        field_mappings.addTable(self.temp_name)
-
-        # Create a new FieldMappings object with fields in the desired order
-        new_field_mappings = arcpy.FieldMappings()
-        for field_name in new_field_order:
-            field_index = field_mappings.findFieldMapIndex(field_name)
-            if field_index != -1:
-                field_map = field_mappings.getFieldMap(field_index)
-                new_field_mappings.addFieldMap(field_map)
-
-        return new_field_mappings
+        return self.plan.field_mappings(self.temp_name)
     
     def customer_name(self, cust, customer_info):
         """ 
@@ -158,81 +227,39 @@ class Rivedo():
         else:
             raise Exception(f"Source layer '{layer_name}' not found in the TOC.")
         
-    def delete_current_files(self):
+    def publish_output(self):
         """ 
-        Deletes out the files of the given name in the given folder
+        Swaps the staged shapefile into the shared output folder, unless it holds the same data as the published one
         
         """
 
-        for file in self.output_name:
-            file_path = os.path.join(self.output_loc,  file)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                arcpy.AddMessage(f"Deleted: {file}")
+        self.published = self.publisher.publish()
 
-    def move_files(self):
-        """ 
-        Moves all files in a given folder to the given output folder
-        
-        """
+        if self.published:
+            arcpy.AddMessage(f"Published: {os.path.join(self.output_loc, self.output_name)}.shp")
+        else:
+            arcpy.AddMessage("Output unchanged since the last run, the shared shapefile was not replaced")
 
-        for file in os.listdir(self.staging_location):
-            source_path = os.path.join(self.staging_location, file)
-            dest_path = os.path.join(self.output_loc, file)
-            shutil.move(source_path, dest_path)
-         
     def produce_cust_info(self):
         """
         Returns a dictionary of only active customer ids and names
-
-        :param active_orders: Feature Layer, active orders ufp layer
-        :param customer_info: Dict, all customer info from the config file
         """
 
         # Create a set of unique customer IDs
         with arcpy.da.SearchCursor(self.active_orders_ufp, ["sap_customer_identifier"]) as cursor:
-            active_customers = sorted({row[0] for row in cursor})
+            active_customers = {row[0] for row in cursor}
 
-        customer_dict = dict()
-        
-        # For each type of customer filter the dictionary elements down to only those cooresponding with the active customers list
-        # Then combine to to the existing dictionary
-        for customers in self.config["customer_info"]:
-            active_customer_dict = {id:self.config["customer_info"][customers][id] for id in active_customers if id in self.config["customer_info"][customers]}
-            customer_dict.update(active_customer_dict)
-
-        return customer_dict
-
-    def get_field_values(self, layer, field):
-        """ 
-        Returns a list of values from a given field in a given layer
-        
-        :param layer: Feature Layer, the layer with the values to stor in a list
-        :param field: String, the name of the field to gather values from
-        """
-
-        # initialize list
-        values = []
-
-        # Append all values into the list
-        with arcpy.da.SearchCursor(layer, [field]) as cursor:
-            for row in cursor:
-                values.append(row[0])
-
-        return values
+        # One lookup per active customer in the merged id/name dictionary of the config
+        return self.settings.active_customer_info(active_customers)
 
     def get_metrics(self, layer):
         """
-        Find and store metrics in the metric dictionary
+        Returns the metrics result for the given layer, all configured metrics are evaluated in one pass
 
         :param layer: Feature Layer, layer from which to derive the metrics
         """
 
-        for metric in self.config["metrics"]:
-            query = self.config["metrics"][metric][0]
-            if query:
-                arcpy.management.SelectLayerByAttribute(layer, "NEW_SELECTION", query)
-                self.config["metrics"][metric][1] = arcpy.management.GetCount(layer)
+        return self.rules.evaluate_layer(layer)
 
     def display_metrics(self):
         """ 
@@ -243,24 +270,44 @@ class Rivedo():
         arcpy.AddMessage("Number of Unique Customers: " + str(len(self.active_cust_info)))
 
         # Display metrics specified from config file
-        for metric in self.config["metrics"]:
-            arcpy.AddMessage(metric + " : " + str(self.config["metrics"][metric][1]))
+        for metric in self.metrics:
+            arcpy.AddMessage(metric + " : " + str(self.metrics[metric]) + f" ({self.metrics.timings[metric]:.3f} s)")
+
+    def export_filtered_rows(self):
+        """ Exports the orders that pass the row filter to the temp feature class """
 
-    def select_and_delete_rows(self, layer):
-        """ Select and delete rows from the given layer given a list of where clauses
+        self.row_count, self.removed = export_surviving_rows(self.active_orders_ufp, self.temp_feature_class, self.rules)
 
-        :param layer, Feature Layer, the layer to select and delete rows from
+        for rule in self.removed:
+            arcpy.AddMessage(f"Removed ({rule}): {self.removed[rule]}")
+        arcpy.AddMessage("Records: " + str(self.row_count))
+
+    def export_output(self, calculator):
         """
+        Writes the staged output shapefile in a single pass: orders removed by the rules are skipped and the new columns are
+        computed on the way. The fields the metrics and the results store need are kept for the orders written
+
+        :param calculator: ColumnCalculator, the new columns
+        """
+
+        metric_fields = [field for field in self.rules.fields if not field.startswith(CHECK_PREFIX)]
+        collect = list(dict.fromkeys(["external_id"] + ORDER_FIELDS + metric_fields))
+        snapshot = (AuditSnapshot(self.snapshot_location, snapshot_key(self.config_file, calculator), calculator.input_fields, calculator.output_fields)
+                    if self.incremental else None)
 
-        # Select rows to delete
-        for clause in self.delete_clauses:
-            arcpy.management.SelectLayerByAttribute(layer, "ADD_TO_SELECTION", clause)
+        self.publisher.clear_staging()
+        self.row_count, self.removed, rows = export_planned_rows(self.active_orders_ufp, os.path.join(self.staging_location, self.output_name + ".shp"),
+                                                                 self.plan, self.rules, calculator, snapshot, collect)
+        self.kept_orders = pd.DataFrame(rows, columns=collect)
 
-        # Delete selected rows
-        arcpy.management.DeleteFeatures(layer)
+        # Only the inserted, updated and deleted orders are applied to the snapshot
+        if snapshot is not None:
+            snapshot.save()
+            self.snapshot_counts = snapshot.counts()
+            arcpy.AddMessage(snapshot.summary())
 
-        # Get number of rows in the layer file
-        self.row_count = arcpy.management.GetCount(layer)
+        for rule in self.removed:
+            arcpy.AddMessage(f"Removed ({rule}): {self.removed[rule]}")
         arcpy.AddMessage("Records: " + str(self.row_count))
 
     def update_log(self):
@@ -278,44 +325,129 @@ class Rivedo():
             log.write("\n" + self.username + "     " + timestamp + "     ")
             log.write("Records returned: " + str(self.row_count))
 
-    def run_workflow(self):
-        """ This function calls all functions in the needed order to produce final output """
+        # Keep the flagged orders and metrics of the run for the history queries
+        self.record_results()
 
-        # Create a temporary feature class of the orders layer
-        arcpy.conversion.ExportFeatures(self.active_orders_ufp, self.temp_feature_class)
+    def record_results(self):
+        """
+        Stores the flagged orders and metrics of this run in the results database next to Rivedo_Log.txt
+        """
 
-        # Add columns to the temp feature class
-        self.add_columns_to_feature_class(self.active_cust_info)
+        fields = ["external_id"] + ORDER_FIELDS
 
-        # Generate the new field mapping
-        new_field_mapping = self.produce_field_mapping()
-        arcpy.AddMessage("new_field_mapping: " + str(new_field_mapping))
+        # The single export kept the fields of the orders it wrote, otherwise they are read back from the temp feature class
+        if self.kept_orders is not None:
+            orders = self.kept_orders.loc[:, fields]
+        else:
+            orders = pd.concat(read_arcpy_chunks(self.temp_feature_class, fields), ignore_index=True) if self.row_count else pd.DataFrame(columns=fields)
 
-        # Add the feature calss to the map as a new feature layer
-        self.map.addDataFromPath(self.temp_feature_class)
+        flagged = flag_orders(orders, self.settings.query_input, self.explain, self.settings.customer_index)
 
-        # Select and Delete rows from the temp featuer layer
-        self.select_and_delete_rows(self.temp_name) 
+        # Why each order was flagged, for grouping and filtering the flags without re-running the audit
+        if self.explain:
+            flagged.loc[:, FLAG_COLUMNS + REASON_FIELDS].to_parquet(self.reasons_file, index=False)
 
-        # Create a new feature class with the reordered fields
-        arcpy.conversion.ExportFeatures(self.temp_name, self.staging_location + "\\" + self.output_name, field_mapping = new_field_mapping)
+        with ResultsStore(self.results_file, "Rivedo") as store:
+            store.record_run(flagged, self.metrics.counts if self.metrics else None, self.username, self.row_count)
+            changes = store.changes_since_previous()
+
+        arcpy.AddMessage(f"Flagged orders: {len(flagged)} (new: {len(changes['new'])}, resolved: {len(changes['resolved'])}, changed: {len(changes['changed'])})")
 
-        # Delete the existing output files
-        self.delete_current_files()
+    def run_workflow(self):
+        """ This function calls all functions in the needed order to produce final output """
 
-        # Move the produced files to the final output location
-        self.move_files()
+        stage = self.recorder.stage
+        calculator = self.column_calculator(self.active_cust_info)
+
+        # Work out the output field order and shapefile names, reused while the input schema is unchanged
+        with stage("plan_schema") as record:
+            self.plan = self.plan_output_schema(calculator)
+            record["cached"] = self.plan.cached
+
+        if self.single_pass:
+            # Filter the orders, compute the new columns and write the staged shapefile in one export
+            with stage("export_features") as record:
+                self.export_output(calculator)
+                record["rows_in"] = self.row_count + sum(self.removed.values())
+                record["rows_out"] = self.row_count
+                record["removed"] = self.removed
+                record["mode"] = "single export"
+                if self.snapshot_counts is not None:
+                    record["changes"] = self.snapshot_counts
+
+            # Metrics of the orders written, from the fields kept during the export
+            with stage("metrics", self.row_count):
+                self.metrics = self.rules.evaluate_rows(self.kept_orders.itertuples(index=False, name=None), list(self.kept_orders.columns))
 
-        # Get metrics
-        self.get_metrics(self.get_layer_by_name(self.temp_name, self.map))
+        else:
+            self.run_per_column_export()
+
+        # Swap the produced files into the final output location, the previous files are kept as a version
+        with stage("publish") as record:
+            self.publish_output()
+            record["published"] = self.published
 
         # Display metrics
         self.display_metrics()
 
         # Remove the temp layer from the map
-        self.map.removeLayer(self.get_layer_by_name(self.temp_name, self.map))
+        if not self.single_pass:
+            with stage("remove_layer"):
+                self.map.removeLayer(self.get_layer_by_name(self.temp_name, self.map))
 
         # Log the run
-        self.update_log()
+        with stage("update_log", self.row_count):
+            self.update_log()
+
+    def run_per_column_export(self):
+        """ Produces the staged shapefile through the temp feature class, filling the new columns with one CalculateField per column """
+
+        stage = self.recorder.stage
+
+        # Create a temporary feature class of only the orders that pass the row filter
+        with stage("export_filtered_rows") as record:
+            self.export_filtered_rows()
+            record["rows_in"] = self.row_count + sum(self.removed.values())
+            record["rows_out"] = self.row_count
+            record["removed"] = self.removed
+
+        # Add columns to the temp feature class
+        with stage("add_columns", self.row_count) as record:
+            self.add_columns_to_feature_class(self.active_cust_info)
+            record["rows_out"] = self.row_count
+            record["mode"] = "per column"
+        arcpy.AddMessage(f"Columns added in {record['seconds']:.2f} s ({record['mode']})")
+
+        # Get metrics before the output is published
+        with stage("metrics", self.row_count):
+            self.metrics = self.get_metrics(self.temp_feature_class)
+
+        # Generate the new field mapping
+        with stage("field_mapping"):
+            new_field_mapping = self.produce_field_mapping()
+
+        # Add the feature calss to the map as a new feature layer
+        with stage("add_to_map"):
+            self.map.addDataFromPath(self.temp_feature_class)
+
+        # Create a new feature class with the reordered fields
+        with stage("export_features", self.row_count) as record:
+            self.publisher.clear_staging()
+            arcpy.conversion.ExportFeatures(self.temp_name, self.staging_location + "\\" + self.output_name, field_mapping = new_field_mapping)
+            record["rows_out"] = self.row_count
+
+    def log_stages(self, error=None):
+        """
+        Appends the stage timings of this run to the JSON lines log next to Rivedo_Log.txt and reports the slowest stage
+
+        :param error: Exception, the error that stopped the run (None for a completed run)
+        """
 
+        record = self.recorder.finish(self.run_log_file, error=repr(error) if error else None, records=self.row_count, published=self.published,
+                                      metrics=self.metrics.counts if self.metrics else None)
 
+        slowest = self.recorder.slowest()
+        if slowest is not None:
+            arcpy.AddMessage(f"Run took {record['seconds']:.2f} s, slowest stage: {slowest['name']} ({slowest['seconds']:.2f} s)")
+        if "profile" in record:
+            arcpy.AddMessage("Profile saved to: " + record["profile"])
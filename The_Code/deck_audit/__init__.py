@@ -0,0 +1,4 @@
+"""
+    Shared deck audit logic used by both the Rivedo toolbox and the Deck_Queries script
+    Note: The_Code folder must be on the python path for this package to be imported
+"""
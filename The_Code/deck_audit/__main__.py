@@ -0,0 +1,8 @@
+# Allows the headless audit to be run with: python -m deck_audit
+
+import sys
+
+from deck_audit.cli import main
+
+
+sys.exit(main())
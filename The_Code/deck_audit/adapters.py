@@ -0,0 +1,130 @@
+# This file contains the readers that turn an order source (shapefile, GeoPackage, CSV or arcpy layer) into chunks of a dataframe
+# arcpy is only imported by the arcpy reader so batch runs on other sources start without it
+
+import os
+import sqlite3
+
+import pandas as pd
+
+from deck_audit.dbf_reader import read_dbf_chunks
+
+
+# Shapefile field names truncated to ten characters
+SHAPEFILE_FIELD_NAMES = {"external_i": "external_id",
+                         "tasking_pr": "tasking_priority",
+                         "responsive": "responsiveness_level",
+                         "sap_custom": "sap_customer_identifier"}
+
+# Columns always read as text, whatever the source guesses for them
+TEXT_COLUMNS = ["external_id", "sap_customer_identifier", "responsiveness_level"]
+
+# File extension of each source kind
+SOURCE_KINDS = {".shp": "shapefile", ".dbf": "shapefile", ".gpkg": "geopackage", ".csv": "csv"}
+
+
+def source_kind(source):
+    """
+    Returns the kind of the given order source: 'shapefile', 'geopackage', 'csv' or 'arcpy'
+    Anything that is not a path to one of the known files is taken to be an arcpy layer or feature class
+
+    :param source: String or arcpy Layer, the order source
+    """
+
+    if not isinstance(source, (str, os.PathLike)):
+        return "arcpy"
+
+    return SOURCE_KINDS.get(os.path.splitext(str(source))[1].lower(), "arcpy")
+
+
+def read_order_chunks(source, columns, chunk_size=100000, kind=None, layer=None):
+    """
+    Returns a generator of dataframes of the given columns of the order source, with full field names
+
+    :param source: String or arcpy Layer, the order source
+    :param columns: List, the full names of the columns to read
+    :param chunk_size: Int, number of orders per dataframe
+    :param kind: String, kind of the source (guessed from the file extension if None)
+    :param layer: String, table to read from a GeoPackage (the first feature table if None)
+    """
+
+    kind = kind or source_kind(source)
+    readers = {"shapefile": read_shapefile_chunks,
+               "geopackage": lambda source, columns, chunk_size: read_geopackage_chunks(source, columns, chunk_size, layer),
+               "csv": read_csv_chunks,
+               "arcpy": read_arcpy_chunks}
+
+    if kind not in readers:
+        raise ValueError(f"Unknown source kind '{kind}', use one of {', '.join(readers)}")
+
+    return readers[kind](source, columns, chunk_size)
+
+
+def read_shapefile_chunks(source, columns, chunk_size=100000):
+    """ Yields chunks of the .dbf of the shapefile, the geometry is never read """
+
+    original_names = {name: truncated for truncated, name in SHAPEFILE_FIELD_NAMES.items()}
+    dbf_path = os.path.splitext(str(source))[0] + ".dbf"
+
+    for chunk in read_dbf_chunks(dbf_path, [original_names.get(column, column) for column in columns], chunk_size):
+        yield chunk.rename(columns=SHAPEFILE_FIELD_NAMES)
+
+
+def read_geopackage_chunks(source, columns, chunk_size=100000, layer=None):
+    """ Yields chunks of the attribute table of a GeoPackage layer, read with sqlite3 rather than a GIS library """
+
+    with sqlite3.connect(str(source)) as connection:
+        if layer is None:
+            row = connection.execute("SELECT table_name FROM gpkg_contents WHERE data_type = 'features' ORDER BY table_name LIMIT 1").fetchone()
+            if row is None:
+                raise ValueError(f"No feature table found in {source}")
+            layer = row[0]
+
+        query = "SELECT " + ", ".join(f'"{column}"' for column in columns) + f' FROM "{layer}"'
+
+        # The index runs on across chunks, as it does for the other sources
+        start = 0
+        for chunk in pd.read_sql_query(query, connection, chunksize=chunk_size):
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield text_columns(chunk)
+
+
+def read_csv_chunks(source, columns, chunk_size=100000):
+    """ Yields chunks of a CSV export of the deck """
+
+    dtypes = {column: str for column in TEXT_COLUMNS if column in columns}
+
+    # Only empty cells are missing, 'None' is a responsiveness level
+    for chunk in pd.read_csv(source, usecols=columns, dtype=dtypes, chunksize=chunk_size, keep_default_na=False, na_values=[""]):
+        yield text_columns(chunk.loc[:, columns])
+
+
+def read_arcpy_chunks(source, columns, chunk_size=100000):
+    """ Yields chunks of an arcpy layer or feature class, read with a SearchCursor """
+
+    import arcpy
+
+    rows = []
+    start = 0
+    with arcpy.da.SearchCursor(source, columns) as cursor:
+        for row in cursor:
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield text_columns(pd.DataFrame.from_records(rows, columns=columns, index=pd.RangeIndex(start, start + len(rows))))
+                start += len(rows)
+                rows = []
+
+    if rows:
+        yield text_columns(pd.DataFrame.from_records(rows, columns=columns, index=pd.RangeIndex(start, start + len(rows))))
+
+
+def text_columns(chunk):
+    """ Returns the chunk with the TEXT_COLUMNS it contains converted to the string dtype the .dbf reader gives them, nulls kept """
+
+    # Nulls must not become the text 'None', which is a responsiveness level
+    for column in TEXT_COLUMNS:
+        if column in chunk.columns:
+            values = chunk[column]
+            chunk[column] = values.astype(str).where(values.notna(), None)
+
+    return chunk
@@ -0,0 +1,139 @@
+# This file contains the command line entry point of the headless deck audit, for unattended scheduled runs
+# Usage: python -m deck_audit SOURCE --config Sensitive_Parameters.json --output-dir DIR [--watch] (run from The_Code or with The_Code on PYTHONPATH)
+
+import argparse
+import sys
+
+from pathlib import Path
+
+from deck_audit.adapters import SOURCE_KINDS, source_kind
+from deck_audit.compact import concat_orders
+from deck_audit.config import load_config
+from deck_audit.deck_cache import DeckCache
+from deck_audit.engine import DeckAudit
+from deck_audit.hotlist import load_hotlist
+from deck_audit.instrumentation import RunRecorder
+from deck_audit.simulate import ConfigSimulation, load_variants
+from deck_audit.watch import DeckWatcher
+
+
+def parse_arguments(argv=None):
+    """ Returns the parsed command line arguments """
+
+    parser = argparse.ArgumentParser(prog="deck_audit", description="Audits a deck of orders and writes the report and the changes needed")
+    parser.add_argument("source", help="orders to audit: a shapefile, GeoPackage or CSV (or an arcpy layer path with --kind arcpy)")
+    parser.add_argument("--config", required=True, help="path to Sensitive_Parameters.json")
+    parser.add_argument("--output-dir", default=".", help="folder the report, changes and run log are written to")
+    parser.add_argument("--kind", choices=sorted(set(SOURCE_KINDS.values())) + ["arcpy"], help="kind of source, guessed from the extension if not given")
+    parser.add_argument("--layer", help="table to read from a GeoPackage, the first feature table if not given")
+    parser.add_argument("--cache-dir", help="folder of the deck cache, the source is read every run if not given")
+    parser.add_argument("--workers", type=int, help="number of worker processes, overrides the config (more than 1 is slower, see the README)")
+    parser.add_argument("--chunk-size", type=int, help="orders read per chunk, overrides the config")
+    parser.add_argument("--profile", action="store_true", help="run cProfile over the audit and save the stats next to the run log")
+    parser.add_argument("--hotlist", help="hotlist file or feature class, the 'hotlist' set of the remove rules")
+    parser.add_argument("--watch", action="store_true", help="keep running and re-audit whenever the source, hotlist or config changes")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between checks for changes when watchdog is not installed (with --watch)")
+    parser.add_argument("--debounce", type=float, default=2.0, help="seconds without writes before a change is audited (with --watch)")
+    parser.add_argument("--simulate", help="JSON file of config variants (name/query input settings to change), writes their flag counts and row diffs instead of the audit")
+    parser.add_argument("--explain", action="store_true", help="also write flag_reasons.parquet with the reason codes of every flagged order")
+
+    return parser.parse_args(argv)
+
+
+def run_simulation(audit, chunks, variants_file, output_dir):
+    """
+    Simulates the config variants of the given file on the whole deck, writes the counts and row diffs and returns the exit code
+
+    :param audit: DeckAudit, built from the current config
+    :param chunks: Iterable, cleaned chunks of the deck
+    :param variants_file: String, path to the JSON file of variants
+    :param output_dir: Path, folder the simulation_counts.csv and simulation_diffs.parquet are written to
+    """
+
+    variants = load_variants(variants_file)
+    recorder = RunRecorder("deck_audit_simulate", variants=len(variants))
+
+    try:
+        with recorder.stage("load") as stage:
+            orders = concat_orders(list(chunks))
+            stage["rows_out"] = len(orders)
+
+        with recorder.stage("simulate", len(orders)):
+            simulation = ConfigSimulation(audit.config, orders, variants).run()
+            counts = simulation.counts()
+
+        with recorder.stage("write") as stage:
+            counts.to_csv(output_dir / "simulation_counts.csv")
+            diffs = simulation.diffs()
+            diffs.to_parquet(output_dir / "simulation_diffs.parquet", index=False)
+            stage["rows_out"] = len(diffs)
+
+    except Exception as error:
+        recorder.finish(output_dir / "Audit_Log.jsonl", error=repr(error))
+        raise
+
+    record = recorder.finish(output_dir / "Audit_Log.jsonl")
+
+    print(counts.to_string())
+    print(f"Simulated {len(variants)} variants on {len(orders)} orders, {record['seconds']:.2f} s")
+
+    return 0
+
+
+def main(argv=None):
+    """ Runs the audit described by the command line and returns the exit code """
+
+    arguments = parse_arguments(argv)
+
+    # Command line settings take precedence over the config
+    settings = {setting: getattr(arguments, setting) for setting in ["workers", "chunk_size"] if getattr(arguments, setting) is not None}
+    if arguments.explain:
+        settings["explain"] = True
+
+    if arguments.watch:
+        watcher = DeckWatcher(arguments.source, arguments.config, arguments.output_dir, arguments.hotlist, arguments.kind, arguments.layer,
+                              settings, arguments.interval, arguments.debounce)
+        watcher.run()
+        return 0
+
+    parameters = load_config(arguments.config).with_settings(settings)
+
+    output_dir = Path(arguments.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    hotlist = load_hotlist(arguments.hotlist, output_dir / "hotlist_index.npz", kind=source_kind(arguments.hotlist)) if arguments.hotlist else None
+    audit = DeckAudit(parameters, {"hotlist": hotlist} if hotlist is not None else None)
+
+    kind = arguments.kind or source_kind(arguments.source)
+    chunks = audit.read_chunks(arguments.source, kind, arguments.layer)
+
+    # Only file sources can be cached, their content is part of the key
+    if arguments.cache_dir and kind != "arcpy":
+        cache = DeckCache(arguments.cache_dir)
+        cache_key = cache.key(arguments.source, audit.clean_inputs(arguments.layer, hotlist))
+        chunks = cache.load_chunks(cache_key) or cache.store_chunks(cache_key, chunks)
+
+    if arguments.simulate:
+        return run_simulation(audit, chunks, arguments.simulate, output_dir)
+
+    recorder = RunRecorder("deck_audit", arguments.profile, source=str(arguments.source), workers=audit.workers, chunk_size=audit.chunk_size)
+
+    # A failed run is logged too, with the error and the stages it got through
+    try:
+        orders, changes = audit.run(chunks, output_dir / "output.txt", output_dir / "changes_needed.csv", recorder, output_dir / "flag_reasons.parquet")
+    except Exception as error:
+        recorder.finish(output_dir / "Audit_Log.jsonl", error=repr(error))
+        raise
+
+    record = recorder.finish(output_dir / "Audit_Log.jsonl", flagged=len(orders), changes=len(changes))
+
+    print(f"Flagged orders: {len(orders)}, changes needed: {len(changes)}, {record['seconds']:.2f} s")
+
+    memory = audit.schema.memory_report()
+    if memory:
+        print(f"Deck memory: {memory['memory_before_mb']} MB as read, {memory['memory_after_mb']} MB compact")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# This file contains the single pass calculation of the new Rivedo columns
+# Every new column of a row is computed in dependency order as the single export writes it, instead of one CalculateField per column
+
+import re
+
+
+# Matches the !field_name! references of a CalculateField expression
+FIELD_REFERENCE = re.compile(r"!(\w+)!")
+
+
+class ColumnSpec():
+    """ A new column as described by a 'new_column_input' entry of the config """
+
+    def __init__(self, field_name, field_type, expression, code_block):
+        """
+        :param field_name: String, name of the field to fill
+        :param field_type: String, arcpy field type (TEXT, SHORT, LONG, ...)
+        :param expression: String, CalculateField style expression e.g. 'func(!field_a!, !field_b!)'
+        :param code_block: String, python code defining the functions used by the expression
+        """
+
+        self.field_name = field_name
+        self.field_type = field_type
+        self.expression = expression
+        self.code_block = code_block
+
+        # Fields read by the expression, in order of first use
+        self.input_fields = list(dict.fromkeys(FIELD_REFERENCE.findall(expression)))
+
+    def compile(self):
+        """ Returns a function taking the input field values (in input_fields order) and returning the column value """
+
+        namespace = dict()
+        exec(self.code_block, namespace)
+
+        arguments = ["_" + field for field in self.input_fields]
+        body = FIELD_REFERENCE.sub(lambda match: "_" + match.group(1), self.expression)
+
+        return eval("lambda " + ", ".join(arguments) + ": " + body, namespace)
+
+
+class ColumnCalculator():
+    """ Computes all new columns of a row in dependency order """
+
+    def __init__(self, specs):
+        """ :param specs: List, ColumnSpec objects for every new column """
+
+        self.specs = self.dependency_order(specs)
+        self.output_fields = [spec.field_name for spec in self.specs]
+        self.input_fields = list(dict.fromkeys(field for spec in self.specs for field in spec.input_fields if field not in self.output_fields))
+
+        # All fields the cursor needs, the existing ones first
+        self.fields = self.input_fields + self.output_fields
+        position = {field: i for i, field in enumerate(self.fields)}
+
+        self.steps = [(position[spec.field_name], [position[field] for field in spec.input_fields], spec.compile()) for spec in self.specs]
+
+    def dependency_order(self, specs):
+        """
+        Returns the specs ordered so that every column is computed after the columns it reads, keeping config order otherwise
+
+        :param specs: List, ColumnSpec objects
+        """
+
+        remaining = list(specs)
+        ordered = []
+
+        while remaining:
+            pending = {spec.field_name for spec in remaining}
+            ready = [spec for spec in remaining if not pending.intersection(set(spec.input_fields) - {spec.field_name})]
+            if not ready:
+                raise Exception("Circular dependency between new columns: " + ", ".join(sorted(pending)))
+            ordered.append(ready[0])
+            remaining.remove(ready[0])
+
+        return ordered
+
+    def calculate(self, row):
+        """
+        Fills the new column values of the given row in place and returns it
+
+        :param row: List, values in the order of self.fields
+        """
+
+        for output, inputs, function in self.steps:
+            row[output] = function(*[row[i] for i in inputs])
+
+        return row
@@ -0,0 +1,145 @@
+# This file contains the compact in-memory form of the order deck: categoricals for the repeated text, int16 priorities,
+# the spacecraft flags packed into one bitmask and interned ids. The priority engine and the report run on it directly
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# Bumped whenever the compact form changes, cached decks of another version are not reused
+COMPACT_SCHEMA_VERSION = 1
+
+# Text columns with few distinct values, stored as categoricals
+CATEGORY_COLUMNS = ["sap_customer_identifier", "responsiveness_level"]
+
+# Id columns whose python strings are interned (text held in an arrow string column is already a single buffer)
+ID_COLUMNS = ["external_id"]
+
+# Bit of each spacecraft flag in the packed column
+SPACECRAFT_BITS = {"ge01": 1, "wv01": 2, "wv02": 4, "wv03": 8}
+SPACECRAFT_FIELD = "spacecraft"
+
+# Flags read by the priority decision tree (wv03 does not change the ending digit)
+PRIORITY_SPACECRAFT = ["ge01", "wv01", "wv02"]
+
+MEGABYTE = 1024 * 1024
+
+
+def spacecraft_mask(fields):
+    """ Returns the bits of the given spacecraft flags """
+
+    return sum(SPACECRAFT_BITS[field] for field in fields)
+
+
+def no_spacecraft(orders, fields=PRIORITY_SPACECRAFT):
+    """
+    Returns a numpy mask of the orders with none of the given spacecraft flags set, from the packed column or the flag columns
+
+    :param orders: Dataframe, compact or full orders
+    :param fields: List, the spacecraft flags checked
+    """
+
+    if SPACECRAFT_FIELD in orders.columns:
+        return (orders[SPACECRAFT_FIELD].to_numpy() & spacecraft_mask(fields)) == 0
+
+    return np.logical_and.reduce([(orders[field] == 0).to_numpy() for field in fields])
+
+
+def map_values(values, lookup):
+    """
+    Returns a float numpy array of the lookup value of each entry of the series, NaN where it has none
+    Categoricals are looked up once per category rather than once per order
+
+    :param values: Series, the keys
+    :param lookup: Dict, key/number
+    """
+
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        mapped = values.cat.categories.map(lookup).to_numpy(dtype=float, na_value=np.nan)
+
+        # Code -1 (missing value) picks the trailing NaN
+        return np.append(mapped, np.nan)[values.cat.codes.to_numpy()]
+
+    return values.map(lookup).to_numpy(dtype=float, na_value=np.nan)
+
+
+def concat_orders(frames):
+    """ Concatenates compact chunks, first giving each categorical column the union of the chunks' categories so it stays categorical """
+
+    frames = list(frames)
+    if len(frames) > 1:
+        for column in frames[0].columns:
+            if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+                categories = pd.api.types.union_categoricals([frame[column] for frame in frames]).categories
+                frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+
+    return pd.concat(frames)
+
+
+class CompactSchema():
+    """ Casts order chunks to the compact form and keeps the memory they took before and after """
+
+    def __init__(self, priority_columns=("tasking_priority",), unpacked=()):
+        """
+        :param priority_columns: List, integer priority columns stored as int16
+        :param unpacked: List, spacecraft flags kept as their own columns (e.g. flags shown in the report)
+        """
+
+        self.priority_columns = list(priority_columns)
+        self.unpacked = list(unpacked)
+        self.memory = {"rows": 0, "bytes_before": 0, "bytes_after": 0}
+
+    def compact(self, df):
+        """ Returns the compact form of the chunk, already compact columns are left as they are """
+
+        before = int(df.memory_usage(deep=True).sum())
+        df = df.copy()
+
+        for column in CATEGORY_COLUMNS:
+            if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype("category")
+
+        for column in ID_COLUMNS:
+            if column in df.columns and df[column].dtype == object:
+                df[column] = [sys.intern(value) if isinstance(value, str) else value for value in df[column]]
+
+        # Priorities are three digit numbers, only columns whose values all fit are narrowed
+        for column in self.priority_columns:
+            if column in df.columns and pd.api.types.is_integer_dtype(df[column].dtype):
+                values = df[column].to_numpy()
+                if not len(values) or (values.min() >= np.iinfo(np.int16).min and values.max() <= np.iinfo(np.int16).max):
+                    df[column] = values.astype(np.int16)
+
+        # The flags are packed in a fixed bit order so chunks and cached decks agree
+        flags = [field for field in SPACECRAFT_BITS if field in df.columns and field not in self.unpacked]
+        if flags:
+            packed = df[SPACECRAFT_FIELD].to_numpy(dtype=np.uint8) if SPACECRAFT_FIELD in df.columns else np.zeros(len(df), dtype=np.uint8)
+            for field in flags:
+                packed |= np.where(df[field].to_numpy() != 0, SPACECRAFT_BITS[field], 0).astype(np.uint8)
+            df = df.drop(columns=flags).assign(**{SPACECRAFT_FIELD: packed})
+
+        self.memory["rows"] += len(df)
+        self.memory["bytes_before"] += before
+        self.memory["bytes_after"] += int(df.memory_usage(deep=True).sum())
+
+        return df
+
+    def expand(self, df, fields=tuple(SPACECRAFT_BITS)):
+        """ Returns the orders with the given spacecraft flags unpacked back into 0/1 columns """
+
+        df = df.copy()
+        for field in fields:
+            df[field] = ((df[SPACECRAFT_FIELD].to_numpy() & SPACECRAFT_BITS[field]) != 0).astype("int64")
+
+        return df.drop(columns=SPACECRAFT_FIELD)
+
+    def memory_report(self):
+        """ Returns the rows compacted and the memory they took before and after, in megabytes """
+
+        if not self.memory["rows"]:
+            return dict()
+
+        return {"compacted_rows": self.memory["rows"],
+                "memory_before_mb": round(self.memory["bytes_before"] / MEGABYTE, 1),
+                "memory_after_mb": round(self.memory["bytes_after"] / MEGABYTE, 1)}
@@ -0,0 +1,221 @@
+# This file contains the typed view of Sensitive_Parameters.json: the JSON is validated once, its lists are turned into
+# frozensets and the lookups derived from it are computed up front. Loaded configs are kept per file and only re-read
+# when the file changes, so repeated runs in one ArcGIS Pro session or a long running watcher pay nothing for the config
+
+import json
+import os
+
+from deck_audit.customer_index import CustomerIndex
+from deck_audit.rules import RUNTIME_SETS, RuleSet
+
+
+# Names of the query inputs section, Rivedo's config uses the first and the Queries script's config the second
+QUERY_INPUT_SECTIONS = ["query_input", "query_inputs"]
+
+# Responsiveness levels of the deck, the only keys the high/low thresholds may use
+RESPONSIVENESS_LEVELS = ["None", "Select", "SelectPlus"]
+
+# Keys of each entry of "new_column_input"
+NEW_COLUMN_KEYS = ["field_name", "field_type", "expression", "column_function", "config_reqs"]
+
+# Configs already loaded in this session, keyed on path
+_loaded_configs = dict()
+
+
+def check(condition, path, expected):
+    """ Raises a ValueError naming the config key at the given path when the condition is False """
+
+    if not condition:
+        raise ValueError(f"Sensitive_Parameters.json: '{path}' must be {expected}")
+
+
+def validate(parameters):
+    """
+    Raises a ValueError for the first section of the parameters with the wrong shape, sections that are missing are not checked
+
+    :param parameters: Dict, the loaded Sensitive_Parameters.json
+    """
+
+    check(isinstance(parameters, dict), "(top level)", "an object")
+    check(any(section in parameters for section in QUERY_INPUT_SECTIONS), " or ".join(QUERY_INPUT_SECTIONS), "present")
+
+    section = next(section for section in QUERY_INPUT_SECTIONS if section in parameters)
+    query_input = parameters[section]
+    check(isinstance(query_input, dict), section, "an object")
+
+    for cust_lists in ["middle_digit_cust_list", "ending_digit_cust_list"]:
+        check(isinstance(query_input.get(cust_lists), dict), f"{section}.{cust_lists}", "an object of digit/customer list")
+        for digit, customers in query_input[cust_lists].items():
+            check(digit in "0123456789" and len(digit) == 1, f"{section}.{cust_lists}.{digit}", "keyed on a single digit")
+            check(isinstance(customers, list), f"{section}.{cust_lists}.{digit}", "a list of customer ids")
+
+    for threshold in ["orders_at_high_pri", "orders_at_low_pri"]:
+        check(isinstance(query_input.get(threshold), dict), f"{section}.{threshold}", "an object of responsiveness/settings")
+        for responsiveness, settings in query_input[threshold].items():
+            path = f"{section}.{threshold}.{responsiveness}"
+            check(responsiveness in RESPONSIVENESS_LEVELS, path, "keyed on one of the responsiveness levels " + ", ".join(RESPONSIVENESS_LEVELS))
+            check(isinstance(settings, dict), path, "an object with 'pri' and 'excluded_cust'")
+            check(isinstance(settings.get("pri"), (int, float)) and not isinstance(settings.get("pri"), bool), path + ".pri", "a number")
+            check(isinstance(settings.get("excluded_cust"), list), path + ".excluded_cust", "a list of customer ids")
+
+    if "excluded_priorities" in parameters:
+        check(isinstance(parameters["excluded_priorities"], list) and all(isinstance(pri, int) for pri in parameters["excluded_priorities"]),
+              "excluded_priorities", "a list of whole numbers")
+
+    if "columns_to_display" in parameters:
+        check(isinstance(parameters["columns_to_display"], list) and all(isinstance(column, str) for column in parameters["columns_to_display"]),
+              "columns_to_display", "a list of field names")
+
+    if "customer_info" in parameters:
+        check(isinstance(parameters["customer_info"], dict), "customer_info", "an object of customer type/customers")
+        for customers in parameters["customer_info"]:
+            check(isinstance(parameters["customer_info"][customers], (dict, list)), f"customer_info.{customers}", "an object of customer id/name or a list of customer ids")
+
+    if "new_column_input" in parameters:
+        check(isinstance(parameters["new_column_input"], dict), "new_column_input", "an object of column/settings")
+        for new_column, settings in parameters["new_column_input"].items():
+            missing = [key for key in NEW_COLUMN_KEYS if key not in settings] if isinstance(settings, dict) else NEW_COLUMN_KEYS
+            check(not missing, f"new_column_input.{new_column}", "an object with " + ", ".join(NEW_COLUMN_KEYS))
+
+    if "new_mapping_for_existing_fields" in parameters:
+        check(isinstance(parameters["new_mapping_for_existing_fields"], list), "new_mapping_for_existing_fields", "a list of field names")
+
+    if "rules" in parameters:
+        check(isinstance(parameters["rules"], list), "rules", "a list of rules")
+
+        # Compiling the rules checks every name, action and condition, the sets only known at run time stand empty
+        try:
+            RuleSet(parameters["rules"], parameters, {name: [] for name in RUNTIME_SETS})
+        except ValueError as error:
+            raise ValueError(f"Sensitive_Parameters.json: 'rules' is invalid: {error}")
+
+    if "explain" in parameters:
+        check(isinstance(parameters["explain"], bool), "explain", "true or false")
+
+    for setting in ["workers", "chunk_size", "publish_versions"]:
+        if setting in parameters:
+            check(isinstance(parameters[setting], int) and not isinstance(parameters[setting], bool) and parameters[setting] > 0, setting, "a positive whole number")
+
+
+class NewColumn():
+    """ An entry of "new_column_input" """
+
+    def __init__(self, key, settings):
+        """
+        :param key: String, the key of the entry
+        :param settings: Dict, the entry
+        """
+
+        self.key = key
+        self.field_name = settings["field_name"]
+        self.field_type = settings["field_type"]
+        self.expression = settings["expression"]
+        self.column_function = settings["column_function"]
+        self.config_reqs = settings["config_reqs"]
+
+
+class AuditConfig():
+    """ Validated Sensitive_Parameters.json with frozensets and the lookups derived from it """
+
+    def __init__(self, parameters, path=None, modified=None):
+        """
+        :param parameters: Dict, the loaded Sensitive_Parameters.json (kept as it is in self.parameters)
+        :param path: String, the file it was loaded from
+        :param modified: Tuple, modification time (ns) and size of the file
+        """
+
+        validate(parameters)
+
+        self.parameters = parameters
+        self.path = path
+        self.modified = modified
+
+        self.query_input_section = next(section for section in QUERY_INPUT_SECTIONS if section in parameters)
+        self.query_input = parameters[self.query_input_section]
+        self.excluded_priorities = frozenset(parameters.get("excluded_priorities", []))
+
+        # The customer lists compiled once into the index used by every priority and high/low check
+        self.customer_index = CustomerIndex(self.query_input)
+
+        # Threshold and excluded customers of each (check, responsiveness)
+        self.thresholds = dict()
+        self.excluded_customers = dict()
+        for query in ["high", "low"]:
+            for responsiveness, settings in self.query_input["orders_at_" + query + "_pri"].items():
+                self.thresholds[(query, responsiveness)] = settings["pri"]
+                self.excluded_customers[(query, responsiveness)] = frozenset(settings["excluded_cust"])
+
+        # Customer id/name of every customer type, a later type takes precedence like the sections were merged in order
+        # Types given as a plain list of ids (only used as sets by the rules) have no names
+        self.customer_names = dict()
+        for customers in parameters.get("customer_info", dict()).values():
+            if isinstance(customers, dict):
+                self.customer_names.update(customers)
+        self.customer_sets = {customers: frozenset(ids) for customers, ids in parameters.get("customer_info", dict()).items()}
+
+        self.new_columns = [NewColumn(key, settings) for key, settings in parameters.get("new_column_input", dict()).items()]
+
+        # Copies with command line settings applied, see with_settings
+        self.overridden = dict()
+
+    def require(self, *sections):
+        """ Raises a ValueError if any of the given top level sections is missing """
+
+        missing = [section for section in sections if section not in self.parameters]
+        if missing:
+            raise ValueError(f"Sensitive_Parameters.json is missing: {', '.join(missing)}")
+
+        return self
+
+    def with_settings(self, settings):
+        """
+        Returns the config with the given top level values replacing those of the file, the same object for the same settings
+
+        :param settings: Dict, e.g. workers or chunk_size given on the command line
+        """
+
+        if not settings:
+            return self
+
+        key = tuple(sorted(settings.items()))
+        if key not in self.overridden:
+            self.overridden[key] = AuditConfig({**self.parameters, **settings}, self.path, self.modified)
+
+        return self.overridden[key]
+
+    def get(self, key, default=None):
+        return self.parameters.get(key, default)
+
+    def __getitem__(self, key):
+        return self.parameters[key]
+
+    def __contains__(self, key):
+        return key in self.parameters
+
+    def active_customer_info(self, active_customers):
+        """
+        Returns a dictionary of customer id/name of only the given customers that have a name in the config
+
+        :param active_customers: Iterable, customer ids of the active orders
+        """
+
+        names = self.customer_names
+        return {cust: names[cust] for cust in sorted(active_customers, key=str) if cust in names}
+
+
+def load_config(config_file):
+    """
+    Returns the AuditConfig of the given file, only re-reading and validating it when the file has changed
+
+    :param config_file: String, path to Sensitive_Parameters.json
+    """
+
+    key = os.path.abspath(config_file)
+    stats = os.stat(config_file)
+    modified = (stats.st_mtime_ns, stats.st_size)
+
+    if key not in _loaded_configs or _loaded_configs[key].modified != modified:
+        with open(config_file, 'r', errors="ignore") as input:
+            _loaded_configs[key] = AuditConfig(json.load(input), key, modified)
+
+    return _loaded_configs[key]
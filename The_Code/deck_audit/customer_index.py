@@ -0,0 +1,121 @@
+# This file contains the customer index compiled from the query inputs of Sensitive_Parameters.json
+# The index is shared by the CalculateField code blocks and the pandas queries so each order costs one dictionary lookup
+
+from math import floor
+
+
+# Order in which the customer lists are checked, the first list containing the customer sets the digit
+MIDDLE_DIGIT_ORDER = ["1", "2", "3", "4", "5", "6", "7", "8", "9", "0"]
+ENDING_DIGIT_ORDER = ["1", "2", "6", "7", "8", "9", "0"]
+
+# Position of the digits and exclusion flags in an index entry
+MIDDLE, ENDING, FLAGS = 0, 1, 2
+NO_ENTRY = (None, None, 0)
+
+
+class CustomerIndex():
+    """ Hash index of customer id to (middle digit, ending digit, exclusion flags) """
+
+    def __init__(self, query_input):
+        """ Compiles the customer lists of the query inputs into a single index
+
+            :param query_input: Dict, the query inputs section of the config file
+        """
+
+        self.high_pri = {resp: query_input["orders_at_high_pri"][resp]["pri"] for resp in query_input["orders_at_high_pri"]}
+        self.low_pri = {resp: query_input["orders_at_low_pri"][resp]["pri"] for resp in query_input["orders_at_low_pri"]}
+
+        # One bit per (query, responsiveness) exclusion list
+        self.flag_bits = dict()
+        for query in ["high", "low"]:
+            for resp in query_input["orders_at_" + query + "_pri"]:
+                self.flag_bits[(query, resp)] = 1 << len(self.flag_bits)
+
+        self.middle_digit_lookup = self.build_lookup(query_input["middle_digit_cust_list"], MIDDLE_DIGIT_ORDER)
+        self.ending_digit_lookup = self.build_lookup(query_input["ending_digit_cust_list"], ENDING_DIGIT_ORDER)
+
+        self.exclusion_flags = dict()
+        for (query, resp), bit in self.flag_bits.items():
+            for cust in query_input["orders_at_" + query + "_pri"][resp]["excluded_cust"]:
+                self.exclusion_flags[cust] = self.exclusion_flags.get(cust, 0) | bit
+
+        # Combine everything known about each customer into one entry
+        self.customers = dict()
+        for cust in set(self.middle_digit_lookup) | set(self.ending_digit_lookup) | set(self.exclusion_flags):
+            self.customers[cust] = (self.middle_digit_lookup.get(cust), self.ending_digit_lookup.get(cust), self.exclusion_flags.get(cust, 0))
+
+    @classmethod
+    def from_file(cls, config_file):
+        """
+        Returns the index of the given config file, the one compiled by load_config so the file is only re-read when it has changed
+
+        :param config_file: String, path to Sensitive_Parameters.json
+        """
+
+        from deck_audit.config import load_config
+
+        return load_config(config_file).customer_index
+
+    def build_lookup(self, cust_lists, digit_order):
+        """
+        Returns a dictionary of customer id/digit with the same precedence as the decision tree
+
+        :param cust_lists: Dict, digit/list of customer ids
+        :param digit_order: List, the digits in the order they are checked
+        """
+
+        lookup = dict()
+
+        # Only the first list a customer appears in is used
+        for digit in digit_order:
+            for cust in cust_lists.get(digit, []):
+                lookup.setdefault(cust, int(digit))
+
+        return lookup
+
+    def is_excluded(self, cust, query, responsiveness):
+        """
+        Returns True if the customer is excluded from the given high or low priority check
+
+        :param cust: Str, customer id
+        :param query: String, either 'high' or 'low'
+        :param responsiveness: String, responsiveness level of the order
+        """
+
+        return bool(self.customers.get(cust, NO_ENTRY)[FLAGS] & self.flag_bits.get((query, responsiveness), 0))
+
+    def correct_priority(self, priority, cust, ge01, wv02, wv01):
+        """ Returns a priority according a 'discision tree' for the given order parameters """
+
+        entry = self.customers.get(cust, NO_ENTRY)
+
+        # Sets the middle digit
+        middle_digit = entry[MIDDLE]
+        if middle_digit is None:
+            middle_digit = floor((priority - 700)/10)
+
+        # Sets the ending digit
+        ending_digit = entry[ENDING]
+        if ending_digit is None:
+            ending_digit = 3 if (ge01 == 0) and (wv02 == 0) and (wv01 == 0) else 4
+
+        return 700 + (middle_digit * 10) + ending_digit
+
+    def high_low(self, priority, cust, responsiveness):
+        """
+        Returns 'Low', 'High', 'Excluded' or 'Standard' for the given order parameters
+        A responsiveness level without a threshold in the config is never flagged, as in PriorityEngine
+        """
+
+        low_pri = self.low_pri.get(responsiveness)
+        high_pri = self.high_pri.get(responsiveness)
+
+        # Low priority check
+        if low_pri is not None and priority > low_pri:
+            return "Excluded" if self.is_excluded(cust, "low", responsiveness) else "Low"
+
+        # High priority check
+        if high_pri is not None and priority < high_pri:
+            return "Excluded" if self.is_excluded(cust, "high", responsiveness) else "High"
+
+        return "Standard"
@@ -0,0 +1,133 @@
+# This file contains a streaming reader for the attribute table (.dbf) of a shapefile
+# Only the requested columns are decoded, in fixed size chunks, and the geometry (.shp) is never read
+
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+
+class DbfField():
+    """ Description of one field of a .dbf file """
+
+    def __init__(self, name, field_type, length, decimals, offset):
+        self.name = name
+        self.field_type = field_type
+        self.length = length
+        self.decimals = decimals
+        self.offset = offset
+
+
+def read_header(data):
+    """
+    Returns (record count, header length, record length, list of DbfField) from an open .dbf file
+
+    :param data: File, the .dbf file opened in binary mode and positioned at the start
+    """
+
+    record_count, header_length, record_length = struct.unpack("<xxxxIHH20x", data.read(32))
+
+    fields = []
+    offset = 1  # each record starts with the deletion flag
+
+    while True:
+        descriptor = data.read(32)
+        if not descriptor or descriptor[0] == 0x0D:
+            break
+        name = descriptor[:11].split(b"\x00")[0].decode("ascii", errors="ignore")
+        field_type = chr(descriptor[11])
+        length, decimals = descriptor[16], descriptor[17]
+        fields.append(DbfField(name, field_type, length, decimals, offset))
+        offset += length
+
+    return record_count, header_length, record_length, fields
+
+
+def dbf_encoding(dbf_path):
+    """ Returns the text encoding given by the .cpg file next to the .dbf, latin-1 if there is none """
+
+    cpg_path = os.path.splitext(str(dbf_path))[0] + ".cpg"
+
+    if os.path.exists(cpg_path):
+        with open(cpg_path, 'r') as cpg:
+            encoding = cpg.read().strip()
+        return "utf-8" if encoding.upper() in ["UTF-8", "UTF8", "65001"] else encoding
+
+    return "latin-1"
+
+
+def decode_column(raw, field, encoding):
+    """
+    Returns a pandas series of the decoded values of one field
+
+    :param raw: Numpy array, the raw fixed width bytes of the field
+    :param field: DbfField, the field description
+    :param encoding: String, text encoding of character fields
+    """
+
+    text = pd.Series(np.char.strip(raw)).str.decode(encoding, errors="replace")
+
+    if field.field_type in ["N", "F"]:
+        values = pd.to_numeric(text, errors="coerce")
+        if field.decimals == 0 and not values.isna().any():
+            values = values.astype("int64")
+        return values
+
+    if field.field_type == "L":
+        return text.str.upper().map({"T": True, "Y": True, "F": False, "N": False})
+
+    if field.field_type == "D":
+        return pd.to_datetime(text, format="%Y%m%d", errors="coerce")
+
+    return text
+
+
+def read_dbf_chunks(dbf_path, columns=None, chunksize=100000):
+    """
+    Yields dataframes of up to chunksize records with only the requested columns
+    The index continues across chunks and skips deleted records, matching a full read of the file
+
+    :param dbf_path: String, path to the .dbf file (a .shp path is also accepted)
+    :param columns: List, names of the fields to read (all fields if None)
+    :param chunksize: Int, number of records read at a time
+    """
+
+    dbf_path = os.path.splitext(str(dbf_path))[0] + ".dbf"
+    encoding = dbf_encoding(dbf_path)
+
+    with open(dbf_path, 'rb') as data:
+        record_count, header_length, record_length, fields = read_header(data)
+
+        if columns is not None:
+            by_name = {field.name: field for field in fields}
+            missing = [column for column in columns if column not in by_name]
+            if missing:
+                raise KeyError(f"Fields not found in {dbf_path}: {missing}")
+            fields = [by_name[column] for column in columns]
+
+        # Structured dtype that only exposes the requested fields of each record
+        record_dtype = np.dtype({"names": ["_deleted"] + [field.name for field in fields],
+                                 "formats": ["S1"] + [f"S{field.length}" for field in fields],
+                                 "offsets": [0] + [field.offset for field in fields],
+                                 "itemsize": record_length})
+
+        data.seek(header_length)
+        start = 0
+        remaining = record_count
+
+        while remaining > 0:
+            count = min(chunksize, remaining)
+            buffer = data.read(count * record_length)
+            count = len(buffer) // record_length
+            if count == 0:
+                break
+            remaining -= count
+
+            records = np.frombuffer(buffer, dtype=record_dtype, count=count)
+            records = records[records["_deleted"] != b"*"]
+
+            index = pd.RangeIndex(start, start + len(records))
+            start += len(records)
+
+            yield pd.DataFrame({field.name: decode_column(records[field.name], field, encoding).set_axis(index) for field in fields}, index=index)
@@ -0,0 +1,135 @@
+# This file contains the on-disk cache of the cleaned order deck
+# Entries are keyed on the source shapefile and the config values used to clean it, so a changed deck or config is never read from a stale cache
+
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+
+# Files of a shapefile whose changes invalidate the cache
+SOURCE_EXTENSIONS = [".shp", ".dbf"]
+
+# Bytes read from the start and end of each source file for the content hash
+HASH_SAMPLE = 65536
+
+
+class DeckCache():
+    """ Parquet cache of cleaned order decks """
+
+    def __init__(self, cache_dir, max_entries=3):
+        """
+        :param cache_dir: String, folder holding the cache entries
+        :param max_entries: Int, number of entries kept, the least recently used are removed
+        """
+
+        self.cache_dir = str(cache_dir)
+        self.max_entries = max_entries
+
+    def key(self, source_file, config):
+        """
+        Returns the cache key for the given source shapefile and the config values used to clean it
+
+        :param source_file: String, path to the .shp file (or any other single file source)
+        :param config: Dict, the config values that change the cleaned deck (columns to drop, excluded priorities, ...)
+        """
+
+        digest = hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode())
+        base, source_extension = os.path.splitext(str(source_file))
+
+        # Other sources (GeoPackage, CSV) are a single file
+        extensions = SOURCE_EXTENSIONS if source_extension.lower() in SOURCE_EXTENSIONS else [source_extension]
+
+        for extension in extensions:
+            if not os.path.exists(base + extension):
+                continue
+
+            # File stats plus a hash of the start and end of the file
+            stats = os.stat(base + extension)
+            digest.update(f"{extension}|{stats.st_size}|{stats.st_mtime_ns}".encode())
+            with open(base + extension, 'rb') as data:
+                digest.update(data.read(HASH_SAMPLE))
+                data.seek(max(stats.st_size - HASH_SAMPLE, 0))
+                digest.update(data.read(HASH_SAMPLE))
+
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key, columns=None):
+        """
+        Returns the cached dataframe for the key, or None if there is no entry
+
+        :param key: String, cache key from key()
+        :param columns: List, only these columns are read (all columns if None)
+        """
+
+        chunks = self.load_chunks(key, columns)
+
+        return None if chunks is None else pd.concat(chunks)
+
+    def load_chunks(self, key, columns=None):
+        """
+        Returns a generator of the cached chunks for the key, or None if there is no entry
+
+        :param key: String, cache key from key()
+        :param columns: List, only these columns are read (all columns if None)
+        """
+
+        path = self.entry_path(key)
+        if not os.path.isdir(path):
+            return None
+
+        # Mark the entry as recently used
+        os.utime(path)
+        parts = sorted(name for name in os.listdir(path) if name.endswith(".parquet"))
+
+        return (pd.read_parquet(os.path.join(path, part), columns=columns) for part in parts)
+
+    def store(self, key, df):
+        """
+        Writes the dataframe as the entry for the key and removes the oldest entries
+
+        :param key: String, cache key from key()
+        :param df: Dataframe, the cleaned deck
+        """
+
+        for chunk in self.store_chunks(key, [df]):
+            pass
+
+    def store_chunks(self, key, chunks):
+        """
+        Passes the given chunks through while writing each one to the entry for the key
+        The entry only becomes visible once every chunk has been written
+
+        :param key: String, cache key from key()
+        :param chunks: Iterable, dataframes of the cleaned deck
+        """
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Write to a temporary folder first so a failed write never leaves a partial entry
+        temp_path = self.entry_path(key) + f".tmp{os.getpid()}"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+
+        for number, chunk in enumerate(chunks):
+            chunk.to_parquet(os.path.join(temp_path, f"part-{number:05d}.parquet"))
+            yield chunk
+
+        shutil.rmtree(self.entry_path(key), ignore_errors=True)
+        os.replace(temp_path, self.entry_path(key))
+
+        self.evict()
+
+    def evict(self):
+        """ Removes all but the max_entries most recently used entries """
+
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if ".tmp" not in name]
+        entries.sort(key=os.path.getmtime, reverse=True)
+
+        for entry in entries[self.max_entries:]:
+            shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,258 @@
+# This file contains the headless deck audit: the priority queries and the report, working on dataframes only
+# The Queries script, the command line and the benchmarks all run the audit through DeckAudit
+
+import pandas as pd
+
+from deck_audit.adapters import read_order_chunks
+from deck_audit.compact import COMPACT_SCHEMA_VERSION, SPACECRAFT_BITS, CompactSchema, concat_orders
+from deck_audit.config import RESPONSIVENESS_LEVELS, AuditConfig
+from deck_audit.parallel import ParallelAuditor
+from deck_audit.priority import ORDER_FIELDS, REASON_FIELDS
+from deck_audit.publish import replace_file
+from deck_audit.report import frame_to_string
+from deck_audit.rules import RUNTIME_SETS, RuleSet
+
+
+class DeckAudit():
+    """ Suggests priorities for a deck of orders, flags the misprioritized ones and writes the report """
+
+    def __init__(self, parameters, sets=None):
+        """
+        :param parameters: AuditConfig or Dict, the loaded Sensitive_Parameters.json
+        :param sets: Dict, named sets of the rules only known at run time (e.g. 'hotlist')
+        """
+
+        self.config = parameters if isinstance(parameters, AuditConfig) else AuditConfig(parameters)
+        self.config.require("columns_to_display", "excluded_priorities")
+        parameters = self.config.parameters
+
+        self.new_pri_field_name = "Suggested_Priority"
+        self.display_columns = parameters["columns_to_display"] + [self.new_pri_field_name]
+        self.query_input = self.config.query_input
+        self.excluded_priorities = parameters["excluded_priorities"]
+        self.chunk_size = parameters.get("chunk_size", 100000)
+        self.workers = parameters.get("workers", 1)
+        self.partition_by = parameters.get("partition_by", "customer")
+
+        # Explain mode keeps the reason codes of every flagged order (see PriorityEngine.reasons)
+        self.explain = parameters.get("explain", False)
+
+        # Remove rules of the "rules" config section (the metrics are Rivedo's), without them only the excluded priorities are removed
+        self.rules_config = [rule for rule in parameters.get("rules", []) if rule.get("action") == "remove"]
+        self.rules = RuleSet(self.rules_config, parameters, {**{name: [] for name in RUNTIME_SETS}, **(sets or dict())}) if self.rules_config else None
+        self.rule_counts = dict()
+        rule_fields = self.rules.fields if self.rules else []
+
+        # Columns read by the queries, only these are loaded from the source
+        self.needed_columns = list(dict.fromkeys(parameters["columns_to_display"] + ORDER_FIELDS + rule_fields + [self.new_pri_field_name]))
+        self.source_columns = [column for column in self.needed_columns if column != self.new_pri_field_name]
+
+        # Chunks are held in the compact form, spacecraft flags shown in the report keep their own columns
+        self.schema = CompactSchema(["tasking_priority", self.new_pri_field_name],
+                                    [field for field in SPACECRAFT_BITS if field in self.display_columns])
+
+    def clean_inputs(self, layer=None, hotlist=None):
+        """
+        Returns every value the cleaned chunks depend on besides the source itself, the deck cache key and the watcher compare it
+
+        :param layer: String, table read from a GeoPackage
+        :param hotlist: HotlistIndex, the 'hotlist' set of the remove rules (its fingerprint stands for its contents)
+        """
+
+        return {"columns": self.needed_columns,
+                "excluded_priorities": self.excluded_priorities,
+                "rules": self.rules_config,
+                "rule_inputs": self.rules.config_inputs() if self.rules else None,
+                "layer": layer,
+                "hotlist": hotlist.fingerprint if hotlist is not None else None,
+                "schema": COMPACT_SCHEMA_VERSION}
+
+    def read_chunks(self, source, kind=None, layer=None):
+        """
+        Returns a generator of cleaned chunks of the given order source
+
+        :param source: String or arcpy Layer, a shapefile, GeoPackage, CSV or arcpy layer
+        :param kind: String, kind of the source (guessed from the file extension if None)
+        :param layer: String, table to read from a GeoPackage
+        """
+
+        return self.clean_chunks(read_order_chunks(source, self.source_columns, self.chunk_size, kind, layer))
+
+    def clean_chunks(self, chunks):
+        """ Yields the given chunks with excluded priorities (or the orders matching a remove rule) removed and the new priority column added, in the compact form """
+
+        if self.rules:
+            # All remove rules are evaluated together, the orders removed by each are counted in rule_counts
+            chunks = self.rules.scan(chunks, self.rule_counts)
+
+        for df in chunks:
+
+            # Remove unwanted tasking priorities
+            if not self.rules:
+                df = df[~df.tasking_priority.isin(self.config.excluded_priorities)]
+
+            # Add column for the new priority
+            df = df.assign(**{self.new_pri_field_name: 0})
+
+            yield self.schema.compact(df.loc[:, self.needed_columns])
+
+    def flag_orders(self, chunks):
+        """ Returns a dataframe of only the orders from the given chunks that are flagged by any query """
+
+        flagged = []
+
+        # Priorities and flags are computed across worker processes when more than one worker is configured
+        with ParallelAuditor(self.query_input, self.workers, self.partition_by, self.config.customer_index) as auditor:
+            for chunk in chunks:
+                if self.explain:
+                    # The reason codes come from the same digits as the suggested priority
+                    suggested, mask, reasons = auditor.explain(chunk)
+                    for field in REASON_FIELDS:
+                        chunk[field] = reasons[field]
+                else:
+                    suggested, mask = auditor.audit(chunk)
+
+                chunk[self.new_pri_field_name] = suggested.astype(chunk[self.new_pri_field_name].dtype)
+                flagged.append(chunk[mask])
+
+        if not flagged:
+            return pd.DataFrame(columns=self.needed_columns + (REASON_FIELDS if self.explain else []))
+
+        return concat_orders(flagged)
+
+    def high_pri_mask(self, orders, responsiveness):
+        """ Returns a mask of the orders of the given responsiveness that are below the appropreate priority """
+
+        return ((orders.responsiveness_level == responsiveness) &
+                (orders.tasking_priority < self.config.thresholds[("high", responsiveness)]) &
+                (~orders.sap_customer_identifier.isin(self.config.excluded_customers[("high", responsiveness)])))
+
+    def low_pri_mask(self, orders, responsiveness):
+        """ Returns a mask of the orders of the given responsiveness that are above the appropreate priority """
+
+        return ((orders.responsiveness_level == responsiveness) &
+                (orders.tasking_priority > self.config.thresholds[("low", responsiveness)]) &
+                (~orders.sap_customer_identifier.isin(self.config.excluded_customers[("low", responsiveness)])))
+
+    def ending_digit_query(self, orders):
+        """ Returns the orders whose ending digit differs from the ending digit of their suggested priority """
+
+        return orders[(orders.tasking_priority % 10) != (orders[self.new_pri_field_name] % 10)]
+
+    def write_high_low_section(self, file, query, responsiveness, query_df):
+        """ Writes the section for orders of the given responsiveness prioritized too high or too low """
+
+        if query_df.empty:
+            file.write("No " + responsiveness + " orders seemed to be too " + query)
+        else:
+            file.write("These " + responsiveness + " orders may be too " + query + "\n" + frame_to_string(query_df.loc[:, self.display_columns[:-1]]))
+
+        file.write("\n\n\n")
+
+    def write_ending_digit_section(self, file, digit, type, result):
+        """ Writes the section for orders that should have ('has') or should not have ('has_not') the given ending digit """
+
+        if type == "has":
+            if result.empty:
+                file.write("No orders need to be changed to have an ending digit of " + str(digit))
+            else:
+                file.write("These orders should have an ending digit of " + str(digit) + "\n")
+                file.write(frame_to_string(result.loc[:, self.display_columns]))
+
+        elif type == "has_not":
+            if result.empty:
+                file.write("No orders found with an erroneous ending digit of " + str(digit))
+            else:
+                file.write("These orders should not have an ending digit of " + str(digit) + "\n")
+                file.write(frame_to_string(result.loc[:, self.display_columns]))
+
+        file.write("\n\n\n")
+
+    def write_report(self, orders, changes, output_path):
+        """
+        Writes the text report
+
+        :param orders: Dataframe, the flagged orders
+        :param changes: Dataframe, the flagged orders with the wrong ending digit
+        :param output_path: String, path of the text file to write
+        """
+
+        empty = orders.iloc[0:0]
+
+        # Split the orders once by responsiveness for the high/low sections
+        by_responsiveness = dict(iter(orders.groupby("responsiveness_level", sort=False, observed=True)))
+
+        # Orders needing a change, grouped once by the ending digit they should have and by the one they have
+        should_have = dict(iter(changes.groupby(changes[self.new_pri_field_name] % 10, sort=False)))
+        should_not_have = dict(iter(changes.groupby(changes.tasking_priority % 10, sort=False)))
+
+        with open(output_path, 'w') as f:
+
+            # Writes middle digit text for each query criteria
+            for query, mask in [("high", self.high_pri_mask), ("low", self.low_pri_mask)]:
+                for responsiveness in RESPONSIVENESS_LEVELS:
+                    query_orders = by_responsiveness.get(responsiveness, empty)
+                    self.write_high_low_section(f, query, responsiveness, query_orders[mask(query_orders, responsiveness)])
+
+            # Writes ending digit text for each ending digit
+            for digit in range(1,10):
+                self.write_ending_digit_section(f, digit, "has", should_have.get(digit, empty))
+                self.write_ending_digit_section(f, digit, "has_not", should_not_have.get(digit, empty))
+
+    def write_changes(self, changes, changes_path):
+        """ Creates a .csv file from the dataframe of all changes needed """
+
+        changes.loc[:, self.display_columns].to_csv(changes_path)
+
+    def write_reasons(self, orders, reasons_path):
+        """
+        Writes the flagged orders with their reason codes to a Parquet file (explain mode), for grouping and filtering the flags
+
+        :param orders: Dataframe, the flagged orders from flag_orders in explain mode
+        :param reasons_path: String, path of the .parquet file to write
+        """
+
+        columns = list(dict.fromkeys(self.display_columns + ["sap_customer_identifier", "responsiveness_level"]))
+        reasons = orders.loc[:, [column for column in columns if column in orders.columns] + REASON_FIELDS]
+
+        # The ending digit check is stored as a flag so it can be filtered on along with the high/low outcome
+        reasons = reasons.assign(wrong_ending=(orders.tasking_priority % 10) != (orders[self.new_pri_field_name] % 10))
+
+        temp_path = str(reasons_path) + ".tmp"
+        reasons.to_parquet(temp_path, index=False)
+        replace_file(temp_path, reasons_path)
+
+    def run(self, chunks, output_path, changes_path, recorder, reasons_path=None):
+        """
+        Runs the whole audit on the given chunks, writes the report and the changes and returns (flagged orders, changes)
+
+        :param chunks: Iterable, cleaned chunks of the deck (see read_chunks)
+        :param output_path: String, path of the text report
+        :param changes_path: String, path of the .csv of changes
+        :param recorder: RunRecorder, times each stage
+        :param reasons_path: String, path of the .parquet of reason codes, written in explain mode
+        """
+
+        # Loading is streamed through the priority calculation so the two are timed as one stage
+        with recorder.stage("load_and_priority") as stage:
+            orders = self.flag_orders(chunks)
+            stage["rows_out"] = len(orders)
+            stage.update(self.schema.memory_report())
+
+        with recorder.stage("ending_digit", len(orders)) as stage:
+            changes = self.ending_digit_query(orders)
+            stage["rows_out"] = len(changes)
+
+        with recorder.stage("report", len(orders)):
+            self.write_report(orders, changes, output_path)
+
+        with recorder.stage("csv_export", len(changes)) as stage:
+            self.write_changes(changes, changes_path)
+            stage["rows_out"] = len(changes)
+
+        if self.explain and reasons_path is not None:
+            with recorder.stage("reasons", len(orders)) as stage:
+                self.write_reasons(orders, reasons_path)
+                stage["rows_out"] = len(orders)
+
+        return orders, changes
@@ -0,0 +1,163 @@
+# This file contains the hotlist index: the hotlist solis read in bulk, kept as a sorted array and saved next to the temp workspace
+# The saved index is reused until the hotlist source changes (sources without local files are read every time), and matches a whole column of external ids at once
+
+import hashlib
+import os
+
+import numpy as np
+
+
+class HotlistIndex(frozenset):
+    """ Set of hotlist solis (as text) with a vectorized membership check over a sorted array """
+
+    def __new__(cls, solis, fingerprint=None):
+        """
+        :param solis: Iterable, the hotlist solis (numbers are matched by their integer text)
+        :param fingerprint: String, fingerprint of the hotlist source the solis were read from
+        """
+
+        # Solis read from a numeric field come back as floats, external ids never have a decimal part
+        values = [str(int(soli)) if isinstance(soli, (float, np.floating)) and float(soli).is_integer() else str(soli)
+                  for soli in solis if soli is not None and soli == soli]
+
+        return cls.from_sorted(np.unique(np.array(values, dtype=str)), fingerprint)
+
+    @classmethod
+    def from_sorted(cls, sorted_solis, fingerprint=None):
+        """ Returns the index of an already sorted, unique numpy array of soli text """
+
+        index = super().__new__(cls, sorted_solis.tolist())
+        index.sorted_solis = sorted_solis
+        index.fingerprint = fingerprint
+
+        return index
+
+    def is_hotlisted(self, external_ids):
+        """
+        Returns a numpy boolean array, True for each external id on the hotlist
+
+        :param external_ids: Array-like, the external ids to check
+        """
+
+        ids = np.asarray(external_ids, dtype=str)
+        if not len(self.sorted_solis) or not len(ids):
+            return np.zeros(len(ids), dtype=bool)
+
+        positions = np.searchsorted(self.sorted_solis, ids).clip(max=len(self.sorted_solis) - 1)
+
+        return self.sorted_solis[positions] == ids
+
+    def matches(self, values):
+        """ Returns the is_hotlisted mask of a series, used by the where clause evaluation of IN nodes """
+
+        return self.is_hotlisted(values)
+
+    def save(self, index_file):
+        """ Writes the index and its source fingerprint, replacing any previous file """
+
+        temp_file = str(index_file) + ".tmp.npz"
+        np.savez(temp_file, solis=self.sorted_solis, fingerprint=np.array(self.fingerprint or ""))
+        os.replace(temp_file, index_file)
+
+    @classmethod
+    def open(cls, index_file):
+        """ Returns the saved index, or None if the file is missing or cannot be read """
+
+        try:
+            with np.load(index_file) as saved:
+                return cls.from_sorted(saved["solis"], str(saved["fingerprint"]) or None)
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def backing_files(path, kind="arcpy"):
+    """
+    Returns the local files whose stats change when the data at the path changes, or None when no local files back it
+    (enterprise geodatabase, memory workspace or service sources)
+
+    :param path: String, the catalog path or file path of the source
+    :param kind: String, 'arcpy' or one of the file source kinds of the adapters
+    """
+
+    if os.path.isfile(path):
+        return [os.path.splitext(path)[0] + ".dbf"] if kind == "shapefile" else [path]
+
+    # Feature classes live inside a file geodatabase folder, its files change when the data is edited
+    folder = path
+    while folder and not os.path.exists(folder):
+        folder = os.path.dirname(folder)
+
+    # Anything else the walk can reach (an .sde connection file, a drive root) does not change with the data
+    if not folder or not (folder == path or folder.lower().endswith(".gdb")) or not os.path.isdir(folder):
+        return None
+
+    return [os.path.join(folder, name) for name in sorted(os.listdir(folder))]
+
+
+def source_fingerprint(source, kind="arcpy"):
+    """
+    Returns a fingerprint of the hotlist source that changes whenever its data may have changed, or None when there are
+    no local files to fingerprint, in which case the source has to be read every time
+
+    :param source: String or arcpy Layer, the hotlist source
+    :param kind: String, 'arcpy' or one of the file source kinds of the adapters
+    """
+
+    digest = hashlib.sha1()
+    path = str(source)
+
+    if kind == "arcpy":
+        import arcpy
+        path = arcpy.Describe(source).catalogPath
+
+        # A definition query changes the solis without changing the data
+        digest.update(str(getattr(source, "definitionQuery", "")).encode())
+
+    files = backing_files(path, kind)
+    if files is None:
+        return None
+
+    digest.update(path.encode())
+
+    for file in files:
+        if os.path.isfile(file):
+            stats = os.stat(file)
+            digest.update(f"{os.path.basename(file)}|{stats.st_size}|{stats.st_mtime_ns}".encode())
+
+    return digest.hexdigest()
+
+
+def read_solis(source, field="soli", kind="arcpy"):
+    """ Returns the solis of the hotlist source read in bulk """
+
+    if kind == "arcpy":
+        import arcpy
+        return arcpy.da.TableToNumPyArray(source, [field], skip_nulls=True)[field].tolist()
+
+    from deck_audit.adapters import read_order_chunks
+    return [soli for chunk in read_order_chunks(source, [field], kind=kind) for soli in chunk[field].tolist()]
+
+
+def load_hotlist(source, index_file=None, field="soli", kind="arcpy"):
+    """
+    Returns the HotlistIndex of the source, from the saved index when the source has not changed since it was saved
+
+    :param source: String or arcpy Layer, the hotlist layer or file
+    :param index_file: String, path of the saved index (.npz), nothing is saved if None
+    :param field: String, the soli field of the hotlist
+    :param kind: String, 'arcpy' or one of the file source kinds of the adapters
+    """
+
+    fingerprint = source_fingerprint(source, kind)
+
+    # A source without a fingerprint may have changed since any saved index, it is read every time
+    if fingerprint is not None and index_file and os.path.exists(index_file):
+        saved = HotlistIndex.open(index_file)
+        if saved is not None and saved.fingerprint == fingerprint:
+            return saved
+
+    index = HotlistIndex(read_solis(source, field, kind), fingerprint)
+    if index_file and fingerprint is not None:
+        index.save(index_file)
+
+    return index
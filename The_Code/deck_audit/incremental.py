@@ -0,0 +1,137 @@
+# This file contains the snapshot used by the incremental audit
+# The inputs and outputs of the new columns are kept per external_id in Parquet. Each run is diffed against the snapshot
+# (inserted, updated and deleted orders), only inserted and updated orders are recomputed and only those changes are applied to it
+# The output shapefile is still written whole from every kept order, so it is the same as a full rebuild
+
+import hashlib
+import os
+
+import pandas as pd
+
+
+class AuditSnapshot():
+    """ New column inputs/outputs of the last run, keyed on external_id """
+
+    def __init__(self, path, key, input_fields, output_fields, key_field="external_id"):
+        """
+        :param path: String, folder holding the snapshot file
+        :param key: String, fingerprint of everything besides the row inputs that the outputs depend on (config, code blocks)
+        :param input_fields: List, the fields read by the new columns, in ColumnCalculator.input_fields order
+        :param output_fields: List, the new columns, in ColumnCalculator.output_fields order
+        :param key_field: String, the field identifying an order
+        """
+
+        self.path = str(path)
+        self.key = key
+        self.input_fields = list(input_fields)
+        self.output_fields = list(output_fields)
+        self.key_field = key_field
+        self.previous = dict()
+        self.changes = dict()
+        self.seen = set()
+        self.inserted = 0
+        self.updated = 0
+        self.recomputed = 0
+
+        # A snapshot made with a different config has another key and cannot be reused
+        if os.path.exists(self.snapshot_file):
+            self.previous = self.read(self.snapshot_file)
+
+    @property
+    def snapshot_file(self):
+        return os.path.join(self.path, self.key + ".parquet")
+
+    @property
+    def deleted(self):
+        """ Number of orders in the last run that are not in this one """
+
+        return len(self.previous.keys() - self.seen)
+
+    def read(self, snapshot_file):
+        """ Returns a dictionary of external_id/(inputs, outputs) of the snapshot file """
+
+        frame = pd.read_parquet(snapshot_file, columns=self.input_fields + self.output_fields)
+
+        # Missing values are compared as None, as the cursor gives them
+        frame = frame.astype(object).where(frame.notna(), None)
+        inputs_end = len(self.input_fields)
+
+        return {row[0]: (row[1:inputs_end + 1], row[inputs_end + 1:]) for row in frame.itertuples(name=None)}
+
+    def outputs(self, external_id, inputs):
+        """
+        Returns the outputs of the last run if the order's inputs are unchanged, otherwise None (an inserted or updated order)
+
+        :param external_id: String, the order id
+        :param inputs: Tuple, the values of the fields read by the new columns
+        """
+
+        previous = self.previous.get(external_id)
+
+        if previous is None:
+            self.inserted += 1
+            return None
+
+        if previous[0] != inputs:
+            self.updated += 1
+            return None
+
+        return previous[1]
+
+    def record(self, external_id, inputs, outputs):
+        """ Marks the order as seen in this run, keeping its inputs and outputs if they differ from the snapshot """
+
+        self.seen.add(external_id)
+
+        if self.previous.get(external_id) != (inputs, outputs):
+            self.changes[external_id] = (inputs, outputs)
+
+    def save(self):
+        """ Applies the inserted, updated and deleted orders to the snapshot and writes it, replacing snapshots of other keys """
+
+        rows = {external_id: values for external_id, values in self.previous.items() if external_id in self.seen}
+        rows.update(self.changes)
+
+        frame = pd.DataFrame.from_records([(external_id,) + inputs + outputs for external_id, (inputs, outputs) in rows.items()],
+                                          columns=[self.key_field] + self.input_fields + self.output_fields).set_index(self.key_field)
+
+        os.makedirs(self.path, exist_ok=True)
+
+        # Write to a temporary file first so a failed write never leaves a partial snapshot
+        temp_file = self.snapshot_file + ".tmp"
+        frame.to_parquet(temp_file)
+        os.replace(temp_file, self.snapshot_file)
+
+        for name in os.listdir(self.path):
+            if name.endswith(".parquet") and os.path.join(self.path, name) != self.snapshot_file:
+                os.remove(os.path.join(self.path, name))
+
+    def counts(self):
+        """ Returns a dictionary of the orders inserted, updated and deleted since the last run and the orders recomputed """
+
+        return {"inserted": self.inserted, "updated": self.updated, "deleted": self.deleted, "recomputed": self.recomputed}
+
+    def summary(self):
+        """ Returns a one line description of the changes since the last run """
+
+        return (f"Recomputed {self.recomputed} of {len(self.seen)} orders "
+                f"(inserted {self.inserted}, updated {self.updated}, deleted {self.deleted})")
+
+
+def snapshot_key(config_file, calculator):
+    """
+    Returns a fingerprint of the config file and the new column definitions
+
+    :param config_file: String, path to Sensitive_Parameters.json
+    :param calculator: ColumnCalculator, the new columns
+    """
+
+    digest = hashlib.sha1()
+
+    with open(config_file, 'rb') as data:
+        digest.update(data.read())
+
+    for spec in calculator.specs:
+        digest.update("\0".join([spec.field_name, spec.expression, spec.code_block]).encode())
+
+    return digest.hexdigest()
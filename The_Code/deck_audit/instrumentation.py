@@ -0,0 +1,111 @@
+# This file contains the per-stage timing used to instrument Rivedo.run_workflow and Queries
+# Each run produces one record of stage durations, row counts and peak memory, appended as a JSON line to a log file
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def peak_memory_mb():
+    """ Returns the peak memory of this process in MB, or None when it cannot be measured """
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+    except ImportError:
+        pass
+
+    # Windows has no resource module, psutil reports the peak working set instead
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+
+    except (ImportError, AttributeError):
+        return None
+
+
+class RunRecorder():
+    """ Times the stages of one run and writes them as a single structured record """
+
+    def __init__(self, workflow, profile=False, **details):
+        """
+        :param workflow: String, name of the instrumented workflow ('Rivedo', 'Queries')
+        :param profile: Boolean, also run cProfile over every stage
+        :param details: Any other values to keep in the record (username, settings, ...)
+        """
+
+        self.record = {"workflow": workflow,
+                       "started": datetime.now().isoformat(timespec="seconds"),
+                       **details,
+                       "stages": []}
+        self.start = time.perf_counter()
+        self.profiler = cProfile.Profile() if profile else None
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Times the enclosed block as a stage of the run
+        The yielded dictionary can be given 'rows_out' (or any other value) to keep in the stage record
+
+        :param name: String, name of the stage
+        :param rows_in: Int, number of rows the stage starts with
+        """
+
+        stage = {"name": name, "rows_in": rows_in, "rows_out": None}
+        start = time.perf_counter()
+
+        if self.profiler is not None:
+            self.profiler.enable()
+
+        try:
+            yield stage
+
+        except Exception as error:
+            stage["error"] = repr(error)
+            raise
+
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+
+            stage["seconds"] = round(time.perf_counter() - start, 4)
+            stage["peak_memory_mb"] = peak_memory_mb()
+            self.record["stages"].append(stage)
+
+    def slowest(self):
+        """ Returns the recorded stage that took the longest, or None if no stage was recorded """
+
+        return max(self.record["stages"], key=lambda stage: stage["seconds"], default=None)
+
+    def finish(self, log_file, **details):
+        """
+        Completes the record, appends it as a JSON line to the log file and returns it
+        When profiling, the cProfile stats are written next to the log file
+
+        :param log_file: String, path of the JSON lines log
+        :param details: Any values known only at the end of the run (row counts, ...)
+        """
+
+        self.record.update(details)
+        self.record["seconds"] = round(time.perf_counter() - self.start, 4)
+        self.record["peak_memory_mb"] = peak_memory_mb()
+
+        if self.profiler is not None:
+            profile_file = os.path.splitext(str(log_file))[0] + "_" + self.record["started"].replace(":", "-") + ".prof"
+            pstats.Stats(self.profiler).dump_stats(profile_file)
+            self.record["profile"] = profile_file
+
+        with open(log_file, 'a') as log:
+            log.write(json.dumps(self.record, default=str) + "\n")
+
+        return self.record
@@ -0,0 +1,24 @@
+# This file contains the result of a metrics evaluation, the metric rules of deck_audit.rules are counted in a single scan
+
+
+class MetricsResult():
+    """ Counts and timings of one metrics evaluation """
+
+    def __init__(self, counts, timings, rows, total_time):
+        """
+        :param counts: Dict, metric name/number of matching orders (in config order)
+        :param timings: Dict, metric name/seconds spent evaluating the metric
+        :param rows: Int, number of orders scanned
+        :param total_time: Float, seconds spent on the whole evaluation
+        """
+
+        self.counts = counts
+        self.timings = timings
+        self.rows = rows
+        self.total_time = total_time
+
+    def __getitem__(self, metric):
+        return self.counts[metric]
+
+    def __iter__(self):
+        return iter(self.counts)
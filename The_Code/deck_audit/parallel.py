@@ -0,0 +1,125 @@
+# This file contains the multi-process audit, which splits the order deck into partitions and suggests priorities and flags orders in worker processes
+# Each partition is pickled to its worker, which costs more than the vectorized priorities themselves: more than one worker is
+# slower at every deck size in benchmarks/parallel_scaling.py, so the default is one worker running in this process
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from deck_audit.priority import PriorityEngine
+
+
+# Priority engine of a worker process, built once by the pool initializer
+_worker_engine = None
+
+
+def _start_worker(query_input):
+    """ Builds the priority engine of a worker process """
+
+    global _worker_engine
+    _worker_engine = PriorityEngine(query_input)
+
+
+def _audit_partition(orders):
+    """ Returns the suggested priorities and flags of one partition """
+
+    suggested = _worker_engine.suggested_priority(orders)
+
+    return suggested, _worker_engine.flagged(orders, suggested)
+
+
+def _explain_partition(orders):
+    """ Returns the suggested priorities, flags and reason codes of one partition """
+
+    return _worker_engine.explain(orders)
+
+
+def partition_keys(orders, partitions, partition_by="customer"):
+    """
+    Returns the partition number of each order
+
+    :param orders: Dataframe, the orders
+    :param partitions: Int, number of partitions
+    :param partition_by: String, 'customer' (hash of sap_customer_identifier) or 'responsiveness'
+    """
+
+    if partition_by == "responsiveness":
+        codes = pd.factorize(orders["responsiveness_level"], sort=True)[0]
+        return np.where(codes < 0, 0, codes) % partitions
+
+    if partition_by == "customer":
+        # hash_pandas_object is stable across processes and runs, unlike hash()
+        hashes = pd.util.hash_pandas_object(orders["sap_customer_identifier"], index=False).to_numpy()
+        return (hashes % np.uint64(partitions)).astype("int64")
+
+    raise ValueError(f"Unknown partition_by '{partition_by}', use 'customer' or 'responsiveness'")
+
+
+class ParallelAuditor():
+    """ Suggests priorities and flags orders across a pool of worker processes """
+
+    def __init__(self, query_input, workers=1, partition_by="customer", index=None):
+        """
+        :param query_input: Dict, the query inputs section of the config file
+        :param workers: Int, number of worker processes (1 runs in this process, and is the fastest, see the top of this file)
+        :param partition_by: String, 'customer' or 'responsiveness'
+        :param index: CustomerIndex, already compiled from the query inputs, used in this process
+        """
+
+        self.query_input = query_input
+        self.workers = max(1, int(workers))
+        self.partition_by = partition_by
+        self.pool = None
+        self.engine = PriorityEngine(query_input, index) if self.workers == 1 else None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_start_worker, initargs=(self.query_input,))
+        return self
+
+    def __exit__(self, *args):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        return False
+
+    def audit(self, orders):
+        """
+        Returns (suggested priority series, flagged mask series), both in the row order of the given orders
+
+        :param orders: Dataframe, must contain the ORDER_FIELDS columns
+        """
+
+        if self.pool is None or orders.empty:
+            engine = self.engine or PriorityEngine(self.query_input)
+            suggested = engine.suggested_priority(orders)
+            return suggested, engine.flagged(orders, suggested)
+
+        return self.run_partitions(orders, _audit_partition)
+
+    def explain(self, orders):
+        """
+        Returns (suggested priority series, flagged mask series, reason codes dataframe), all in the row order of the given orders
+
+        :param orders: Dataframe, must contain the ORDER_FIELDS columns
+        """
+
+        if self.pool is None or orders.empty:
+            return (self.engine or PriorityEngine(self.query_input)).explain(orders)
+
+        return self.run_partitions(orders, _explain_partition)
+
+    def run_partitions(self, orders, function):
+        """ Returns the results of the given worker function over the partitions of the orders, each merged back in the row order of the orders """
+
+        # Work on positions so the merge does not depend on the index being unique
+        positioned = orders.reset_index(drop=True)
+        keys = partition_keys(positioned, self.workers, self.partition_by)
+        partitions = [positioned[keys == number] for number in range(self.workers)]
+        partitions = [partition for partition in partitions if not partition.empty]
+
+        results = list(self.pool.map(function, partitions))
+
+        # Merge back in the original row order, whatever order the workers finished in
+        return tuple(pd.concat([result[i] for result in results]).sort_index().set_axis(orders.index) for i in range(len(results[0])))
@@ -0,0 +1,144 @@
+# This file contains the columnar version of the priority 'decision tree' used to suggest a priority for every order in the deck
+
+import numpy as np
+import pandas as pd
+
+from deck_audit.compact import map_values, no_spacecraft
+from deck_audit.customer_index import CustomerIndex
+
+
+# Order fields read by the priority and high/low rules
+ORDER_FIELDS = ["tasking_priority", "sap_customer_identifier", "responsiveness_level", "ge01", "wv01", "wv02"]
+
+# Reason codes of the explain mode, the position of a code in its list is the value stored in the categorical
+# The middle digit comes from a middle_digit_cust_list or is kept from the current priority
+MIDDLE_REASONS = ["current_priority"] + ["middle_list_" + digit for digit in "0123456789"]
+
+# The ending digit comes from an ending_digit_cust_list or from the spacecraft rule (3 with none set, 4 otherwise)
+ENDING_REASONS = ["no_spacecraft", "spacecraft"] + ["ending_list_" + digit for digit in "0123456789"]
+
+# Outcome of the high/low checks in the order of the High_Low column's decision tree (the low check comes first)
+HIGH_LOW_REASONS = ["Standard", "High", "Low", "Excluded_high", "Excluded_low"]
+
+REASON_FIELDS = ["middle_reason", "ending_reason", "high_low_reason"]
+
+
+class PriorityEngine():
+    """ Computes the suggested priority for a whole dataframe of orders at once """
+
+    def __init__(self, query_input, index=None):
+        """ Builds the customer to digit lookups once from the query inputs
+
+            :param query_input: Dict, the query inputs section of the config file
+            :param index: CustomerIndex, already compiled from the query inputs (e.g. by AuditConfig)
+        """
+
+        self.index = index or CustomerIndex(query_input)
+
+    def digits(self, orders):
+        """
+        Returns numpy arrays of the middle digit and ending digit of the suggested priority, and of the customer list digits
+        they came from (NaN where the customer is in no list)
+
+        :param orders: Dataframe, must contain tasking_priority, sap_customer_identifier and ge01, wv02 and wv01 (or their packed spacecraft column)
+        """
+
+        priority = orders["tasking_priority"].to_numpy()
+        cust = orders["sap_customer_identifier"]
+
+        # Sets the middle digit, falling back to the current middle digit of the priority
+        listed_middle = map_values(cust, self.index.middle_digit_lookup)
+        middle_digit = np.where(np.isnan(listed_middle), (priority.astype("int64") - 700) // 10, listed_middle)
+
+        # Sets the ending digit, falling back to 3 for orders with no spacecraft and 4 for all others
+        listed_ending = map_values(cust, self.index.ending_digit_lookup)
+        ending_digit = np.select([~np.isnan(listed_ending), no_spacecraft(orders)], [listed_ending, 3], 4)
+
+        return middle_digit, ending_digit, listed_middle, listed_ending
+
+    def suggested_priority(self, orders, digits=None):
+        """
+        Returns a series of suggested priorities for the given orders
+
+        :param orders: Dataframe, must contain tasking_priority, sap_customer_identifier and ge01, wv02 and wv01 (or their packed spacecraft column)
+        :param digits: Tuple, the result of digits(orders) when already computed
+        """
+
+        middle_digit, ending_digit = (digits or self.digits(orders))[:2]
+
+        return pd.Series(700 + (middle_digit * 10) + ending_digit, index=orders.index).astype("int64")
+
+    def excluded(self, orders, query):
+        """
+        Returns a mask of the orders whose customer is excluded from the given check for the order's responsiveness
+
+        :param orders: Dataframe, must contain sap_customer_identifier and responsiveness_level columns
+        :param query: String, either 'high' or 'low'
+        """
+
+        bits = {resp: bit for (check, resp), bit in self.index.flag_bits.items() if check == query}
+        order_bits = np.nan_to_num(map_values(orders["responsiveness_level"], bits)).astype("int64")
+        cust_flags = np.nan_to_num(map_values(orders["sap_customer_identifier"], self.index.exclusion_flags)).astype("int64")
+
+        return pd.Series((cust_flags & order_bits) != 0, index=orders.index)
+
+    def too_high(self, orders):
+        """ Returns a mask of the orders below the high priority threshold of their responsiveness (excluded customers are not flagged) """
+
+        threshold = map_values(orders["responsiveness_level"], self.index.high_pri)
+
+        return (orders["tasking_priority"] < threshold) & ~self.excluded(orders, "high")
+
+    def too_low(self, orders):
+        """ Returns a mask of the orders above the low priority threshold of their responsiveness (excluded customers are not flagged) """
+
+        threshold = map_values(orders["responsiveness_level"], self.index.low_pri)
+
+        return (orders["tasking_priority"] > threshold) & ~self.excluded(orders, "low")
+
+    def flagged(self, orders, suggested):
+        """
+        Returns a mask of the orders that are too high, too low or have the wrong ending digit
+
+        :param orders: Dataframe, the orders
+        :param suggested: Series, the suggested priority of each order
+        """
+
+        return ((orders["tasking_priority"] % 10) != (suggested % 10)) | self.too_high(orders) | self.too_low(orders)
+
+    def reasons(self, orders, digits=None):
+        """
+        Returns a dataframe of the reason codes of each order: which rule set the middle digit and the ending digit of the
+        suggested priority, and the outcome of the high/low checks (categoricals of MIDDLE_REASONS, ENDING_REASONS, HIGH_LOW_REASONS)
+
+        :param orders: Dataframe, the orders
+        :param digits: Tuple, the result of digits(orders) when already computed
+        """
+
+        middle_digit, ending_digit, listed_middle, listed_ending = digits or self.digits(orders)
+
+        # Code 0 is the fallback, list digit d is code d + 1 (middle) or d + 2 (ending, after the two spacecraft codes)
+        middle_codes = np.where(np.isnan(listed_middle), 0, np.nan_to_num(listed_middle) + 1).astype("int8")
+        ending_codes = np.where(np.isnan(listed_ending), np.where(ending_digit == 3, 0, 1), np.nan_to_num(listed_ending) + 2).astype("int8")
+
+        priority = orders["tasking_priority"].to_numpy()
+        low = (priority > map_values(orders["responsiveness_level"], self.index.low_pri))
+        high = (priority < map_values(orders["responsiveness_level"], self.index.high_pri))
+        high_low_codes = np.select([low & self.excluded(orders, "low").to_numpy(), low, high & self.excluded(orders, "high").to_numpy(), high],
+                                   [4, 2, 3, 1], 0).astype("int8")
+
+        return pd.DataFrame({"middle_reason": pd.Categorical.from_codes(middle_codes, MIDDLE_REASONS),
+                             "ending_reason": pd.Categorical.from_codes(ending_codes, ENDING_REASONS),
+                             "high_low_reason": pd.Categorical.from_codes(high_low_codes, HIGH_LOW_REASONS)}, index=orders.index)
+
+    def explain(self, orders):
+        """
+        Returns (suggested priority series, flagged mask series, reason codes dataframe), the digits are worked out once for all three
+
+        :param orders: Dataframe, the orders
+        """
+
+        digits = self.digits(orders)
+        suggested = self.suggested_priority(orders, digits)
+
+        return suggested, self.flagged(orders, suggested), self.reasons(orders, digits)
@@ -0,0 +1,240 @@
+# This file contains the publish step of the shared Rivedo shapefile
+# The new files are staged in a folder on the same volume and swapped in with renames, so readers never see a half copied file
+# The files are renamed one at a time, a reader opening the shapefile during the swap can still pair a new .dbf with the old .shp/.shx
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from datetime import datetime
+
+
+# Files that make up the shapefile, in the order they are swapped in (the .shp last so a reader opening it finds the rest already replaced)
+COMPONENT_EXTENSIONS = [".cpg", ".prj", ".dbf", ".shx", ".shp"]
+
+# Bytes of the .dbf header holding the date of last update, ignored by the content hash
+DBF_DATE_BYTES = slice(1, 4)
+
+# Attempts made at each rename, a file open in another program can briefly block it on Windows
+REPLACE_ATTEMPTS = 5
+
+
+def shapefile_files(folder, name):
+    """
+    Returns the names of all files of the named shapefile in the folder (components, indexes, metadata), .shp last
+
+    :param folder: String, the folder to look in
+    :param name: String, the shapefile name without extension
+    """
+
+    if not os.path.isdir(folder):
+        return []
+
+    files = [file for file in os.listdir(folder) if file.split(".")[0] == name and os.path.isfile(os.path.join(folder, file))]
+
+    # Components in swap order, any extra files (.sbn, .shp.xml, ...) before them
+    order = {name + extension: number for number, extension in enumerate(COMPONENT_EXTENSIONS, start=1)}
+
+    return sorted(files, key=lambda file: (order.get(file, 0), file))
+
+
+def content_hash(folder, name):
+    """
+    Returns a hash of the shapefile components in the folder, or None if the .shp is missing
+    Only the data is hashed, not the dates written by the export, so re-exporting the same orders gives the same hash
+
+    :param folder: String, the folder to look in
+    :param name: String, the shapefile name without extension
+    """
+
+    if not os.path.exists(os.path.join(folder, name + ".shp")):
+        return None
+
+    digest = hashlib.sha1()
+
+    for extension in COMPONENT_EXTENSIONS:
+        file_path = os.path.join(folder, name + extension)
+        if not os.path.exists(file_path):
+            continue
+
+        with open(file_path, 'rb') as data:
+            content = bytearray(data.read())
+
+        if extension == ".dbf":
+            content[DBF_DATE_BYTES] = b"\x00\x00\x00"
+
+        digest.update(extension.encode() + len(content).to_bytes(8, "little"))
+        digest.update(content)
+
+    return digest.hexdigest()
+
+
+def replace_file(source, destination):
+    """ Renames source over destination, retrying briefly while the destination is locked """
+
+    for attempt in range(REPLACE_ATTEMPTS):
+        try:
+            os.replace(source, destination)
+            return
+        except PermissionError:
+            if attempt == REPLACE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.2 * (attempt + 1))
+
+
+class ShapefilePublisher():
+    """ Publishes a staged shapefile to a shared folder with renames, keeping previous versions for rollback """
+
+    def __init__(self, output_dir, name, staging_dir, versions_dir, keep_versions=3):
+        """
+        :param output_dir: String, the shared folder readers load the shapefile from
+        :param name: String, the shapefile name without extension
+        :param staging_dir: String, folder the new shapefile is exported to, must be on the same volume as output_dir
+        :param versions_dir: String, folder holding the previous versions
+        :param keep_versions: Int, number of previous versions kept
+        """
+
+        self.output_dir = str(output_dir)
+        self.name = name
+        self.staging_dir = str(staging_dir)
+        self.versions_dir = str(versions_dir)
+        self.keep_versions = keep_versions
+        self.manifest_file = os.path.join(self.output_dir, "." + name + ".publish.json")
+
+    def clear_staging(self):
+        """ Removes any files of the shapefile left in the staging folder, e.g. by a failed run """
+
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+        for file in shapefile_files(self.staging_dir, self.name):
+            os.remove(os.path.join(self.staging_dir, file))
+
+    def published_hash(self):
+        """ Returns the content hash of the published shapefile, from the manifest when it is present """
+
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r') as manifest:
+                return json.load(manifest).get("hash")
+
+        return content_hash(self.output_dir, self.name)
+
+    def publish(self):
+        """
+        Swaps the staged shapefile into the output folder and returns True, or returns False without touching
+        the output folder when the staged data is the same as the published data
+        """
+
+        staged_hash = content_hash(self.staging_dir, self.name)
+        if staged_hash is None:
+            raise Exception(f"No staged shapefile '{self.name}' found in {self.staging_dir}")
+
+        if staged_hash == self.published_hash():
+            self.clear_staging()
+            return False
+
+        version_dir = self.save_version()
+        try:
+            self.swap_in(self.staging_dir, staged_hash)
+        except OSError:
+            # An interrupted swap leaves old and new files side by side, put the previous version back before failing
+            if version_dir is not None:
+                self.restore_files(version_dir)
+            raise
+        self.prune_versions()
+
+        return True
+
+    def swap_in(self, source_dir, source_hash):
+        """
+        Moves the shapefile files of the source folder into the output folder, one rename per file
+        Each file is replaced whole, but not all at once: until the .shp is renamed the folder holds a mix of both versions
+        """
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        new_files = shapefile_files(source_dir, self.name)
+
+        for file in new_files:
+            replace_file(os.path.join(source_dir, file), os.path.join(self.output_dir, file))
+
+        # Files of the old version the new one does not have (e.g. a spatial index) would no longer match the data
+        for file in shapefile_files(self.output_dir, self.name):
+            if file not in new_files:
+                os.remove(os.path.join(self.output_dir, file))
+
+        with open(self.manifest_file + ".tmp", 'w') as manifest:
+            json.dump({"hash": source_hash, "published": datetime.now().isoformat(timespec="seconds")}, manifest)
+        os.replace(self.manifest_file + ".tmp", self.manifest_file)
+
+    def restore_files(self, version_dir):
+        """ Copies the files of a version back over the output folder, without touching the manifest or the kept versions """
+
+        version_files = shapefile_files(version_dir, self.name)
+        for file in version_files:
+            shutil.copy2(os.path.join(version_dir, file), os.path.join(self.output_dir, file))
+
+        for file in shapefile_files(self.output_dir, self.name):
+            if file not in version_files:
+                os.remove(os.path.join(self.output_dir, file))
+
+    def save_version(self):
+        """ Copies the currently published shapefile into a new version folder, returns its path or None if nothing is published """
+
+        current_files = shapefile_files(self.output_dir, self.name)
+        if not current_files:
+            return None
+
+        version_dir = os.path.join(self.versions_dir, datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f"))
+        os.makedirs(version_dir)
+
+        for file in current_files:
+            shutil.copy2(os.path.join(self.output_dir, file), os.path.join(version_dir, file))
+
+        return version_dir
+
+    def versions(self):
+        """ Returns the kept version folders, newest first """
+
+        if not os.path.isdir(self.versions_dir):
+            return []
+
+        return sorted((os.path.join(self.versions_dir, version) for version in os.listdir(self.versions_dir)), reverse=True)
+
+    def prune_versions(self):
+        """ Removes all but the keep_versions newest versions """
+
+        for version_dir in self.versions()[self.keep_versions:]:
+            shutil.rmtree(version_dir, ignore_errors=True)
+
+    def rollback(self, version_dir=None):
+        """
+        Publishes a kept version again and returns its folder
+        Without a version the newest is restored and taken off the kept versions, the current files are not kept, so each
+        call goes back one more publish. With a version the current files are kept as a new version first
+
+        :param version_dir: String, the version folder to restore (the newest if None)
+        """
+
+        versions = self.versions()
+        step_back = version_dir is None
+        if step_back:
+            if not versions:
+                raise Exception(f"No previous versions of '{self.name}' in {self.versions_dir}")
+            version_dir = versions[0]
+
+        # Stage a copy of the version so the kept version itself stays intact until the swap is done
+        self.clear_staging()
+        for file in shapefile_files(version_dir, self.name):
+            shutil.copy2(os.path.join(version_dir, file), os.path.join(self.staging_dir, file))
+
+        if not step_back:
+            self.save_version()
+
+        self.swap_in(self.staging_dir, content_hash(self.staging_dir, self.name))
+
+        if step_back:
+            shutil.rmtree(version_dir, ignore_errors=True)
+        self.prune_versions()
+
+        return version_dir
@@ -0,0 +1,69 @@
+# This file contains helpers for writing the text report of flagged orders
+
+import pandas as pd
+
+from pandas.api.types import is_integer_dtype, is_string_dtype
+
+
+def can_format_fast(df):
+    """ Returns True if frame_to_string can reproduce df.to_string() for the given dataframe """
+
+    if df.index.name is not None or not is_integer_dtype(df.index.dtype) or df.columns.has_duplicates:
+        return False
+
+    for column in df.columns:
+        values = df[column]
+        if not isinstance(column, str) or values.isna().any():
+            return False
+
+        # Categoricals of text format like the text itself, only their categories need checking
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = pd.Series(values.cat.categories)
+
+        if not (is_integer_dtype(values.dtype) or (is_string_dtype(values.dtype) and values.map(type).eq(str).all())):
+            return False
+
+    return True
+
+
+def format_column(values):
+    """ Returns the values formatted the way DataFrame.to_string formats them (before padding) """
+
+    text = values.astype(str).astype(object)
+
+    # Integers get a space in place of the sign of positive numbers, strings a leading space
+    if is_integer_dtype(values.dtype):
+        return text.where(values < 0, " " + text)
+
+    return " " + text
+
+
+def frame_to_string(df):
+    """
+    Returns the same text as df.to_string() for frames of integer and string columns, using vectorized string operations
+    Frames with other dtypes or missing values fall back to to_string
+
+    :param df: Dataframe, the orders to format
+    """
+
+    if df.empty or not can_format_fast(df):
+        return df.to_string()
+
+    columns = [df.index.astype(str).tolist()]
+    widths = [max(map(len, columns[0]))]
+    header = " " * widths[0]
+
+    for column in df.columns:
+        text = format_column(df[column]).tolist()
+
+        # Headers of numeric columns also get a leading space
+        label = " " + column if is_integer_dtype(df[column].dtype) else column
+        widths.append(max(len(label), max(map(len, text))))
+
+        columns.append(text)
+        header += " " + label.rjust(widths[-1])
+
+    # Index left justified, values right justified, one space between columns
+    line = " ".join([f"{{:<{widths[0]}}}"] + [f"{{:>{width}}}" for width in widths[1:]])
+
+    return header + "\n" + "\n".join(map(line.format, *columns))
@@ -0,0 +1,236 @@
+# This file contains the SQLite store of the flagged orders and metrics of every audit run
+# History questions (how long an order has been flagged, flags per customer, changes since the last run) are answered from indexes instead of old shapefiles
+
+import json
+import sqlite3
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from deck_audit.priority import PriorityEngine
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    workflow TEXT NOT NULL,
+    run_time TEXT NOT NULL,
+    username TEXT,
+    records INTEGER,
+    metrics TEXT
+);
+CREATE TABLE IF NOT EXISTS flags (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    external_id TEXT NOT NULL,
+    customer TEXT,
+    responsiveness TEXT,
+    tasking_priority INTEGER,
+    suggested_priority INTEGER,
+    wrong_ending INTEGER,
+    too_high INTEGER,
+    too_low INTEGER
+);
+CREATE TABLE IF NOT EXISTS customer_flags (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    customer TEXT,
+    flags INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_by_time ON runs (workflow, run_time);
+CREATE INDEX IF NOT EXISTS flags_by_run ON flags (run_id, external_id);
+CREATE INDEX IF NOT EXISTS flags_by_order ON flags (external_id, run_id);
+CREATE INDEX IF NOT EXISTS flags_by_customer ON flags (customer, run_id);
+CREATE INDEX IF NOT EXISTS customer_flags_by_run ON customer_flags (run_id);
+"""
+
+# Columns of a flagged orders dataframe stored for each order, in flags table order
+FLAG_COLUMNS = ["external_id", "sap_customer_identifier", "responsiveness_level", "tasking_priority", "Suggested_Priority",
+                "wrong_ending", "too_high", "too_low"]
+
+
+def flag_orders(orders, query_input, explain=False, index=None):
+    """
+    Returns the orders that are too high, too low or have the wrong ending digit, with the columns stored by ResultsStore.record_run
+
+    :param orders: Dataframe, must contain external_id and the ORDER_FIELDS columns
+    :param query_input: Dict, the query inputs section of the config file
+    :param explain: Boolean, also add the reason code columns of each order (see PriorityEngine.reasons)
+    :param index: CustomerIndex, already compiled from the query inputs (e.g. AuditConfig.customer_index), compiled here if None
+    """
+
+    engine = PriorityEngine(query_input, index)
+
+    # The reason codes are worked out from the same digits as the suggested priority
+    digits = engine.digits(orders)
+    suggested = engine.suggested_priority(orders, digits)
+    if explain:
+        orders = orders.assign(**engine.reasons(orders, digits))
+
+    flags = orders.assign(Suggested_Priority=suggested,
+                          wrong_ending=(orders["tasking_priority"] % 10) != (suggested % 10),
+                          too_high=engine.too_high(orders),
+                          too_low=engine.too_low(orders))
+
+    return flags[flags["wrong_ending"] | flags["too_high"] | flags["too_low"]]
+
+
+def sql_value(value, cast):
+    """ Returns the value cast for SQLite, or None (NULL) for a missing value, e.g. a blank .dbf number or a null customer """
+
+    return None if pd.isna(value) else cast(value)
+
+
+class ResultsStore():
+    """ History of audit runs in a local SQLite database """
+
+    def __init__(self, database_file, workflow="Rivedo"):
+        """
+        :param database_file: String, path of the SQLite file (created if missing)
+        :param workflow: String, name of the workflow whose runs are recorded and queried
+        """
+
+        self.workflow = workflow
+        self.connection = sqlite3.connect(str(database_file))
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def close(self):
+        self.connection.close()
+
+    def record_run(self, flagged, metrics=None, username=None, records=None, run_time=None):
+        """
+        Stores one run and its flagged orders, returns the run id
+
+        :param flagged: Dataframe, flagged orders with the FLAG_COLUMNS columns (see flag_orders)
+        :param metrics: Dict, metric name/value of the run
+        :param username: String, user who ran the audit
+        :param records: Int, number of orders in the run's output
+        :param run_time: Datetime, time of the run (now if None)
+        """
+
+        run_time = (run_time or datetime.now()).isoformat(timespec="seconds")
+        rows = flagged.loc[:, FLAG_COLUMNS].itertuples(index=False)
+
+        with self.connection:
+            cursor = self.connection.execute("INSERT INTO runs (workflow, run_time, username, records, metrics) VALUES (?, ?, ?, ?, ?)",
+                                             (self.workflow, run_time, username, records, json.dumps(metrics, default=str)))
+            run_id = cursor.lastrowid
+            self.connection.executemany("INSERT INTO flags VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                        ((run_id, str(ext_id), sql_value(cust, str), sql_value(resp, str), sql_value(pri, int), sql_value(suggested, int),
+                                          int(ending), int(high), int(low))
+                                         for ext_id, cust, resp, pri, suggested, ending, high, low in rows))
+
+            # Per customer totals so the windowed counts only read one row per customer and run
+            self.connection.execute("""INSERT INTO customer_flags SELECT run_id, customer, COUNT(*) FROM flags
+                                       WHERE run_id = ? GROUP BY customer""", (run_id,))
+
+        return run_id
+
+    def runs(self, limit=None):
+        """ Returns a list of (run id, run time) of this workflow, newest first """
+
+        query = "SELECT run_id, run_time FROM runs WHERE workflow = ? ORDER BY run_time DESC, run_id DESC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+
+        return self.connection.execute(query, (self.workflow,)).fetchall()
+
+    def misprioritized_for(self, external_id):
+        """
+        Returns how long the order has been flagged without a break, up to the latest run, as
+        (time since the first run of the streak, number of runs), or None if the latest run did not flag it
+
+        :param external_id: String, the order id
+        """
+
+        flagged_runs = {row[0] for row in self.connection.execute("SELECT run_id FROM flags WHERE external_id = ?", (str(external_id),))}
+        if not flagged_runs:
+            return None
+
+        streak = []
+        for run_id, run_time in self.runs():
+            if run_id not in flagged_runs:
+                break
+            streak.append(run_time)
+
+        if not streak:
+            return None
+
+        return datetime.fromisoformat(streak[0]) - datetime.fromisoformat(streak[-1]), len(streak)
+
+    def flag_counts_by_customer(self, days=30, now=None):
+        """
+        Returns a dictionary of customer/number of flags over the runs of the last given days, most flagged first
+
+        :param days: Int, length of the window in days
+        :param now: Datetime, end of the window (now if None)
+        """
+
+        since = ((now or datetime.now()) - timedelta(days=days)).isoformat(timespec="seconds")
+
+        rows = self.connection.execute("""SELECT customer_flags.customer, SUM(customer_flags.flags)
+                                          FROM runs JOIN customer_flags ON customer_flags.run_id = runs.run_id
+                                          WHERE runs.workflow = ? AND runs.run_time >= ?
+                                          GROUP BY customer_flags.customer ORDER BY SUM(customer_flags.flags) DESC""", (self.workflow, since))
+
+        return dict(rows)
+
+    def orders_flagged_for_customer(self, customer, days=30, now=None):
+        """
+        Returns the distinct order ids of the customer flagged over the runs of the last given days
+
+        :param customer: String, the customer id
+        :param days: Int, length of the window in days
+        :param now: Datetime, end of the window (now if None)
+        """
+
+        since = ((now or datetime.now()) - timedelta(days=days)).isoformat(timespec="seconds")
+
+        rows = self.connection.execute("""SELECT DISTINCT flags.external_id FROM flags JOIN runs ON runs.run_id = flags.run_id
+                                          WHERE flags.customer = ? AND runs.workflow = ? AND runs.run_time >= ?
+                                          ORDER BY flags.external_id""", (str(customer), self.workflow, since))
+
+        return [row[0] for row in rows]
+
+    def changes_since_previous(self):
+        """
+        Returns a dictionary of the orders that became flagged ('new'), stopped being flagged ('resolved')
+        and had their tasking or suggested priority changed ('changed') between the previous run and the latest one
+        """
+
+        runs = self.runs(limit=2)
+        if not runs:
+            return {"new": [], "resolved": [], "changed": []}
+
+        latest = runs[0][0]
+        previous = runs[1][0] if len(runs) > 1 else None
+
+        def only_in(run_a, run_b):
+            return [row[0] for row in self.connection.execute("""SELECT external_id FROM flags WHERE run_id = ?
+                                                                 EXCEPT SELECT external_id FROM flags WHERE run_id = ?
+                                                                 ORDER BY external_id""", (run_a, run_b))]
+
+        changed = self.connection.execute("""SELECT DISTINCT latest.external_id FROM flags AS latest
+                                             JOIN flags AS previous ON previous.run_id = ? AND previous.external_id = latest.external_id
+                                             WHERE latest.run_id = ? AND (latest.tasking_priority IS NOT previous.tasking_priority
+                                                                          OR latest.suggested_priority IS NOT previous.suggested_priority)
+                                             ORDER BY latest.external_id""", (previous, latest))
+
+        return {"new": only_in(latest, previous),
+                "resolved": only_in(previous, latest),
+                "changed": [row[0] for row in changed]}
+
+    def prune(self, keep_days):
+        """ Removes the runs older than the given number of days, and their flags """
+
+        since = (datetime.now() - timedelta(days=keep_days)).isoformat(timespec="seconds")
+
+        with self.connection:
+            self.connection.execute("DELETE FROM runs WHERE workflow = ? AND run_time < ?", (self.workflow, since))
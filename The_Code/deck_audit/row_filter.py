@@ -0,0 +1,52 @@
+# This file contains the exclusion rules applied to the order deck before the Rivedo columns are computed
+# The remove rules of the RuleSet are checked as the rows are copied so only the surviving orders are exported
+
+import os
+
+
+def cursor_row_reason(row_filter, fields):
+    """
+    Returns a function that takes a cursor row of the fields followed by the geometry and returns the name of the first
+    remove rule matching it, or None. The geometry is dropped first, the RuleSet checks are read from the positions after the fields
+
+    :param row_filter: RuleSet, the exclusion rules
+    :param fields: List, the field names of the cursor rows, without the trailing "SHAPE@"
+    """
+
+    reason = row_filter.row_reason(fields)
+
+    return lambda row: reason(row[:-1])
+
+
+def export_surviving_rows(source, target, row_filter):
+    """
+    Copies only the rows kept by the filter into a new feature class and returns the kept and removed counts
+
+    :param source: Feature Layer, the orders to filter
+    :param target: String, path of the feature class to create
+    :param row_filter: RuleSet, the exclusion rules
+    """
+
+    import arcpy
+
+    # Create an empty feature class with the schema of the source
+    description = arcpy.Describe(source)
+    arcpy.management.CreateFeatureclass(os.path.dirname(target), os.path.basename(target), description.shapeType.upper(),
+                                        template=source, spatial_reference=description.spatialReference)
+
+    fields = [field.name for field in arcpy.ListFields(source) if field.editable and field.type not in ['OID', 'Geometry']]
+    reason = cursor_row_reason(row_filter, fields)
+
+    kept = 0
+    removed = dict()
+
+    with arcpy.da.SearchCursor(source, fields + ["SHAPE@"]) as search, arcpy.da.InsertCursor(target, fields + ["SHAPE@"]) as insert:
+        for row in search:
+            rule = reason(row)
+            if rule is None:
+                insert.insertRow(row)
+                kept += 1
+            else:
+                removed[rule] = removed.get(rule, 0) + 1
+
+    return kept, removed
@@ -0,0 +1,507 @@
+# This file contains the declarative audit rules of the "rules" section of Sensitive_Parameters.json
+# Rules are parsed and validated once, then evaluated together: as vectorized masks over a dataframe, as predicates over cursor rows, or as arcpy SQL
+#
+# A rule is {"name": ..., "action": "remove" | "metric", "when": condition}, where a condition is one of
+#   {"field": "tasking_priority", "op": "<", "value": 720}        op is one of = <> < <= > >= in not_in like between null not_null
+#   {"field": "external_id", "in_set": "hotlist"}                 a named set: a config list (dotted path) or a set given at run time
+#   {"check": "already_correct"}                                  a check computed from the customer index (see CHECKS)
+#   {"where": "responsiveness_level = 'Select'"}                  an SQL where clause
+#   {"all": [condition, ...]}, {"any": [condition, ...]}, {"not": condition}
+# Remove rules are checked in order and the first match names the reason an order is removed, metrics count the kept orders
+
+import re
+import time
+
+from itertools import islice
+
+import numpy as np
+
+from deck_audit.metrics import MetricsResult
+from deck_audit.compact import map_values
+from deck_audit.priority import ORDER_FIELDS, PriorityEngine
+from deck_audit.where_clause import WhereClause, compile_row, evaluate_frame
+
+
+ACTIONS = ["remove", "metric"]
+OPERATORS = ["=", "<>", "<", "<=", ">", ">=", "in", "not_in", "like", "between", "null", "not_null"]
+
+# Checks computed from the query inputs, the same logic as the Rivedo columns
+CHECKS = ["already_correct", "too_high", "too_low", "wrong_ending"]
+
+# Named sets given at run time rather than read from the config
+RUNTIME_SETS = ["hotlist"]
+
+# Prefix of the derived fields holding the check values
+CHECK_PREFIX = "@"
+
+# Cursor rows evaluated at once by evaluate_rows, each metric is timed once per block rather than once per row
+ROW_BLOCK = 10000
+
+
+def legacy_rules(config):
+    """
+    Returns the rules equivalent to the legacy config: the Rivedo row filter followed by the "metrics" queries
+
+    :param config: Dict, the loaded Sensitive_Parameters.json
+    """
+
+    rules = [{"name": "hotlist", "action": "remove", "when": {"field": "external_id", "in_set": "hotlist"}},
+             {"name": "idi_customer", "action": "remove", "when": {"field": "sap_customer_identifier", "in_set": "customer_info.idi_customers"}},
+             {"name": "excluded_priority", "action": "remove", "when": {"field": "tasking_priority", "in_set": "excluded_priorities"}},
+             {"name": "no_spacecraft", "action": "remove", "when": {"all": [{"field": craft, "op": "=", "value": 0} for craft in ["ge01", "wv01", "wv02", "wv03"]]}},
+             {"name": "already_correct", "action": "remove", "when": {"check": "already_correct"}}]
+
+    for name, (query, value) in config.get("metrics", dict()).items():
+        rules.append({"name": name, "action": "metric", "when": {"where": query}} if query else {"name": name, "action": "metric", "value": value})
+
+    return rules
+
+
+def config_value(config, path):
+    """ Returns the value at the dotted path of the config (e.g. 'customer_info.idi_customers'), or None if it is missing """
+
+    value = config
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+
+    return value
+
+
+class RuleSet():
+    """ The compiled audit rules """
+
+    def __init__(self, rules, config, sets=None):
+        """
+        :param rules: List, the rule dictionaries
+        :param config: Dict, the loaded Sensitive_Parameters.json (named sets and query inputs are read from it)
+        :param sets: Dict, named sets only known at run time (e.g. 'hotlist')
+        """
+
+        self.config = config
+        self.sets = dict(sets or dict())
+        self.config_sets = dict()
+        self.fields = []
+        self.checks = []
+        self.remove = dict()
+        self.metrics = dict()
+        self.fixed = dict()
+        self.names = []
+
+        for number, rule in enumerate(rules):
+            name = rule.get("name")
+            if not name:
+                raise ValueError(f"Rule {number} has no name")
+            if name in self.names:
+                raise ValueError(f"Rule '{name}' is defined twice")
+            if rule.get("action") not in ACTIONS:
+                raise ValueError(f"Rule '{name}' has action '{rule.get('action')}', use one of {', '.join(ACTIONS)}")
+            self.names.append(name)
+
+            # Metrics without a condition keep the value given in the config
+            if rule["action"] == "metric" and "when" not in rule:
+                self.fixed[name] = rule.get("value")
+                continue
+            if "when" not in rule:
+                raise ValueError(f"Rule '{name}' has no 'when' condition")
+
+            tree = self.compile(rule["when"], name)
+            (self.remove if rule["action"] == "remove" else self.metrics)[name] = tree
+
+        self.engine = PriorityEngine(config["query_input"] if "query_input" in config else config["query_inputs"]) if self.checks else None
+
+        # The checks read the order fields, which must then be read as well
+        if self.checks:
+            self.fields = list(dict.fromkeys(self.fields + ORDER_FIELDS))
+
+    @classmethod
+    def from_config(cls, config, sets=None):
+        """
+        Returns the rules of the config's "rules" section, or the legacy rules if the config has none
+
+        :param config: Dict, the loaded Sensitive_Parameters.json
+        :param sets: Dict, named sets only known at run time (e.g. 'hotlist')
+        """
+
+        return cls(config["rules"] if "rules" in config else legacy_rules(config), config, sets)
+
+    def config_inputs(self):
+        """
+        Returns the config values the compiled rules resolved: the contents of each config set they use and, when a rule
+        uses a check, the query inputs behind it. The rule definitions alone do not change when these are edited
+        """
+
+        inputs = {"sets": self.config_sets}
+        if self.checks:
+            inputs["query_input"] = self.config["query_input"] if "query_input" in self.config else self.config["query_inputs"]
+
+        return inputs
+
+    def use_field(self, field):
+        if field not in self.fields:
+            self.fields.append(field)
+        return ("field", field)
+
+    def named_set(self, set_name, rule_name):
+        """ Returns the frozenset of the named set, ids held as text """
+
+        values = self.sets[set_name] if set_name in self.sets else config_value(self.config, set_name)
+        if values is None:
+            raise ValueError(f"Rule '{rule_name}' uses the unknown set '{set_name}'")
+
+        # Sets read from the config are kept so a change to their contents can be told apart, see config_inputs
+        if set_name not in self.sets:
+            self.config_sets[set_name] = sorted(values, key=str)
+
+        # Ready made sets (e.g. the hotlist index) are used as they are
+        if isinstance(values, frozenset):
+            return values
+
+        return frozenset(str(value) if not isinstance(value, (int, float)) else value for value in values)
+
+    def compile(self, condition, rule_name):
+        """ Returns the where clause tree of the given condition, checking it as it goes """
+
+        if not isinstance(condition, dict) or len(condition.keys() & {"field", "check", "where", "all", "any", "not"}) != 1:
+            raise ValueError(f"Rule '{rule_name}' has an invalid condition: {condition}")
+
+        if "all" in condition or "any" in condition:
+            kind = "and" if "all" in condition else "or"
+            parts = [self.compile(part, rule_name) for part in condition["all" if kind == "and" else "any"]]
+            if not parts:
+                raise ValueError(f"Rule '{rule_name}' has an empty '{'all' if kind == 'and' else 'any'}'")
+            tree = parts[0]
+            for part in parts[1:]:
+                tree = (kind, tree, part)
+            return tree
+
+        if "not" in condition:
+            return ("not", self.compile(condition["not"], rule_name))
+
+        if "where" in condition:
+            clause = WhereClause(condition["where"])
+            for field in clause.fields:
+                self.use_field(field)
+            return clause.tree
+
+        if "check" in condition:
+            if condition["check"] not in CHECKS:
+                raise ValueError(f"Rule '{rule_name}' uses the unknown check '{condition['check']}', use one of {', '.join(CHECKS)}")
+            if condition["check"] not in self.checks:
+                self.checks.append(condition["check"])
+            return ("compare", "=", ("field", CHECK_PREFIX + condition["check"]), ("literal", True))
+
+        field = self.use_field(condition["field"])
+
+        if "in_set" in condition:
+            return ("in", field, self.named_set(condition["in_set"], rule_name))
+
+        op = condition.get("op")
+        if op not in OPERATORS:
+            raise ValueError(f"Rule '{rule_name}' has operator '{op}', use one of {', '.join(OPERATORS)}")
+        if op in ["null", "not_null"]:
+            return (op, field)
+        if "value" not in condition:
+            raise ValueError(f"Rule '{rule_name}' has no value for operator '{op}'")
+
+        value = condition["value"]
+        if op in ["in", "not_in"]:
+            node = ("in", field, frozenset(value))
+            return ("not", node) if op == "not_in" else node
+        if op == "like":
+            return ("like", field, re.escape(value).replace("%", ".*").replace("_", "."))
+        if op == "between":
+            return ("and", ("compare", ">=", field, ("literal", value[0])), ("compare", "<=", field, ("literal", value[1])))
+
+        return ("compare", op, field, ("literal", value))
+
+    def check_values(self, frame, check):
+        """ Returns a numpy boolean array of the given check for every order of the dataframe """
+
+        if check == "too_high":
+            return self.engine.too_high(frame).to_numpy()
+        if check == "too_low":
+            return self.engine.too_low(frame).to_numpy()
+
+        suggested = self.engine.suggested_priority(frame)
+        if check == "wrong_ending":
+            return ((frame["tasking_priority"] % 10) != (suggested % 10)).to_numpy()
+
+        # Already at the suggested priority and not flagged 'High' or 'Low' by the High_Low column, whose low check comes first
+        # A level without a low threshold never passes the low check, so its orders go on to the high check
+        priority = frame["tasking_priority"].to_numpy()
+        above_low = priority > map_values(frame["responsiveness_level"], self.engine.index.low_pri)
+        high_low = self.engine.too_low(frame).to_numpy() | (~above_low & self.engine.too_high(frame).to_numpy())
+        return (priority == suggested.to_numpy()) & ~high_low
+
+    def evaluate_frame(self, frame):
+        """
+        Returns a dictionary of rule name/numpy boolean mask for every remove and metric rule, from one pass over the dataframe
+        Each check is computed once however many rules use it
+
+        :param frame: Dataframe, must contain every field in self.fields
+        """
+
+        view = CheckedFrame(frame, self)
+        masks = dict()
+
+        for name, tree in list(self.remove.items()) + list(self.metrics.items()):
+            values, nulls = evaluate_frame(tree, view)
+            masks[name] = np.asarray(values & ~nulls, dtype=bool)
+
+        return masks
+
+    def removal_reasons(self, frame):
+        """ Returns a numpy object array of the first remove rule matching each order, None for kept orders """
+
+        masks = self.evaluate_frame(frame)
+        reasons = np.full(len(frame), None, dtype=object)
+
+        # Later rules only name the orders no earlier rule matched
+        for name in reversed(list(self.remove)):
+            reasons[masks[name]] = name
+
+        return reasons
+
+    def scan(self, chunks, counts):
+        """
+        Yields the kept orders of each chunk, adding the removed orders per rule and the metrics of the kept orders to counts
+
+        :param chunks: Iterable, dataframes of orders
+        :param counts: Dict, updated with rule name/count
+        """
+
+        for name in self.names:
+            counts.setdefault(name, self.fixed.get(name, 0))
+
+        for chunk in chunks:
+            masks = self.evaluate_frame(chunk)
+            removed = np.zeros(len(chunk), dtype=bool)
+
+            for name in self.remove:
+                counts[name] += int((masks[name] & ~removed).sum())
+                removed |= masks[name]
+
+            for name in self.metrics:
+                counts[name] += int((masks[name] & ~removed).sum())
+
+            yield chunk[~removed]
+
+    def row_functions(self, fields, rules):
+        """ Returns (name, predicate) pairs for the given rules over cursor rows with the given fields """
+
+        positions = {field: fields.index(field) for field in self.fields if field in fields and not field.startswith(CHECK_PREFIX)}
+        for number, check in enumerate(self.checks):
+            positions[CHECK_PREFIX + check] = len(fields) + number
+
+        # Only the fields of the given rules are needed, e.g. the remove rules run before the new columns exist
+        functions = []
+        for name, tree in rules.items():
+            try:
+                functions.append((name, compile_row(tree, positions)))
+            except KeyError as missing:
+                raise ValueError(f"Rule '{name}' needs the field {missing} missing from the rows")
+
+        if not self.checks:
+            return [(name, lambda row, function=function: function(row) is True) for name, function in functions]
+
+        # Rows are wrapped so a check is only computed for the rows that reach a rule using it
+        order_positions = [fields.index(field) for field in ORDER_FIELDS]
+        index = self.engine.index
+        return [(name, lambda row, function=function: function(CheckedRow(row, self.checks, order_positions, index)) is True)
+                for name, function in functions]
+
+    def row_reason(self, fields):
+        """
+        Returns a function that takes a cursor row and returns the name of the first remove rule matching it, or None
+
+        :param fields: List, the field names of the cursor rows
+        """
+
+        predicates = self.row_functions(fields, self.remove)
+
+        def reason(row):
+            for name, predicate in predicates:
+                if predicate(row):
+                    return name
+            return None
+
+        return reason
+
+    def evaluate_rows(self, rows, fields):
+        """
+        Returns a MetricsResult of the metric rules from one pass over the given rows
+
+        :param rows: Iterable, cursor rows
+        :param fields: List, the field names of the rows
+        """
+
+        start = time.perf_counter()
+        predicates = self.row_functions(fields, self.metrics)
+        counts = {name: 0 for name in self.metrics}
+        timings = {name: 0.0 for name in self.metrics}
+        scanned = 0
+
+        # Still one pass over the cursor, the rows of a block are kept while every metric is counted over them
+        rows = iter(rows)
+        block = list(islice(rows, ROW_BLOCK))
+
+        while block:
+            scanned += len(block)
+            for name, predicate in predicates:
+                predicate_start = time.perf_counter()
+                counts[name] += sum(1 for row in block if predicate(row))
+                timings[name] += time.perf_counter() - predicate_start
+
+            block = list(islice(rows, ROW_BLOCK))
+
+        return self.metrics_result(counts, timings, scanned, start)
+
+    def evaluate_layer(self, layer):
+        """
+        Returns a MetricsResult of the metric rules from a single SearchCursor pass over the given layer
+
+        :param layer: Feature Layer, layer from which to derive the metrics
+        """
+
+        import arcpy
+
+        fields = [field for field in self.fields if not field.startswith(CHECK_PREFIX)]
+        if not fields:
+            return self.evaluate_rows([], [])
+
+        with arcpy.da.SearchCursor(layer, fields) as cursor:
+            return self.evaluate_rows(cursor, fields)
+
+    def metrics_result(self, counts, timings, rows, start):
+        """ Returns the MetricsResult with the metrics in rule order """
+
+        names = [name for name in self.names if name in self.metrics or name in self.fixed]
+        counts = {name: self.fixed[name] if name in self.fixed else counts[name] for name in names}
+        timings = {name: timings.get(name, 0.0) for name in names}
+
+        return MetricsResult(counts, timings, rows, time.perf_counter() - start)
+
+    def where_clause(self, name):
+        """ Returns the arcpy SQL where clause of the named rule, or None if it uses a check (checks have no SQL form) """
+
+        tree = self.remove[name] if name in self.remove else self.metrics[name]
+
+        try:
+            return to_sql(tree)
+        except ValueError:
+            return None
+
+
+class CheckedFrame():
+    """ A dataframe whose check fields are computed on first use and kept """
+
+    def __init__(self, frame, rules):
+        self.frame = frame
+        self.rules = rules
+        self.computed = dict()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __getitem__(self, field):
+        if not field.startswith(CHECK_PREFIX):
+            return self.frame[field]
+
+        if field not in self.computed:
+            import pandas as pd
+            self.computed[field] = pd.Series(self.rules.check_values(self.frame, field[len(CHECK_PREFIX):]), index=self.frame.index)
+
+        return self.computed[field]
+
+
+class CheckedRow():
+    """ A cursor row followed by the check values, each computed on first use """
+
+    __slots__ = ["row", "checks", "order_positions", "index", "length"]
+
+    def __init__(self, row, checks, order_positions, index):
+        self.row = row
+        self.checks = checks
+        self.order_positions = order_positions
+        self.index = index
+        self.length = len(row)
+
+    def __getitem__(self, position):
+        if position < self.length:
+            return self.row[position]
+
+        check = self.checks[position - self.length]
+        priority, cust, responsiveness, ge01, wv01, wv02 = [self.row[i] for i in self.order_positions]
+        index = self.index
+
+        # Levels without a threshold in the config are never flagged, as in PriorityEngine
+        if check == "too_high":
+            threshold = index.high_pri.get(responsiveness)
+            return threshold is not None and priority < threshold and not index.is_excluded(cust, "high", responsiveness)
+        if check == "too_low":
+            threshold = index.low_pri.get(responsiveness)
+            return threshold is not None and priority > threshold and not index.is_excluded(cust, "low", responsiveness)
+
+        suggested = index.correct_priority(priority, cust, ge01, wv02, wv01)
+        if check == "wrong_ending":
+            return priority % 10 != suggested % 10
+
+        return priority == suggested and index.high_low(priority, cust, responsiveness) not in ["Low", "High"]
+
+
+def sql_literal(value):
+    """ Returns the SQL text of a literal value """
+
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+
+    return str(value)
+
+
+def like_pattern(regex):
+    """ Returns the SQL LIKE pattern of a regex made by the where clause parser (escaped characters, '.*' and '.') """
+
+    pattern = []
+    position = 0
+
+    while position < len(regex):
+        if regex[position] == "\\":
+            pattern.append(regex[position + 1])
+            position += 2
+        elif regex.startswith(".*", position):
+            pattern.append("%")
+            position += 2
+        else:
+            pattern.append("_" if regex[position] == "." else regex[position])
+            position += 1
+
+    return "".join(pattern)
+
+
+def to_sql(node):
+    """ Returns the arcpy SQL where clause text of a where clause tree """
+
+    kind = node[0]
+
+    if kind == "field":
+        if node[1].startswith(CHECK_PREFIX):
+            raise ValueError(f"The check '{node[1][len(CHECK_PREFIX):]}' has no SQL form")
+        return node[1]
+    if kind == "literal":
+        return sql_literal(node[1])
+    if kind == "compare":
+        return f"{to_sql(node[2])} {node[1]} {to_sql(node[3])}"
+    if kind == "in":
+        return f"{to_sql(node[1])} IN (" + ", ".join(sql_literal(value) for value in sorted(node[2], key=str)) + ")" if node[2] else "1 = 0"
+    if kind == "like":
+        return f"{to_sql(node[1])} LIKE {sql_literal(like_pattern(node[2]))}"
+    if kind == "null":
+        return f"{to_sql(node[1])} IS NULL"
+    if kind == "not_null":
+        return f"{to_sql(node[1])} IS NOT NULL"
+    if kind == "not":
+        return f"NOT ({to_sql(node[1])})"
+
+    return f"({to_sql(node[1])}) {'AND' if kind == 'and' else 'OR'} ({to_sql(node[2])})"
@@ -0,0 +1,259 @@
+# This file contains the schema planner of the Rivedo output: the output field order and the shapefile-safe (10 character)
+# field names are worked out once per distinct input schema and kept in a small JSON cache keyed on a fingerprint of the schema
+# The planned schema lets the output shapefile be written in a single export, without a temp feature class
+
+import hashlib
+import json
+import os
+import time
+
+from deck_audit.row_filter import cursor_row_reason
+
+
+# Bumped whenever the planning changes, plans cached by another version are not reused
+PLAN_VERSION = 1
+
+# Longest field name a shapefile (.dbf) can hold
+SHAPEFILE_NAME_LENGTH = 10
+
+# Number of input schemas whose plans are kept
+MAX_CACHED_PLANS = 20
+
+# ListFields types and the AddField types creating the same field in a shapefile
+FIELD_TYPES = {"String": "TEXT", "Integer": "LONG", "SmallInteger": "SHORT", "BigInteger": "DOUBLE", "Double": "DOUBLE",
+               "Single": "FLOAT", "Date": "DATE", "DateOnly": "DATE", "GUID": "TEXT", "GlobalID": "TEXT"}
+
+
+def shapefile_names(names):
+    """
+    Returns the names truncated to 10 characters, names that would clash (the .dbf ignores case) get a numbered suffix
+
+    :param names: List, the field names in output order
+    """
+
+    used = set()
+    output = []
+
+    for name in names:
+        candidate = name[:SHAPEFILE_NAME_LENGTH]
+        number = 0
+
+        while candidate.lower() in used:
+            number += 1
+            suffix = "_" + str(number)
+            candidate = name[:SHAPEFILE_NAME_LENGTH - len(suffix)] + suffix
+
+        used.add(candidate.lower())
+        output.append(candidate)
+
+    return output
+
+
+def schema_fingerprint(source_fields, new_columns, leading_fields):
+    """ Returns a fingerprint of everything the plan depends on """
+
+    schema = [PLAN_VERSION, [list(field) for field in source_fields], [list(column) for column in new_columns], list(leading_fields)]
+
+    return hashlib.sha1(json.dumps(schema).encode()).hexdigest()
+
+
+class SchemaPlan():
+    """ The fields of the output in order, with the source or new field each one is filled from and its shapefile name and type """
+
+    def __init__(self, fields, cached=False):
+        """
+        :param fields: List, dictionaries with the field 'name', 'output_name', 'type' (AddField type), 'length' and 'new'
+        :param cached: Boolean, the plan was read from the cache
+        """
+
+        self.fields = fields
+        self.cached = cached
+
+    @property
+    def field_names(self):
+        return [field["name"] for field in self.fields]
+
+    @property
+    def output_names(self):
+        return [field["output_name"] for field in self.fields]
+
+    @property
+    def source_fields(self):
+        return [field["name"] for field in self.fields if not field["new"]]
+
+    def add_fields_list(self):
+        """ Returns the field descriptions of arcpy.management.AddFields for the output """
+
+        return [[field["output_name"], field["type"], field["name"], field["length"] or ""] for field in self.fields]
+
+    def field_mappings(self, table):
+        """
+        Returns the arcpy FieldMappings that exports the table in the planned order and names
+
+        :param table: String or Feature Layer, a table holding the source and new fields
+        """
+
+        import arcpy
+
+        table_mappings = arcpy.FieldMappings()
+        table_mappings.addTable(table)
+        mappings = arcpy.FieldMappings()
+
+        for field in self.fields:
+            index = table_mappings.findFieldMapIndex(field["name"])
+            if index != -1:
+                field_map = table_mappings.getFieldMap(index)
+                output_field = field_map.outputField
+                output_field.name = field["output_name"]
+                field_map.outputField = output_field
+                mappings.addFieldMap(field_map)
+
+        return mappings
+
+
+class SchemaPlanner():
+    """ Plans the output schema of an input schema, reusing the cached plan of a schema seen before """
+
+    def __init__(self, cache_file):
+        """ :param cache_file: String, path of the JSON file holding the plans """
+
+        self.cache_file = cache_file
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as data:
+                return json.load(data)
+        except (OSError, ValueError):
+            return dict()
+
+    def save_cache(self, plans):
+        """ Writes the most recently used plans, replacing the cache file """
+
+        recent = dict(sorted(plans.items(), key=lambda item: item[1]["used"], reverse=True)[:MAX_CACHED_PLANS])
+
+        temp_file = self.cache_file + ".tmp"
+        with open(temp_file, 'w') as data:
+            json.dump(recent, data)
+        os.replace(temp_file, self.cache_file)
+
+    def plan(self, source_fields, new_columns, leading_fields):
+        """
+        Returns the SchemaPlan of the output: the leading fields, then the new columns, then every other source field
+
+        :param source_fields: List, (name, ListFields type, length) of the source fields copied to the output
+        :param new_columns: List, (name, AddField type) of the new columns in the order they are added
+        :param leading_fields: List, source fields moved to the front of the output
+        """
+
+        key = schema_fingerprint(source_fields, new_columns, leading_fields)
+        plans = self.load_cache()
+
+        if key in plans:
+            plans[key]["used"] = time.time()
+            self.save_cache(plans)
+            return SchemaPlan(plans[key]["fields"], cached=True)
+
+        source = {name: (field_type, length) for name, field_type, length in source_fields}
+        new_names = [name for name, field_type in new_columns]
+
+        # New columns replace source fields of the same name
+        leading = [name for name in leading_fields if name in source and name not in new_names]
+        rest = [name for name, field_type, length in source_fields if name not in leading and name not in new_names]
+
+        fields = [{"name": name, "type": FIELD_TYPES.get(source[name][0], "TEXT"),
+                   "length": source[name][1] if source[name][0] == "String" else None, "new": False} for name in leading]
+        fields += [{"name": name, "type": field_type, "length": None, "new": True} for name, field_type in new_columns]
+        fields += [{"name": name, "type": FIELD_TYPES.get(source[name][0], "TEXT"),
+                    "length": source[name][1] if source[name][0] == "String" else None, "new": False} for name in rest]
+
+        for field, output_name in zip(fields, shapefile_names([field["name"] for field in fields])):
+            field["output_name"] = output_name
+
+        plans[key] = {"fields": fields, "used": time.time()}
+        self.save_cache(plans)
+
+        return SchemaPlan(fields)
+
+
+class ArcpyTables():
+    """ The arcpy calls of the single export """
+
+    def create_output(self, source, target, plan):
+        """ Creates the empty shapefile of the source's geometry type with every planned field, in one AddFields call """
+
+        import arcpy
+
+        description = arcpy.Describe(source)
+        arcpy.management.CreateFeatureclass(os.path.dirname(target), os.path.basename(target), description.shapeType.upper(),
+                                            spatial_reference=description.spatialReference)
+        arcpy.management.AddFields(target, plan.add_fields_list())
+
+    def search_cursor(self, source, fields):
+        import arcpy
+        return arcpy.da.SearchCursor(source, fields)
+
+    def insert_cursor(self, target, fields):
+        import arcpy
+        return arcpy.da.InsertCursor(target, fields)
+
+
+def export_planned_rows(source, target, plan, row_filter, calculator, snapshot=None, collect=(), key_field="external_id", tables=None):
+    """
+    Writes the output shapefile in one pass over the source: only the rows kept by the filter, with the new columns computed,
+    in the planned field order and names. Returns the kept count, the removed count per rule and the collected rows
+
+    :param source: Feature Layer, the orders
+    :param target: String, path of the shapefile to create
+    :param plan: SchemaPlan, the output schema
+    :param row_filter: RuleSet, the exclusion rules
+    :param calculator: ColumnCalculator, the new columns
+    :param snapshot: AuditSnapshot, reuse the new column values of unchanged orders (incremental runs)
+    :param collect: List, source or new fields whose values are returned for every kept row (metrics, results)
+    :param key_field: String, the field identifying an order in the snapshot
+    :param tables: ArcpyTables or a stand-in with the same methods, the arcpy calls (ArcpyTables if None)
+    """
+
+    tables = tables or ArcpyTables()
+    tables.create_output(source, target, plan)
+
+    read_fields = plan.source_fields
+    reason = cursor_row_reason(row_filter, read_fields)
+    position = {field: i for i, field in enumerate(read_fields)}
+
+    # Rows are extended with the new column values, which then come after the source fields
+    all_fields = read_fields + calculator.output_fields
+    input_positions = [position[field] for field in calculator.input_fields]
+    output_positions = [all_fields.index(field) for field in plan.field_names]
+    collect_positions = [all_fields.index(field) for field in collect]
+    blank_outputs = [None] * len(calculator.output_fields)
+    inputs_end = len(calculator.input_fields)
+    key_position = position[key_field] if snapshot is not None else None
+
+    kept = 0
+    removed = dict()
+    collected = []
+
+    with tables.search_cursor(source, read_fields + ["SHAPE@"]) as search, tables.insert_cursor(target, plan.output_names + ["SHAPE@"]) as insert:
+        for row in search:
+            rule = reason(row)
+            if rule is not None:
+                removed[rule] = removed.get(rule, 0) + 1
+                continue
+
+            inputs = [row[i] for i in input_positions]
+            outputs = snapshot.outputs(row[key_position], tuple(inputs)) if snapshot is not None else None
+
+            if outputs is None:
+                outputs = tuple(calculator.calculate(inputs + blank_outputs)[inputs_end:])
+                if snapshot is not None:
+                    snapshot.recomputed += 1
+
+            if snapshot is not None:
+                snapshot.record(row[key_position], tuple(inputs), outputs)
+
+            values = row[:-1] + outputs
+            insert.insertRow([values[i] for i in output_positions] + [row[-1]])
+            collected.append(tuple(values[i] for i in collect_positions))
+            kept += 1
+
+    return kept, removed, collected
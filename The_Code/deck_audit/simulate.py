@@ -0,0 +1,231 @@
+# This file contains the what-if simulation of proposed config changes: candidate variants of the customer lists and high/low
+# thresholds are evaluated against the whole deck in one batch, giving the flag counts of each and the orders that would change
+# The customers and responsiveness levels are factorized once, each variant is then only a few small lookup arrays
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from deck_audit.compact import no_spacecraft
+from deck_audit.config import AuditConfig
+
+
+# Query input settings a variant can change
+VARIANT_SETTINGS = ["middle_digit_cust_list", "ending_digit_cust_list", "orders_at_high_pri", "orders_at_low_pri"]
+
+# Name of the variant holding the config as it is, the other variants are compared against it
+CURRENT = "current"
+
+# Bits of the flags of an order, an order is flagged when any is set
+WRONG_ENDING, TOO_HIGH, TOO_LOW = 1, 2, 4
+
+# Orders evaluated at once for all variants, bounds the memory of the (variants x orders) arrays
+ROW_BLOCK = 250000
+
+# Columns of the orders kept in the row diffs
+DIFF_COLUMNS = ["external_id", "sap_customer_identifier", "responsiveness_level", "tasking_priority"]
+
+
+def merge_settings(base, overrides):
+    """
+    Returns the base settings with the overrides applied: objects are merged key by key, anything else is replaced
+    e.g. {"orders_at_high_pri": {"Select": {"pri": 720}}} only changes the Select threshold, keeping its excluded customers
+
+    :param base: Dict, the current settings
+    :param overrides: Dict, the settings to change
+    """
+
+    merged = dict(base)
+    for key, value in overrides.items():
+        merged[key] = merge_settings(base[key], value) if isinstance(value, dict) and isinstance(base.get(key), dict) else value
+
+    return merged
+
+
+def load_variants(variants_file):
+    """
+    Returns the variants of a JSON file holding an object of variant name/query input settings to change
+
+    :param variants_file: String, path to the JSON file
+    """
+
+    with open(variants_file, 'r', errors="ignore") as input:
+        variants = json.load(input)
+
+    if not isinstance(variants, dict) or not all(isinstance(settings, dict) for settings in variants.values()):
+        raise ValueError(f"{variants_file}: must be an object of variant name/settings to change")
+
+    return variants
+
+
+def factorize(values):
+    """ Returns the codes (-1 for a missing value) and the distinct values of the series, categoricals keep their categories """
+
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy().astype("int32"), list(values.cat.categories)
+
+    codes, uniques = pd.factorize(values)
+    return codes.astype("int32"), list(uniques)
+
+
+class ConfigSimulation():
+    """ Suggested priorities and flags of a deck under several variants of the config, computed together """
+
+    def __init__(self, config, orders, variants):
+        """
+        :param config: AuditConfig, the current config
+        :param orders: Dataframe, the cleaned deck (all orders, see DeckAudit.read_chunks), compact or full
+        :param variants: Dict, variant name/query input settings to change (VARIANT_SETTINGS only), see merge_settings
+        """
+
+        if CURRENT in variants:
+            raise ValueError(f"Variant name '{CURRENT}' is kept for the config as it is")
+
+        for name, settings in variants.items():
+            unknown = [setting for setting in settings if setting not in VARIANT_SETTINGS]
+            if unknown:
+                raise ValueError(f"Variant '{name}' changes {', '.join(unknown)}, only {', '.join(VARIANT_SETTINGS)} can be simulated")
+
+        # Each variant is validated and compiled like a config file would be
+        self.names = [CURRENT] + list(variants)
+        section = config.query_input_section
+        self.configs = [config] + [AuditConfig({**config.parameters, section: merge_settings(config.query_input, settings)})
+                                   for settings in variants.values()]
+
+        self.orders = orders
+        self.priority = orders["tasking_priority"].to_numpy().astype("int16")
+        self.fallback_ending = np.where(no_spacecraft(orders), 3, 4).astype("int8")
+
+        # Customers and responsiveness levels as codes into their distinct values, shared by every variant
+        self.cust_codes, customers = factorize(orders["sap_customer_identifier"])
+        self.resp_codes, levels = factorize(orders["responsiveness_level"])
+
+        self.build_lookups(customers, levels)
+
+        self.suggested = None
+        self.flags = None
+
+    def build_lookups(self, customers, levels):
+        """
+        Builds the (variants x distinct values) lookup arrays, the extra last entry of each is looked up by missing values (code -1)
+
+        :param customers: List, the distinct customer ids
+        :param levels: List, the distinct responsiveness levels
+        """
+
+        customer_position = {cust: i for i, cust in enumerate(customers)}
+        level_position = {level: i for i, level in enumerate(levels)}
+        shape = (len(self.configs), len(customers) + 1)
+
+        # Digits of the customer lists, -1 where the customer is in no list
+        self.middle_digits = np.full(shape, -1, dtype="int8")
+        self.ending_digits = np.full(shape, -1, dtype="int8")
+
+        # Thresholds of each responsiveness level, NaN for levels without one (never flagged, like the audit)
+        self.high_pri = np.full((len(self.configs), len(levels) + 1), np.nan)
+        self.low_pri = np.full((len(self.configs), len(levels) + 1), np.nan)
+
+        # Customers excluded from the high and low checks of each responsiveness level
+        self.excluded_high = np.zeros(shape + (len(levels) + 1,), dtype=bool)
+        self.excluded_low = np.zeros(shape + (len(levels) + 1,), dtype=bool)
+
+        for v, config in enumerate(self.configs):
+            index = config.customer_index
+
+            for digits, lookup in [(self.middle_digits, index.middle_digit_lookup), (self.ending_digits, index.ending_digit_lookup)]:
+                for cust, digit in lookup.items():
+                    if cust in customer_position:
+                        digits[v, customer_position[cust]] = digit
+
+            for (query, level), threshold in config.thresholds.items():
+                if level not in level_position:
+                    continue
+
+                (self.high_pri if query == "high" else self.low_pri)[v, level_position[level]] = threshold
+                excluded = self.excluded_high if query == "high" else self.excluded_low
+                for cust in config.excluded_customers[(query, level)]:
+                    if cust in customer_position:
+                        excluded[v, customer_position[cust], level_position[level]] = True
+
+    def run(self):
+        """ Computes the suggested priority and flags of every order under every variant, returns self """
+
+        rows = len(self.priority)
+        self.suggested = np.empty((len(self.configs), rows), dtype="int16")
+        self.flags = np.empty((len(self.configs), rows), dtype="uint8")
+
+        for start in range(0, rows, ROW_BLOCK):
+            block = slice(start, start + ROW_BLOCK)
+            priority = self.priority[block]
+            cust = self.cust_codes[block]
+            resp = self.resp_codes[block]
+
+            # Same decision tree as CustomerIndex.correct_priority, one row of the arrays per variant
+            middle = self.middle_digits[:, cust]
+            middle = np.where(middle < 0, (priority - 700) // 10, middle)
+            ending = self.ending_digits[:, cust]
+            ending = np.where(ending < 0, self.fallback_ending[block], ending)
+            self.suggested[:, block] = 700 + middle * 10 + ending
+
+            # Same checks as PriorityEngine.flagged (a comparison with a NaN threshold is False)
+            with np.errstate(invalid="ignore"):
+                too_high = (priority < self.high_pri[:, resp]) & ~self.excluded_high[:, cust, resp]
+                too_low = (priority > self.low_pri[:, resp]) & ~self.excluded_low[:, cust, resp]
+
+            self.flags[:, block] = (np.where(priority % 10 != ending, WRONG_ENDING, 0) | np.where(too_high, TOO_HIGH, 0) |
+                                    np.where(too_low, TOO_LOW, 0))
+
+        return self
+
+    def counts(self):
+        """ Returns a dataframe of the flag counts of each variant and how many orders differ from the current config """
+
+        if self.flags is None:
+            self.run()
+
+        flagged = self.flags != 0
+        changed = (self.suggested != self.suggested[0]) | (self.flags != self.flags[0])
+
+        return pd.DataFrame({"flagged": flagged.sum(axis=1),
+                             "wrong_ending": ((self.flags & WRONG_ENDING) != 0).sum(axis=1),
+                             "too_high": ((self.flags & TOO_HIGH) != 0).sum(axis=1),
+                             "too_low": ((self.flags & TOO_LOW) != 0).sum(axis=1),
+                             "newly_flagged": (flagged & ~flagged[0]).sum(axis=1),
+                             "no_longer_flagged": (~flagged & flagged[0]).sum(axis=1),
+                             "priority_changed": (self.suggested != self.suggested[0]).sum(axis=1),
+                             "orders_changed": changed.sum(axis=1)}, index=pd.Index(self.names, name="variant"))
+
+    def diff(self, name):
+        """
+        Returns the orders whose suggested priority or flags differ between the given variant and the current config
+
+        :param name: String, the variant
+        """
+
+        if self.flags is None:
+            self.run()
+
+        v = self.names.index(name)
+        changed = (self.suggested[v] != self.suggested[0]) | (self.flags[v] != self.flags[0])
+        columns = [column for column in DIFF_COLUMNS if column in self.orders.columns]
+
+        diff = self.orders.loc[changed, columns]
+        for label, row in [("current", 0), ("variant", v)]:
+            diff = diff.assign(**{f"{label}_suggested": self.suggested[row, changed],
+                                  f"{label}_wrong_ending": (self.flags[row, changed] & WRONG_ENDING) != 0,
+                                  f"{label}_too_high": (self.flags[row, changed] & TOO_HIGH) != 0,
+                                  f"{label}_too_low": (self.flags[row, changed] & TOO_LOW) != 0})
+
+        return diff
+
+    def diffs(self):
+        """ Returns the row diffs of every variant in one dataframe, with the variant name in the first column """
+
+        frames = [self.diff(name).assign(variant=name) for name in self.names[1:]]
+        if not frames:
+            return pd.DataFrame()
+
+        diffs = pd.concat(frames, ignore_index=True)
+
+        return diffs.loc[:, ["variant"] + [column for column in diffs.columns if column != "variant"]]
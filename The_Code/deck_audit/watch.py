@@ -0,0 +1,261 @@
+# This file contains the watch mode of the headless audit: the deck, the hotlist and the config are watched and the audit
+# re-runs within seconds of a change, from the first stage the change affects. Changes are picked up by a filesystem
+# watcher (watchdog) when it is installed and by polling file stats otherwise, either way almost no CPU is used while idle
+
+import os
+import threading
+import time
+
+from pathlib import Path
+
+from deck_audit.adapters import read_order_chunks, source_kind
+from deck_audit.config import load_config
+from deck_audit.engine import DeckAudit
+from deck_audit.hotlist import load_hotlist, source_fingerprint
+from deck_audit.instrumentation import RunRecorder
+from deck_audit.publish import replace_file
+
+
+# Stages of a re-audit in the order they run, each one uses the output of the one before
+STAGES = ["read", "clean", "flag", "report"]
+
+# Seconds between checks of the fingerprints when a watcher is running, in case it misses an event
+WATCHER_RECHECK = 60
+
+
+def watched_path(source):
+    """ Returns the existing file or folder holding the source (the geodatabase folder of a feature class) """
+
+    path = os.path.abspath(str(source))
+    while path and not os.path.exists(path):
+        path = os.path.dirname(path)
+
+    return path
+
+
+class DeckWatcher():
+    """ Re-runs the headless audit whenever the deck, the hotlist or the config changes """
+
+    def __init__(self, source, config_file, output_dir, hotlist=None, kind=None, layer=None, settings=None, interval=1.0, debounce=2.0):
+        """
+        :param source: String, the orders to audit (shapefile, GeoPackage, CSV or feature class path)
+        :param config_file: String, path to Sensitive_Parameters.json
+        :param output_dir: String, folder the report, changes and run log are written to
+        :param hotlist: String, the hotlist file or feature class path, used by the remove rules with in_set 'hotlist'
+        :param kind: String, kind of the source (guessed from the file extension if None)
+        :param layer: String, table to read from a GeoPackage
+        :param settings: Dict, config values that take precedence over the config file (workers, chunk_size)
+        :param interval: Float, seconds between polls when no filesystem watcher is available
+        :param debounce: Float, seconds without writes before a change is audited
+        """
+
+        self.source = source
+        self.kind = kind or source_kind(source)
+        self.layer = layer
+        self.config_file = config_file
+        self.hotlist = hotlist
+        self.settings = settings or dict()
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self.debounce = debounce
+
+        # Kind used to fingerprint each watched input, feature classes are fingerprinted by the files of their geodatabase
+        self.inputs = {"deck": (source, "shapefile" if self.kind == "shapefile" else "file"),
+                       "config": (config_file, "file")}
+        if hotlist:
+            self.inputs["hotlist"] = (hotlist, "shapefile" if source_kind(hotlist) == "shapefile" else "file")
+
+        # Fingerprints of the inputs as last audited, and as last tried (a failed audit is only retried once an input changes again)
+        self.audited = dict()
+        self.attempted = dict()
+
+        # Output of each stage, kept so a change only re-runs the stages after the ones it leaves valid
+        self.audit = None
+        self.hotlist_index = None
+        self.raw_chunks = None
+        self.cleaned = None
+        self.orders = None
+
+        self.changed = threading.Event()
+        self.observer = None
+
+    def fingerprints(self):
+        """ Returns the current fingerprint of each watched input """
+
+        return {name: source_fingerprint(path, kind) for name, (path, kind) in self.inputs.items()}
+
+    def start_observer(self):
+        """ Starts a filesystem watcher on the folders of the inputs, returns False if watchdog is not installed """
+
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return False
+
+        changed = self.changed
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                changed.set()
+
+        self.observer = Observer()
+        folders = {path if os.path.isdir(path) else os.path.dirname(path) for path in map(watched_path, [path for path, kind in self.inputs.values()])}
+        for folder in folders:
+            self.observer.schedule(Handler(), folder, recursive=False)
+        self.observer.start()
+
+        return True
+
+    def stop_observer(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def wait_for_change(self):
+        """ Blocks until an input has changed and no more writes came in for the debounce time, returns the changed inputs """
+
+        while True:
+            if self.observer is not None:
+                self.changed.wait(WATCHER_RECHECK)
+            else:
+                time.sleep(self.interval)
+
+            current = self.fingerprints()
+            if current == self.attempted and not self.changed.is_set():
+                continue
+
+            # Wait out a burst of writes (a shapefile is several files written one after the other)
+            while True:
+                self.changed.clear()
+                time.sleep(self.debounce)
+                settled = self.fingerprints()
+                if settled == current and not self.changed.is_set():
+                    break
+                current = settled
+
+            changes = {name for name in current if current[name] != self.audited.get(name)}
+            if changes and current != self.attempted:
+                return changes
+
+    def first_stage(self, changes, audit):
+        """
+        Returns the first stage to re-run for the changed inputs
+
+        :param changes: Set, names of the changed inputs
+        :param audit: DeckAudit, built from the current config and hotlist
+        """
+
+        previous = self.audit
+        if "deck" in changes or previous is None or previous.source_columns != audit.source_columns:
+            return "read"
+
+        # The cleaned chunks depend on the remove rules, the config sets and query inputs they resolve, the hotlist and the excluded priorities
+        if "hotlist" in changes or previous.clean_inputs() != audit.clean_inputs():
+            return "clean"
+
+        return "flag"
+
+    def load_audit(self, changes):
+        """ Returns a DeckAudit of the current config and hotlist, re-reading only the ones that changed """
+
+        parameters = load_config(self.config_file).with_settings(self.settings)
+
+        # A hotlist without local files cannot be watched, it is re-read on every run instead
+        if self.hotlist and ("hotlist" in changes or self.hotlist_index is None or self.hotlist_index.fingerprint is None):
+            self.hotlist_index = load_hotlist(self.hotlist, self.output_dir / "hotlist_index.npz", kind=source_kind(self.hotlist))
+
+        return DeckAudit(parameters, {"hotlist": self.hotlist_index} if self.hotlist_index is not None else None)
+
+    def write_outputs(self, audit, changes_df):
+        """ Writes the report and the changes next to their final paths and renames them into place, so readers never see a partial file """
+
+        outputs = [(self.output_dir / "output.txt", lambda path: audit.write_report(self.orders, changes_df, path)),
+                   (self.output_dir / "changes_needed.csv", lambda path: audit.write_changes(changes_df, path))]
+        if audit.explain:
+            outputs.append((self.output_dir / "flag_reasons.parquet", lambda path: audit.write_reasons(self.orders, path)))
+
+        for path, write in outputs:
+            temp_path = str(path) + ".tmp"
+            write(temp_path)
+            replace_file(temp_path, path)
+
+    def run_once(self, changes):
+        """
+        Re-runs the audit from the first stage affected by the changed inputs and returns the run record
+
+        :param changes: Set, names of the changed inputs
+        """
+
+        fingerprints = self.fingerprints()
+        self.attempted = fingerprints
+
+        recorder = RunRecorder("deck_audit_watch", source=str(self.source), changed=sorted(changes))
+        first, error = None, None
+
+        try:
+            audit = self.load_audit(changes)
+            first = self.first_stage(changes, audit)
+            stages = STAGES[STAGES.index(first):]
+            recorder.record["stages_run"] = stages
+
+            if "read" in stages:
+                with recorder.stage("read") as stage:
+                    self.raw_chunks = list(read_order_chunks(self.source, audit.source_columns, audit.chunk_size, self.kind, self.layer))
+                    stage["rows_out"] = sum(len(chunk) for chunk in self.raw_chunks)
+
+            if "clean" in stages:
+                with recorder.stage("clean") as stage:
+                    self.cleaned = list(audit.clean_chunks(self.raw_chunks))
+                    stage["rows_out"] = sum(len(chunk) for chunk in self.cleaned)
+                    stage.update(audit.schema.memory_report())
+
+            with recorder.stage("flag") as stage:
+                self.orders = audit.flag_orders(self.cleaned)
+                changes_df = audit.ending_digit_query(self.orders)
+                stage["rows_out"] = len(self.orders)
+
+            with recorder.stage("report", len(self.orders)):
+                self.write_outputs(audit, changes_df)
+
+            # Only a completed run moves the watcher on, a failed one is retried on the next change
+            self.audit = audit
+            self.audited = fingerprints
+
+        except Exception as failure:
+            error = repr(failure)
+
+        record = recorder.finish(self.output_dir / "Audit_Log.jsonl", error=error,
+                                 flagged=None if error else len(self.orders), changes=None if error else len(changes_df))
+
+        if error:
+            print(f"Audit of {', '.join(sorted(changes))} change failed: {error}")
+        else:
+            print(f"Audited {', '.join(sorted(changes))} change from the {first} stage: {len(self.orders)} flagged orders, {len(changes_df)} changes needed, {record['seconds']:.2f} s")
+
+        return record
+
+    def run(self, cycles=None):
+        """
+        Audits the inputs once, then again after every change until interrupted
+
+        :param cycles: Int, stop after this many audits of changes (runs until interrupted if None)
+        """
+
+        watching = self.start_observer()
+        print(f"Watching {', '.join(str(path) for path, kind in self.inputs.values())} ({'filesystem events' if watching else f'polling every {self.interval} s'})")
+
+        try:
+            self.run_once(set(self.inputs))
+
+            while cycles is None or cycles > 0:
+                self.run_once(self.wait_for_change())
+                cycles = None if cycles is None else cycles - 1
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            self.stop_observer()
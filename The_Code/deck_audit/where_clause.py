@@ -0,0 +1,290 @@
+# This file contains a small parser for the SQL where clauses used in the config (e.g. the metrics queries)
+# A parsed clause can be evaluated against cursor rows or as a boolean mask over a dataframe, following SQL null rules
+
+import re
+
+import numpy as np
+
+
+TOKEN = re.compile(r"""\s*(?:
+    (?P<number>-?\d+(?:\.\d+)?) |
+    '(?P<string>(?:[^']|'')*)' |
+    "(?P<quoted>[^"]+)" |
+    (?P<op><>|!=|<=|>=|=|<|>) |
+    (?P<punct>[(),]) |
+    (?P<word>[A-Za-z_][\w.]*)
+)""", re.VERBOSE)
+
+KEYWORDS = {"AND", "OR", "NOT", "IN", "IS", "NULL", "LIKE", "BETWEEN"}
+
+
+class WhereClause():
+    """ A parsed SQL where clause """
+
+    def __init__(self, text):
+        """ :param text: String, the where clause e.g. "High_Low = 'High' And tasking_priority < 720" """
+
+        self.text = text
+        self.tokens = self.tokenize(text)
+        self.position = 0
+        self.fields = []
+
+        self.tree = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected '{self.tokens[self.position][1]}' in where clause: {text}")
+
+    def tokenize(self, text):
+        """ Returns a list of (kind, value) tokens """
+
+        tokens = []
+        position = 0
+        text = text.rstrip()
+
+        while position < len(text):
+            match = TOKEN.match(text, position)
+            if not match:
+                raise ValueError(f"Could not parse where clause at '{text[position:]}': {text}")
+            position = match.end()
+
+            if match.group("number") is not None:
+                number = match.group("number")
+                tokens.append(("literal", float(number) if "." in number else int(number)))
+            elif match.group("string") is not None:
+                tokens.append(("literal", match.group("string").replace("''", "'")))
+            elif match.group("quoted") is not None:
+                tokens.append(("field", match.group("quoted")))
+            elif match.group("op") is not None:
+                tokens.append(("op", "<>" if match.group("op") == "!=" else match.group("op")))
+            elif match.group("punct") is not None:
+                tokens.append((match.group("punct"), match.group("punct")))
+            elif match.group("word").upper() in KEYWORDS:
+                tokens.append((match.group("word").upper(), match.group("word").upper()))
+            else:
+                tokens.append(("field", match.group("word")))
+
+        return tokens
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self, kind):
+        if self.peek() != kind:
+            raise ValueError(f"Expected {kind} in where clause: {self.text}")
+        self.position += 1
+        return self.tokens[self.position - 1][1]
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == "OR":
+            self.take("OR")
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() == "AND":
+            self.take("AND")
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == "NOT":
+            self.take("NOT")
+            return ("not", self.parse_not())
+        if self.peek() == "(":
+            self.take("(")
+            node = self.parse_or()
+            self.take(")")
+            return node
+        return self.parse_comparison()
+
+    def parse_operand(self):
+        if self.peek() == "field":
+            field = self.take("field")
+            if field not in self.fields:
+                self.fields.append(field)
+            return ("field", field)
+        return ("literal", self.take("literal"))
+
+    def parse_comparison(self):
+        left = self.parse_operand()
+
+        negate = False
+        if self.peek() == "NOT":
+            self.take("NOT")
+            negate = True
+
+        if self.peek() == "op" and not negate:
+            return ("compare", self.take("op"), left, self.parse_operand())
+
+        if self.peek() == "IN":
+            self.take("IN")
+            self.take("(")
+            values = [self.take("literal")]
+            while self.peek() == ",":
+                self.take(",")
+                values.append(self.take("literal"))
+            self.take(")")
+            node = ("in", left, frozenset(values))
+
+        elif self.peek() == "LIKE":
+            self.take("LIKE")
+            pattern = self.take("literal")
+            node = ("like", left, re.escape(pattern).replace("%", ".*").replace("_", "."))
+
+        elif self.peek() == "BETWEEN":
+            self.take("BETWEEN")
+            low = self.parse_operand()
+            self.take("AND")
+            node = ("and", ("compare", ">=", left, low), ("compare", "<=", left, self.parse_operand()))
+
+        elif self.peek() == "IS" and not negate:
+            self.take("IS")
+            is_not = self.peek() == "NOT"
+            if is_not:
+                self.take("NOT")
+            self.take("NULL")
+            return ("not_null" if is_not else "null", left)
+
+        else:
+            raise ValueError(f"Expected a comparison in where clause: {self.text}")
+
+        return ("not", node) if negate else node
+
+    def row_function(self, fields):
+        """
+        Returns a function that evaluates the clause for a cursor row and returns True only when the row matches
+
+        :param fields: List, the field names of the cursor rows
+        """
+
+        function = compile_row(self.tree, {field: fields.index(field) for field in self.fields})
+
+        return lambda row: function(row) is True
+
+    def mask(self, frame):
+        """
+        Returns a numpy boolean array of the dataframe rows matching the clause
+
+        :param frame: Dataframe, must contain every field used by the clause
+        """
+
+        values, nulls = evaluate_frame(self.tree, frame)
+
+        return np.asarray(values & ~nulls, dtype=bool)
+
+
+# Comparison functions used for both rows and dataframes
+COMPARE = {"=": lambda a, b: a == b,
+           "<>": lambda a, b: a != b,
+           "<": lambda a, b: a < b,
+           ">": lambda a, b: a > b,
+           "<=": lambda a, b: a <= b,
+           ">=": lambda a, b: a >= b}
+
+
+def compile_row(node, positions):
+    """ Returns a function of a row that returns True, False or None (unknown) for the given node """
+
+    kind = node[0]
+
+    if kind == "field":
+        position = positions[node[1]]
+        return lambda row: row[position]
+
+    if kind == "literal":
+        value = node[1]
+        return lambda row: value
+
+    if kind == "compare":
+        compare, left, right = COMPARE[node[1]], compile_row(node[2], positions), compile_row(node[3], positions)
+        def function(row):
+            a, b = left(row), right(row)
+            return None if a is None or b is None else bool(compare(a, b))
+        return function
+
+    if kind == "in":
+        operand, values = compile_row(node[1], positions), node[2]
+        return lambda row: None if operand(row) is None else operand(row) in values
+
+    if kind == "like":
+        operand, pattern = compile_row(node[1], positions), re.compile(node[2], re.DOTALL)
+        return lambda row: None if operand(row) is None else pattern.fullmatch(str(operand(row))) is not None
+
+    if kind in ["null", "not_null"]:
+        operand = compile_row(node[1], positions)
+        return (lambda row: operand(row) is None) if kind == "null" else (lambda row: operand(row) is not None)
+
+    if kind == "not":
+        operand = compile_row(node[1], positions)
+        return lambda row: None if operand(row) is None else not operand(row)
+
+    # Three valued AND/OR
+    left, right = compile_row(node[1], positions), compile_row(node[2], positions)
+    if kind == "and":
+        def function(row):
+            a = left(row)
+            if a is False:
+                return False
+            b = right(row)
+            return False if b is False else (None if a is None or b is None else True)
+    else:
+        def function(row):
+            a = left(row)
+            if a is True:
+                return True
+            b = right(row)
+            return True if b is True else (None if a is None or b is None else False)
+    return function
+
+
+def evaluate_frame(node, frame):
+    """ Returns (values, nulls) numpy boolean arrays for the given node over the dataframe """
+
+    kind = node[0]
+    length = len(frame)
+
+    if kind in ["field", "literal"]:
+        raise ValueError("A field or literal is not a condition")
+
+    if kind in ["compare", "in", "like", "null", "not_null"]:
+        operands = []
+        nulls = np.zeros(length, dtype=bool)
+        for operand in node[2:] if kind == "compare" else node[1:2]:
+            if operand[0] == "field":
+                series = frame[operand[1]]
+                nulls |= series.isna().to_numpy()
+                operands.append(series)
+            else:
+                operands.append(operand[1])
+
+        if kind == "null":
+            return nulls, np.zeros(length, dtype=bool)
+        if kind == "not_null":
+            return ~nulls, np.zeros(length, dtype=bool)
+
+        if kind == "compare":
+            values = COMPARE[node[1]](operands[0], operands[1])
+        elif kind == "in":
+            # Sets with their own vectorized lookup (e.g. the hotlist index) do the matching themselves
+            values = node[2].matches(operands[0]) if hasattr(node[2], "matches") else operands[0].isin(node[2])
+        else:
+            values = operands[0].astype(str).str.fullmatch(node[2])
+
+        # Nullable columns give missing comparisons, those rows are already marked as null
+        if hasattr(values, "to_numpy"):
+            values = values.to_numpy(dtype=bool, na_value=False)
+
+        return np.asarray(values, dtype=bool) & ~nulls, nulls
+
+    if kind == "not":
+        values, nulls = evaluate_frame(node[1], frame)
+        return ~values & ~nulls, nulls
+
+    (left, left_nulls), (right, right_nulls) = evaluate_frame(node[1], frame), evaluate_frame(node[2], frame)
+    if kind == "and":
+        false = (~left & ~left_nulls) | (~right & ~right_nulls)
+        values = left & right
+        return values, ~values & ~false
+    true = left | right
+    return true, ~true & (left_nulls | right_nulls)
@@ -0,0 +1,77 @@
+# This file times the multi-process audit with 1/2/4/8 workers on synthetic decks and appends the results to a JSON lines file
+# Usage: python benchmarks/parallel_scaling.py [--sizes 100000 1000000] [--workers 1 2 4 8] [--output benchmarks/parallel_results.jsonl]
+
+import argparse
+import json
+import sys
+import time
+
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "The_Code"))
+from deck_audit.parallel import ParallelAuditor
+from run_benchmarks import git_revision
+from synthetic_deck import make_customers, make_deck, make_query_input
+
+
+def time_workers(orders, query_input, workers, partition_by):
+    """ Returns the seconds taken to audit the orders (pool start up excluded) and the number of flagged orders """
+
+    with ParallelAuditor(query_input, workers, partition_by) as auditor:
+        auditor.audit(orders.head(1000))
+        start = time.perf_counter()
+        suggested, flagged = auditor.audit(orders)
+        elapsed = time.perf_counter() - start
+
+    return elapsed, int(flagged.sum()), suggested
+
+
+def main(sizes, worker_counts, output):
+    """
+    Times each deck size with each worker count and partitioning, appends one JSON line per run to the output file
+
+    :param sizes: List, deck sizes in rows
+    :param worker_counts: List, numbers of worker processes to time
+    :param output: String, path of the JSON lines results file
+    """
+
+    customers = make_customers(2000)
+    query_input = make_query_input(customers)
+    revision = git_revision()
+    results = []
+
+    for rows in sizes:
+        orders = make_deck(rows, customers)
+        baseline = None
+
+        for partition_by in ["customer", "responsiveness"]:
+            for workers in worker_counts:
+                elapsed, flagged, suggested = time_workers(orders, query_input, workers, partition_by)
+
+                # Every worker count must give the same result
+                if baseline is None:
+                    baseline = suggested
+                elif not suggested.equals(baseline):
+                    raise Exception(f"{workers} workers gave different priorities")
+
+                results.append({"timestamp": datetime.now().isoformat(timespec="seconds"),
+                                "revision": revision,
+                                "python": sys.version.split()[0],
+                                "rows": rows, "partition_by": partition_by, "workers": workers, "seconds": round(elapsed, 4), "flagged": flagged})
+
+                with open(output, 'a') as result_file:
+                    result_file.write(json.dumps(results[-1]) + "\n")
+                print(json.dumps(results[-1]))
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the multi-process audit with several worker counts on synthetic order decks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000], help="deck sizes in rows")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="numbers of worker processes")
+    parser.add_argument("--output", default=str(Path(__file__).resolve().parent / "parallel_results.jsonl"), help="JSON lines file the results are appended to")
+    arguments = parser.parse_args()
+
+    main(arguments.sizes, arguments.workers, arguments.output)
@@ -0,0 +1,195 @@
+# This file times each stage of the Queries audit on synthetic decks and appends the results to a JSON lines file
+# Usage: python benchmarks/run_benchmarks.py [--sizes 10000 100000 1000000] [--output benchmarks/results.jsonl]
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(repo_root))
+sys.path.append(str(repo_root / "The_Code"))
+from Deck_Queries_with_shapefile import Queries, active_orders_name
+from deck_audit.columns import ColumnCalculator, ColumnSpec
+from deck_audit.compact import concat_orders
+from deck_audit.rules import CHECK_PREFIX, RuleSet
+from deck_audit.schema_plan import SchemaPlanner, export_planned_rows
+from deck_audit.simulate import ConfigSimulation
+from synthetic_deck import MemoryTables, make_customers, make_deck, make_hotlist, make_parameters, write_local_folder
+
+
+def git_revision():
+    """ Returns the short hash of the checked out commit, or None outside a git checkout """
+
+    result = subprocess.run(["git", "-C", str(repo_root), "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+
+    return result.stdout.strip() or None
+
+
+# Rivedo's new columns: field name, field type, expression and the column function file at the repo root
+NEW_COLUMNS = [("Rivedo_Pri", "SHORT", "correct_priority(!tasking_priority!, !sap_customer_identifier!, !ge01!, !wv02!, !wv01!)", "rivedo_pri_column.txt"),
+               ("End_Digit", "TEXT", "ending_digit(!tasking_priority!, !Rivedo_Pri!)", "ending_digit_column.txt"),
+               ("High_Low", "TEXT", "middle_digit(!tasking_priority!, !sap_customer_identifier!, !responsiveness_level!)", "middle_digit_column.txt")]
+
+
+def column_calculator(config_file):
+    """ Returns the ColumnCalculator of Rivedo's new columns, the code blocks loading the customer index of the config file """
+
+    specs = []
+    for field_name, field_type, expression, column_function in NEW_COLUMNS:
+        with open(repo_root / column_function, 'r') as data:
+            code_block = ("from deck_audit.customer_index import CustomerIndex\n"
+                          f"index = CustomerIndex.from_file(r\"{config_file}\")\n") + data.read()
+        specs.append(ColumnSpec(field_name, field_type, expression, code_block))
+
+    return ColumnCalculator(specs)
+
+
+def single_pass_columns(calculator, orders):
+    """ Computes every new column of each row in turn, as the single export does """
+
+    blank_outputs = [None] * len(calculator.output_fields)
+
+    return [calculator.calculate(list(row) + blank_outputs) for row in orders[calculator.input_fields].itertuples(index=False, name=None)]
+
+
+def per_column_columns(calculator, orders):
+    """ Computes the new columns with one pass over the rows per column, as one CalculateField per column does """
+
+    blank_outputs = [None] * len(calculator.output_fields)
+    rows = [list(row) + blank_outputs for row in orders[calculator.input_fields].itertuples(index=False, name=None)]
+
+    for output, inputs, function in calculator.steps:
+        for row in rows:
+            row[output] = function(*[row[i] for i in inputs])
+
+    return rows
+
+
+def export_rows(calculator, rules, orders, folder):
+    """ Runs the single export of the orders into an in-memory output table, returns the kept count """
+
+    source_fields = [(column, "String" if orders[column].dtype == object else "Integer", 12) for column in orders.columns]
+    plan = SchemaPlanner(str(Path(folder) / "schema_plans.json")).plan(source_fields, [(spec.field_name, spec.field_type) for spec in calculator.specs],
+                                                                       ["external_id"])
+    tables = MemoryTables({"orders": orders.assign(SHAPE=None)})
+
+    return export_planned_rows("orders", "Rivedo.shp", plan, rules, calculator, collect=["external_id"], tables=tables)[0]
+
+
+def timed(stages, name, function, *args):
+    """ Runs the function, records its wall time in stages under the given name and returns its result """
+
+    start = time.perf_counter()
+    result = function(*args)
+    stages[name] = round(time.perf_counter() - start, 4)
+
+    return result
+
+
+def benchmark_size(rows, customers, seed):
+    """
+    Returns the stage timings of one audit of a synthetic deck of the given size
+
+    :param rows: Int, number of orders in the deck
+    :param customers: List, customer ids to draw from
+    :param seed: Int, random seed for the deck, config and hotlist
+    """
+
+    orders = make_deck(rows, customers, seed)
+    parameters = make_parameters(customers, seed)
+    hotlist = make_hotlist(orders, seed=seed)
+
+    folder = tempfile.mkdtemp(prefix="deck_audit_bench_")
+    stages = dict()
+
+    try:
+        write_local_folder(folder, orders, parameters, active_orders_name)
+        queries = Queries(parameters, folder, run=False)
+        source = queries.active_orders_path
+
+        # Cold load reads the .dbf and fills the cache, warm load reads the cache
+        chunks = timed(stages, "load_cold", lambda: list(queries.read_deck_chunks(source)))
+        chunks = timed(stages, "load_warm", lambda: list(queries.read_deck_chunks(source)))
+
+        # Rivedo's exclusion rules on the same orders, the hotlist being one of them, checked row by row as the export does
+        rules = RuleSet.from_config(parameters, {"hotlist": hotlist})
+        fields = [field for field in rules.fields if not field.startswith(CHECK_PREFIX)]
+        reason = rules.row_reason(fields)
+        removed = timed(stages, "rules_rows", lambda: sum(reason(row) is not None for row in orders[fields].itertuples(index=False, name=None)))
+
+        # The same rules evaluated as one vectorized scan, as the headless audit does
+        timed(stages, "rules_vectorized", lambda: sum(len(kept) for kept in rules.scan([orders], dict())))
+
+        # The new columns computed row by row in one pass and in one pass per column, on the same orders
+        calculator = column_calculator(Path(folder) / "Sensitive_Parameters.json")
+        timed(stages, "columns_single_pass", single_pass_columns, calculator, orders)
+        timed(stages, "columns_per_column", per_column_columns, calculator, orders)
+
+        # The whole single export on in-memory tables: rules, new columns and the planned output rows in one pass
+        timed(stages, "export_single_pass", export_rows, calculator, rules, orders, folder)
+
+        queries.active_orders = timed(stages, "priority", queries.flag_orders, chunks)
+        changes = timed(stages, "ending_digit", queries.ending_digit_query)
+        timed(stages, "report", queries.write_report, changes)
+        timed(stages, "csv_export", queries.write_changes, changes)
+
+        # What-if simulation of two dozen high priority thresholds, against the whole cleaned deck
+        deck = concat_orders(chunks)
+        variants = {f"high_{shift}": {"orders_at_high_pri": {level: {"pri": settings["pri"] + shift}
+                                                             for level, settings in parameters["query_input"]["orders_at_high_pri"].items()}}
+                    for shift in range(-12, 12)}
+        timed(stages, "simulate_24_variants", lambda: ConfigSimulation(queries.audit.config, deck, variants).run().counts())
+
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return {"rows": rows,
+            "flagged": len(queries.active_orders),
+            "changes": len(changes),
+            "removed_by_filter": removed,
+            "hotlist": len(hotlist),
+            **queries.audit.schema.memory_report(),
+            "stages": stages,
+            "total": round(sum(stages.values()) - stages["load_warm"], 4)}
+
+
+def main(sizes, output, customer_count=2000, seed=0):
+    """
+    Benchmarks each deck size and appends one JSON line per size to the output file
+
+    :param sizes: List, deck sizes in rows
+    :param output: String, path of the JSON lines results file
+    :param customer_count: Int, number of synthetic customers
+    :param seed: Int, random seed
+    """
+
+    customers = make_customers(customer_count)
+    revision = git_revision()
+
+    for rows in sizes:
+        result = {"timestamp": datetime.now().isoformat(timespec="seconds"),
+                  "revision": revision,
+                  "python": sys.version.split()[0],
+                  **benchmark_size(rows, customers, seed)}
+
+        with open(output, 'a') as results:
+            results.write(json.dumps(result) + "\n")
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times each stage of the deck audit on synthetic order decks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="deck sizes in rows")
+    parser.add_argument("--output", default=str(Path(__file__).resolve().parent / "results.jsonl"), help="JSON lines file the results are appended to")
+    parser.add_argument("--customers", type=int, default=2000, help="number of synthetic customers")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    arguments = parser.parse_args()
+
+    main(arguments.sizes, arguments.output, arguments.customers, arguments.seed)
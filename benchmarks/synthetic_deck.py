@@ -0,0 +1,195 @@
+# This file generates synthetic order decks and query inputs for the benchmarks, and holds the in-memory tables they are exported to
+
+import json
+import os
+import struct
+
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+RESPONSIVENESS_LEVELS = ["None", "Select", "SelectPlus"]
+
+# Shapefile attribute fields of the synthetic deck as (deck column, .dbf field name, type, length)
+SHAPEFILE_FIELDS = [("external_id", "external_i", "C", 12),
+                    ("tasking_priority", "tasking_pr", "N", 4),
+                    ("sap_customer_identifier", "sap_custom", "C", 10),
+                    ("responsiveness_level", "responsive", "C", 10),
+                    ("ge01", "ge01", "N", 1),
+                    ("wv01", "wv01", "N", 1),
+                    ("wv02", "wv02", "N", 1),
+                    ("wv03", "wv03", "N", 1)]
+
+
+def make_customers(count):
+    """ Returns a list of synthetic customer ids """
+
+    return [f"{100000 + number}" for number in range(count)]
+
+
+def make_query_input(customers, seed=0):
+    """
+    Returns a query inputs dictionary in the format of Sensitive_Parameters.json
+
+    :param customers: List, customer ids to spread over the lists
+    :param seed: Int, random seed
+    """
+
+    rng = np.random.default_rng(seed)
+    share = max(1, len(customers) // 40)
+
+    def sample(size):
+        return [str(cust) for cust in rng.choice(customers, size=size, replace=False)]
+
+    return {"middle_digit_cust_list": {digit: sample(share) for digit in "1234567890"},
+            "ending_digit_cust_list": {digit: sample(share) for digit in "1267890"},
+            "orders_at_high_pri": {resp: {"pri": 705 + 5 * number, "excluded_cust": sample(share)} for number, resp in enumerate(RESPONSIVENESS_LEVELS)},
+            "orders_at_low_pri": {resp: {"pri": 790 - 10 * number, "excluded_cust": sample(share)} for number, resp in enumerate(RESPONSIVENESS_LEVELS)}}
+
+
+def make_deck(rows, customers, seed=0):
+    """
+    Returns a dataframe of synthetic orders with the columns used by the audit
+
+    :param rows: Int, number of orders
+    :param customers: List, customer ids to draw from
+    :param seed: Int, random seed
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # A few customers hold most of the orders, as in the real deck
+    weights = 1 / np.arange(1, len(customers) + 1)
+
+    return pd.DataFrame({"external_id": [f"{10**11 + number}" for number in range(rows)],
+                         "tasking_priority": rng.integers(700, 800, rows),
+                         "sap_customer_identifier": rng.choice(customers, size=rows, p=weights / weights.sum()),
+                         "responsiveness_level": rng.choice(RESPONSIVENESS_LEVELS, size=rows, p=[0.7, 0.2, 0.1]),
+                         "ge01": rng.integers(0, 2, rows),
+                         "wv01": rng.integers(0, 2, rows),
+                         "wv02": rng.integers(0, 2, rows),
+                         "wv03": rng.integers(0, 2, rows)})
+
+
+def make_parameters(customers, seed=0):
+    """
+    Returns a full config dictionary in the format of Sensitive_Parameters.json, usable by both Queries and Rivedo
+
+    :param customers: List, customer ids to spread over the lists
+    :param seed: Int, random seed
+    """
+
+    rng = np.random.default_rng(seed)
+    query_input = make_query_input(customers, seed)
+
+    return {"columns_to_display": ["external_id", "tasking_priority", "sap_customer_identifier", "responsiveness_level"],
+            "query_inputs": query_input,
+            "query_input": query_input,
+            "excluded_priorities": [700, 799],
+            "customer_info": {"idi_customers": [str(cust) for cust in rng.choice(customers, size=max(1, len(customers) // 100), replace=False)]},
+            "metrics": {"Orders": ["", 0],
+                        "Select orders": ["responsiveness_level = 'Select'", 0],
+                        "High priority orders": ["tasking_priority < 720", 0]},
+            "arc_project_path": "",
+            "arc_map_name": ""}
+
+
+def make_hotlist(orders, share=0.001, seed=0):
+    """
+    Returns a list of solis (external ids) drawn from the given orders
+
+    :param orders: Dataframe, the synthetic deck
+    :param share: Float, fraction of the orders on the hotlist
+    :param seed: Int, random seed
+    """
+
+    rng = np.random.default_rng(seed)
+    size = max(1, int(len(orders) * share))
+
+    return rng.choice(orders["external_id"].to_numpy(), size=size, replace=False).tolist()
+
+
+def write_dbf(orders, dbf_path):
+    """
+    Writes the deck as a dBASE III attribute table with the truncated shapefile field names
+
+    :param orders: Dataframe, the synthetic deck
+    :param dbf_path: String, path of the .dbf file to write
+    """
+
+    record_length = 1 + sum(field[3] for field in SHAPEFILE_FIELDS)
+    header_length = 32 + 32 * len(SHAPEFILE_FIELDS) + 1
+
+    # Every record is built column by column as fixed width bytes
+    records = np.full(len(orders), b" ", dtype="S1")
+    for column, name, field_type, length in SHAPEFILE_FIELDS:
+        text = orders[column].astype(str).to_numpy().astype(f"U{length}")
+        text = np.char.rjust(text, length) if field_type == "N" else np.char.ljust(text, length)
+        records = np.char.add(records, np.char.encode(text, "ascii"))
+
+    with open(dbf_path, 'wb') as output:
+        output.write(struct.pack("<BBBBIHH20x", 3, 124, 1, 1, len(orders), header_length, record_length))
+        for column, name, field_type, length in SHAPEFILE_FIELDS:
+            output.write(struct.pack("<11sc4xBB14x", name.encode(), field_type.encode(), length, 0))
+        output.write(b"\r")
+        output.write(records.tobytes())
+        output.write(b"\x1a")
+
+
+def write_local_folder(folder, orders, parameters, shapefile_name):
+    """
+    Writes the deck .dbf/.cpg and Sensitive_Parameters.json into the given folder in the layout Queries expects
+
+    :param folder: String, the Local_only folder to fill
+    :param orders: Dataframe, the synthetic deck
+    :param parameters: Dict, the synthetic config
+    :param shapefile_name: String, name of the .shp file Queries reads
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    base = os.path.join(folder, os.path.splitext(shapefile_name)[0])
+
+    write_dbf(orders, base + ".dbf")
+    with open(base + ".cpg", 'w') as cpg:
+        cpg.write("UTF-8")
+
+    with open(os.path.join(folder, "Sensitive_Parameters.json"), 'w') as output:
+        json.dump(parameters, output, indent=4)
+
+
+class MemoryTables():
+    """ In memory stand-in for ArcpyTables so the single export can be run and timed without arcpy """
+
+    def __init__(self, sources):
+        """ :param sources: Dict, source name/dataframe of the orders, with a 'SHAPE' column standing for the geometry """
+
+        self.sources = sources
+        self.outputs = dict()
+
+    def create_output(self, source, target, plan):
+        self.outputs[target] = MemoryInsertCursor(plan.output_names)
+
+    def search_cursor(self, source, fields):
+        columns = ["SHAPE" if field == "SHAPE@" else field for field in fields]
+        return nullcontext(self.sources[source].loc[:, columns].itertuples(index=False, name=None))
+
+    def insert_cursor(self, target, fields):
+        return nullcontext(self.outputs[target])
+
+    def output(self, target):
+        """ Returns a dataframe of the rows inserted into the target, the geometry in 'SHAPE' """
+
+        cursor = self.outputs[target]
+        return pd.DataFrame(cursor.rows, columns=cursor.fields + ["SHAPE"])
+
+
+class MemoryInsertCursor():
+    """ Mimics the insertRow of arcpy.da.InsertCursor used by the export """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.rows = []
+
+    def insertRow(self, row):
+        self.rows.append(tuple(row))
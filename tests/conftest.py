@@ -0,0 +1,10 @@
+# This file puts the shared audit package, the Queries script and the synthetic deck helpers on the path of the tests
+
+import sys
+
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parent.parent
+for folder in [repo_root, repo_root / "The_Code", repo_root / "benchmarks"]:
+    if str(folder) not in sys.path:
+        sys.path.insert(0, str(folder))
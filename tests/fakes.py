@@ -0,0 +1,74 @@
+# This file contains the in-memory stand-ins for the arcpy calls used by the tests, so the arcpy code paths run without ArcGIS
+
+import numpy as np
+import pandas as pd
+
+
+class MemoryReader():
+    """ In memory stand-in for ArcpyReader, layers are dataframes keyed on name """
+
+    def __init__(self, layers, object_id_field="OBJECTID"):
+        """
+        :param layers: Dict, layer name/dataframe, an 'OBJECTID' column is added if missing and a 'SHAPE' column of (x, y) holds the geometry
+                       (dataframes without one stand for tables)
+        :param object_id_field: String, name of the object id field
+        """
+
+        self.layers = {name: df if object_id_field in df.columns else df.assign(**{object_id_field: np.arange(1, len(df) + 1)})
+                       for name, df in layers.items()}
+        self.object_id_field_name = object_id_field
+        self.messages = []
+
+    def feature_layers(self):
+        return [name for name, df in self.layers.items() if "SHAPE" in df.columns]
+
+    def map_layers(self):
+        return list(self.layers)
+
+    def name_string(self, layer):
+        return layer
+
+    def fields(self, layer):
+        types = {"i": "Integer", "u": "Integer", "f": "Double", "b": "SmallInteger"}
+        return [(name, "Geometry" if name == "SHAPE" else "SmallInteger" if dtype.kind == "i" and dtype.itemsize == 2 else types.get(dtype.kind, "String"))
+                for name, dtype in self.layers[layer].dtypes.items()]
+
+    def object_id_field(self, layer):
+        return self.object_id_field_name
+
+    def select(self, layer, where_clause):
+        from deck_audit.where_clause import WhereClause
+
+        df = self.layers[layer]
+        return df if not where_clause else df[WhereClause(where_clause).mask(df)]
+
+    def object_ids(self, layer, where_clause=None):
+        return np.sort(self.select(layer, where_clause)[self.object_id_field_name].to_numpy())
+
+    def read_array(self, layer, fields, where_clause=None, null_value=None):
+        df = self.select(layer, where_clause)
+        columns = dict()
+
+        for field in fields:
+            if field == "OID@":
+                columns[field] = df[self.object_id_field_name].to_numpy()
+            elif field in ["SHAPE@XY", "SHAPE@TRUECENTROID"]:
+                columns[field] = np.array([tuple(point) for point in df["SHAPE"]], dtype=[("x", "f8"), ("y", "f8")]) if len(df) else np.zeros(0, dtype=[("x", "f8"), ("y", "f8")])
+            else:
+                values = df[field]
+                if null_value and field in null_value:
+                    values = values.fillna(null_value[field])
+                columns[field] = values.to_numpy(dtype=str) if values.dtype == object or pd.api.types.is_string_dtype(values.dtype) else values.to_numpy()
+
+        array = np.zeros(len(df), dtype=[(field, column.dtype) for field, column in columns.items()])
+        for field, column in columns.items():
+            array[field] = column
+
+        return array
+
+    def read_wkt(self, layer, where_clause=None):
+        df = self.select(layer, where_clause)
+        return {oid: f"POINT ({x} {y})" for oid, (x, y) in zip(df[self.object_id_field_name], df["SHAPE"])}
+
+    def message(self, text):
+        self.messages.append(text)
@@ -0,0 +1,46 @@
+# This file contains the tests of the order source readers
+
+import sqlite3
+
+import pandas as pd
+
+from deck_audit.adapters import read_order_chunks, text_columns
+
+
+COLUMNS = ["external_id", "tasking_priority", "sap_customer_identifier", "responsiveness_level"]
+
+
+def levels(chunks):
+    return pd.concat(chunks)["responsiveness_level"].tolist()
+
+
+def test_null_level_is_kept_from_records():
+    chunk = text_columns(pd.DataFrame.from_records([("1", 714, "A", "None"), ("2", 714, "A", None)], columns=COLUMNS))
+
+    assert chunk["responsiveness_level"].iloc[0] == "None"
+    assert pd.isna(chunk["responsiveness_level"].iloc[1])
+
+
+def test_null_level_is_kept_from_csv(tmp_path):
+    source = tmp_path / "deck.csv"
+    source.write_text("external_id,tasking_priority,sap_customer_identifier,responsiveness_level\n1,714,A,None\n2,714,A,\n")
+
+    values = levels(read_order_chunks(str(source), COLUMNS))
+
+    assert values[0] == "None"
+    assert pd.isna(values[1])
+
+
+def test_null_level_is_kept_from_geopackage(tmp_path):
+    source = tmp_path / "deck.gpkg"
+    with sqlite3.connect(str(source)) as connection:
+        connection.execute("CREATE TABLE gpkg_contents (table_name TEXT, data_type TEXT)")
+        connection.execute("INSERT INTO gpkg_contents VALUES ('orders', 'features')")
+        connection.execute("CREATE TABLE orders (external_id TEXT, tasking_priority INTEGER, sap_customer_identifier TEXT, responsiveness_level TEXT)")
+        connection.executemany("INSERT INTO orders VALUES (?, ?, ?, ?)", [("1", 714, "A", "None"), ("2", 714, "A", None)])
+    connection.close()
+
+    values = levels(read_order_chunks(str(source), COLUMNS))
+
+    assert values[0] == "None"
+    assert pd.isna(values[1])
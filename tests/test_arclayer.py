@@ -0,0 +1,68 @@
+# This file contains the tests of the layer to dataframe conversion, run on the in-memory reader without ArcGIS
+
+import numpy as np
+import pandas as pd
+
+from ArcLayer_to_Dataframe_2 import CATEGORY_FIELDS, NULL_TEXT, create_dataframe, find_layer, null_values
+from fakes import MemoryReader
+
+
+def orders_layer():
+    return pd.DataFrame({"external_id": ["1", "2", "3"],
+                         "tasking_priority": pd.array([710, None, 725], dtype="Int16"),
+                         "order_count": pd.array([5, 6, None], dtype="Int32"),
+                         "sap_customer_identifier": ["A", "B", "A"],
+                         "SHAPE": [(0.0, 1.0), (2.0, 3.0), (4.0, 5.0)]})
+
+
+def test_integer_nulls_fit_their_field_type():
+    nulls = null_values([("priority", "SmallInteger"), ("count", "Integer"), ("big", "BigInteger")])
+
+    assert nulls["priority"] == np.iinfo(np.int16).min
+    assert nulls["count"] == np.iinfo(np.int32).min
+    assert nulls["big"] == np.iinfo(np.int64).min
+
+
+def test_small_integer_nulls_are_restored():
+    reader = MemoryReader({"Orders": orders_layer()})
+
+    df = create_dataframe("Orders", ["external_id", "tasking_priority", "order_count"], reader=reader)
+
+    assert df["tasking_priority"].isna().tolist() == [False, True, False]
+    assert df["tasking_priority"].dropna().tolist() == [710, 725]
+    assert df["order_count"].isna().tolist() == [False, False, True]
+
+
+def test_find_layer_messages_go_through_the_reader():
+    reader = MemoryReader({"Orders": orders_layer()})
+
+    assert find_layer("Orders", reader) == "Orders"
+    assert find_layer("Hotlist", reader) is None
+    assert reader.messages == ["Looking for: Orders", "Looking for: Hotlist", "Could not find Hotlist"]
+
+
+def test_find_layer_searches_tables_too():
+    reader = MemoryReader({"Orders": orders_layer(), "Customers": pd.DataFrame({"sap_customer_identifier": ["A", "B"]})})
+
+    assert find_layer("Customers", reader) == "Customers"
+    assert reader.feature_layers() == ["Orders"]
+
+
+def test_empty_text_and_null_text_stay_apart():
+    reader = MemoryReader({"Orders": orders_layer().assign(notes=["", None, "x"])})
+
+    df = create_dataframe("Orders", ["notes"], reader=reader)
+
+    assert df["notes"].tolist() == ["", None, "x"]
+    assert NULL_TEXT not in df["notes"].tolist()
+
+
+def test_categoricals_only_when_asked():
+    reader = MemoryReader({"Orders": orders_layer()})
+
+    plain = create_dataframe("Orders", ["sap_customer_identifier"], reader=reader)
+    compact = create_dataframe("Orders", ["sap_customer_identifier"], reader=reader, categories=CATEGORY_FIELDS)
+
+    assert plain["sap_customer_identifier"].dtype == object
+    assert isinstance(compact["sap_customer_identifier"].dtype, pd.CategoricalDtype)
+    assert compact["sap_customer_identifier"].tolist() == ["A", "B", "A"]
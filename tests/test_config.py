@@ -0,0 +1,59 @@
+# This file contains the tests of the validation of Sensitive_Parameters.json
+
+import pytest
+
+from deck_audit.config import AuditConfig
+from deck_audit.engine import DeckAudit
+
+
+QUERY_INPUT = {"middle_digit_cust_list": {"3": ["M3"]},
+               "ending_digit_cust_list": {"6": ["E6"]},
+               "orders_at_high_pri": {"None": {"pri": 710, "excluded_cust": []}},
+               "orders_at_low_pri": {"None": {"pri": 790, "excluded_cust": []}}}
+
+
+def test_valid_config_loads():
+    config = AuditConfig({"query_input": QUERY_INPUT, "rules": [{"name": "low_priority", "action": "remove", "when": {"field": "tasking_priority", "op": "<", "value": 705}}]})
+
+    assert config.thresholds == {("high", "None"): 710, ("low", "None"): 790}
+    assert config.require("query_input") is config
+
+
+def test_missing_sections_are_named():
+    with pytest.raises(ValueError, match="query_input or query_inputs"):
+        AuditConfig({"excluded_priorities": []})
+
+    with pytest.raises(ValueError, match="missing: columns_to_display, excluded_priorities"):
+        DeckAudit({"query_input": QUERY_INPUT})
+
+    with pytest.raises(ValueError, match="'query_input.orders_at_low_pri'"):
+        AuditConfig({"query_input": {key: value for key, value in QUERY_INPUT.items() if key != "orders_at_low_pri"}})
+
+
+def test_unknown_responsiveness_level():
+    thresholds = {"Selectplus": {"pri": 720, "excluded_cust": []}}
+
+    with pytest.raises(ValueError, match="'query_input.orders_at_high_pri.Selectplus' must be keyed on one of the responsiveness levels"):
+        AuditConfig({"query_input": dict(QUERY_INPUT, orders_at_high_pri=thresholds)})
+
+
+@pytest.mark.parametrize("rule, message", [({"action": "remove", "when": {"check": "too_high"}}, "Rule 0 has no name"),
+                                           ({"name": "a", "action": "drop", "when": {"check": "too_high"}}, "action 'drop'"),
+                                           ({"name": "a", "action": "remove", "when": {"field": "tasking_priority", "op": "~", "value": 1}}, "operator '~'"),
+                                           ({"name": "a", "action": "remove", "when": {"field": "external_id", "in_set": "customer_info.vip"}}, "unknown set"),
+                                           ({"name": "a", "action": "remove", "when": {"check": "too_high", "where": "x = 1"}}, "invalid condition")])
+def test_malformed_rule(rule, message):
+    with pytest.raises(ValueError, match="'rules' is invalid: .*" + message):
+        AuditConfig({"query_input": QUERY_INPUT, "rules": [rule]})
+
+
+def test_rules_may_use_the_hotlist():
+    AuditConfig({"query_input": QUERY_INPUT, "rules": [{"name": "hotlist", "action": "remove", "when": {"field": "external_id", "in_set": "hotlist"}}]})
+
+
+def test_wrongly_typed_settings():
+    with pytest.raises(ValueError, match="'excluded_priorities' must be a list of whole numbers"):
+        AuditConfig({"query_input": QUERY_INPUT, "excluded_priorities": ["800"]})
+
+    with pytest.raises(ValueError, match="'workers' must be a positive whole number"):
+        AuditConfig({"query_input": QUERY_INPUT, "workers": 0})
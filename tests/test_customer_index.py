@@ -0,0 +1,42 @@
+# This file contains the tests of the customer index shared by the CalculateField code blocks and the pandas queries
+
+import json
+import os
+
+from deck_audit.config import load_config
+from deck_audit.customer_index import CustomerIndex
+
+
+QUERY_INPUT = {"middle_digit_cust_list": {"3": ["M3"]},
+               "ending_digit_cust_list": {"6": ["E6"]},
+               "orders_at_high_pri": {"None": {"pri": 710, "excluded_cust": ["X"]}},
+               "orders_at_low_pri": {"None": {"pri": 790, "excluded_cust": []}}}
+
+
+def write_config(path, query_input):
+    path.write_text(json.dumps({"query_input": query_input}))
+
+
+def test_index_from_file_is_the_loaded_config_index(tmp_path):
+    config_file = tmp_path / "Sensitive_Parameters.json"
+    write_config(config_file, QUERY_INPUT)
+
+    index = CustomerIndex.from_file(str(config_file))
+    assert index is load_config(str(config_file)).customer_index
+    assert index.correct_priority(714, "M3", 1, 0, 0) == 734
+
+    # A rewrite within the same modification time is still picked up when the size changes
+    modified = os.stat(config_file).st_mtime_ns
+    write_config(config_file, dict(QUERY_INPUT, middle_digit_cust_list={"5": ["M3", "M5"]}))
+    os.utime(config_file, ns=(modified, modified))
+
+    assert CustomerIndex.from_file(str(config_file)).correct_priority(714, "M3", 1, 0, 0) == 754
+
+
+def test_level_missing_from_the_config_is_not_flagged():
+    index = CustomerIndex(QUERY_INPUT)
+
+    assert index.high_low(701, "A", "Select") == "Standard"
+    assert index.high_low(799, "X", None) == "Standard"
+    assert not index.is_excluded("X", "high", "Select")
+    assert index.high_low(701, "A", "None") == "High"
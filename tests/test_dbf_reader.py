@@ -0,0 +1,79 @@
+# This file contains the tests of the streaming .dbf reader against the synthetic decks it is written from
+
+import pandas as pd
+
+from deck_audit.dbf_reader import read_dbf_chunks
+from synthetic_deck import SHAPEFILE_FIELDS, make_customers, make_deck, write_dbf
+
+
+FIELD_NAMES = {name: column for column, name, field_type, length in SHAPEFILE_FIELDS}
+
+
+def write_deck(tmp_path, rows=50):
+    orders = make_deck(rows, make_customers(20))
+    dbf_path = tmp_path / "deck.dbf"
+    write_dbf(orders, dbf_path)
+
+    return orders, dbf_path
+
+
+def set_field(dbf_path, record, name, raw):
+    """ Overwrites the raw bytes of a field of one record, or its deletion flag when name is None """
+
+    header_length = 32 + 32 * len(SHAPEFILE_FIELDS) + 1
+    record_length = 1 + sum(field[3] for field in SHAPEFILE_FIELDS)
+    offset, length = 0, 1
+
+    if name is not None:
+        offset = 1
+        for column, field_name, field_type, field_length in SHAPEFILE_FIELDS:
+            if field_name == name:
+                length = field_length
+                break
+            offset += field_length
+
+    with open(dbf_path, 'r+b') as data:
+        data.seek(header_length + record * record_length + offset)
+        data.write(raw.ljust(length))
+
+
+def read(dbf_path, chunksize=7):
+    return pd.concat(read_dbf_chunks(dbf_path, chunksize=chunksize)).rename(columns=FIELD_NAMES)
+
+
+def test_round_trip_of_the_synthetic_deck(tmp_path):
+    orders, dbf_path = write_deck(tmp_path)
+
+    pd.testing.assert_frame_equal(read(dbf_path), orders)
+
+
+def test_blank_numbers_and_deleted_records(tmp_path):
+    orders, dbf_path = write_deck(tmp_path)
+
+    # Numbers are right justified with spaces, an all space field is a missing number
+    set_field(dbf_path, 5, "tasking_pr", b"")
+    set_field(dbf_path, 3, None, b"*")
+    set_field(dbf_path, 9, None, b"*")
+
+    expected = orders.astype({"tasking_priority": "float64"})
+    expected.loc[5, "tasking_priority"] = float("nan")
+    expected = expected.drop([3, 9]).reset_index(drop=True)
+
+    result = read(dbf_path)
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert result.index.equals(pd.RangeIndex(len(orders) - 2))
+
+
+def test_text_is_decoded_with_the_cpg_encoding(tmp_path):
+    orders, dbf_path = write_deck(tmp_path)
+    set_field(dbf_path, 0, "sap_custom", "Zürich".encode("utf-8"))
+
+    # Without a .cpg the text is read as latin-1
+    assert read(dbf_path)["sap_customer_identifier"].iloc[0] == "Zürich".encode("utf-8").decode("latin-1")
+
+    (tmp_path / "deck.cpg").write_text("UTF-8")
+    result = read(dbf_path)
+
+    assert result["sap_customer_identifier"].iloc[0] == "Zürich"
+    pd.testing.assert_frame_equal(result.iloc[1:], orders.iloc[1:])
@@ -0,0 +1,29 @@
+# This file contains the tests of the deck cache key
+
+from deck_audit.deck_cache import DeckCache
+from deck_audit.engine import DeckAudit
+from synthetic_deck import make_customers, make_parameters
+
+
+RULES = [{"name": "idi_customer", "action": "remove", "when": {"field": "sap_customer_identifier", "in_set": "customer_info.idi_customers"}},
+         {"name": "already_correct", "action": "remove", "when": {"check": "already_correct"}}]
+
+
+def cache_key(source, parameters):
+    return DeckCache(source.parent / "cache").key(source, DeckAudit(parameters).clean_inputs())
+
+
+def test_key_follows_the_values_the_rules_resolve(tmp_path):
+    customers = make_customers(20)
+    parameters = dict(make_parameters(customers), rules=RULES)
+    source = tmp_path / "deck.csv"
+    source.write_text("external_id\n1\n")
+    key = cache_key(source, parameters)
+
+    # The rule text is unchanged in both edits
+    other_customers = dict(parameters, customer_info={"idi_customers": customers[:3]})
+    other_threshold = dict(parameters, query_input=dict(parameters["query_input"], orders_at_high_pri={"None": {"pri": 701, "excluded_cust": []}}))
+
+    assert cache_key(source, parameters) == key
+    assert cache_key(source, other_customers) != key
+    assert cache_key(source, other_threshold) != key
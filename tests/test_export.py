@@ -0,0 +1,43 @@
+# This file contains the tests of the single export of the Rivedo output, run on in-memory tables without arcpy
+
+import json
+
+from collections import Counter
+
+from deck_audit.rules import RuleSet
+from deck_audit.schema_plan import SchemaPlanner, export_planned_rows
+from run_benchmarks import column_calculator, per_column_columns
+from synthetic_deck import MemoryTables, make_customers, make_deck, make_hotlist, make_parameters
+
+
+def test_single_export_matches_one_pass_per_column(tmp_path):
+    customers = make_customers(50)
+    orders = make_deck(400, customers)
+    orders["SHAPE"] = [(float(number), 0.0) for number in range(len(orders))]
+    hotlist = make_hotlist(orders, share=0.05)
+    parameters = make_parameters(customers)
+
+    config_file = tmp_path / "Sensitive_Parameters.json"
+    config_file.write_text(json.dumps(parameters))
+    calculator = column_calculator(config_file)
+    rules = RuleSet.from_config(parameters, {"hotlist": hotlist})
+
+    source_fields = [(column, "String" if orders[column].dtype == object else "Integer", 12) for column in orders.columns if column != "SHAPE"]
+    plan = SchemaPlanner(str(tmp_path / "plans.json")).plan(source_fields, [(spec.field_name, spec.field_type) for spec in calculator.specs], ["external_id"])
+
+    tables = MemoryTables({"orders": orders})
+    kept, removed, collected = export_planned_rows("orders", "Rivedo.shp", plan, rules, calculator, collect=["external_id"], tables=tables)
+    output = tables.output("Rivedo.shp")
+    output.columns = plan.field_names + ["SHAPE"]
+
+    # The reference removes the rows first, then fills each new column in its own pass as CalculateField does
+    reasons = rules.removal_reasons(orders)
+    survivors = orders[[reason is None for reason in reasons]]
+    expected = per_column_columns(calculator, survivors)
+
+    assert removed == dict(Counter(reason for reason in reasons if reason is not None))
+    assert {"hotlist", "idi_customer", "excluded_priority", "already_correct"} <= set(removed)
+    assert kept == len(output) == len(survivors)
+    assert output["external_id"].tolist() == survivors["external_id"].tolist() == [row[0] for row in collected]
+    assert output["SHAPE"].tolist() == survivors["SHAPE"].tolist()
+    assert output.loc[:, calculator.fields].values.tolist() == expected
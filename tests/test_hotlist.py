@@ -0,0 +1,51 @@
+# This file contains the tests of the hotlist source fingerprint and the saved hotlist index
+
+from deck_audit import hotlist
+from deck_audit.hotlist import backing_files, load_hotlist, source_fingerprint
+
+
+def write_hotlist(path, solis):
+    path.write_text("soli\n" + "".join(f"{soli}\n" for soli in solis))
+
+
+def test_file_geodatabase_is_backed_by_its_folder(tmp_path):
+    gdb = tmp_path / "Project.gdb"
+    gdb.mkdir()
+    (gdb / "a0000000a.gdbtable").write_bytes(b"data")
+
+    assert backing_files(str(gdb / "Hotlist"), "arcpy") == [str(gdb / "a0000000a.gdbtable")]
+
+
+def test_sources_without_local_files_have_no_fingerprint(tmp_path):
+    connection = tmp_path / "Production.sde"
+    connection.write_text("connection")
+
+    assert backing_files(str(connection / "gis.Hotlist"), "arcpy") is None
+    assert backing_files(str(tmp_path / "missing" / "Hotlist"), "arcpy") is None
+    assert backing_files("memory\\Hotlist", "arcpy") is None
+    assert backing_files("https://services.example.com/arcgis/rest/services/Hotlist/FeatureServer/0", "arcpy") is None
+
+
+def test_saved_index_follows_the_source(tmp_path):
+    source = tmp_path / "hotlist.csv"
+    index_file = tmp_path / "hotlist_index.npz"
+
+    write_hotlist(source, ["1", "2"])
+    assert sorted(load_hotlist(str(source), index_file, kind="csv")) == ["1", "2"]
+    assert load_hotlist(str(source), index_file, kind="csv").fingerprint == source_fingerprint(str(source), "csv")
+
+    write_hotlist(source, ["1", "2", "3"])
+    assert sorted(load_hotlist(str(source), index_file, kind="csv")) == ["1", "2", "3"]
+
+
+def test_source_without_fingerprint_is_read_every_time(tmp_path, monkeypatch):
+    source = tmp_path / "hotlist.csv"
+    index_file = tmp_path / "hotlist_index.npz"
+    monkeypatch.setattr(hotlist, "source_fingerprint", lambda source, kind: None)
+
+    write_hotlist(source, ["1"])
+    assert sorted(load_hotlist(str(source), index_file, kind="csv")) == ["1"]
+    assert not index_file.exists()
+
+    write_hotlist(source, ["1", "2"])
+    assert sorted(load_hotlist(str(source), index_file, kind="csv")) == ["1", "2"]
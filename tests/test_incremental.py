@@ -0,0 +1,56 @@
+# This file contains the tests of the incremental audit snapshot
+
+from deck_audit.columns import ColumnCalculator, ColumnSpec
+from deck_audit.incremental import AuditSnapshot
+
+
+CALCULATOR = ColumnCalculator([ColumnSpec("Rivedo_Pri", "SHORT", "suggest(!tasking_priority!, !ge01!)", "def suggest(priority, ge01): return priority // 10 * 10 + (4 if ge01 else 3)"),
+                               ColumnSpec("End_Digit", "TEXT", "ending(!tasking_priority!, !Rivedo_Pri!)", "def ending(priority, suggested): return 'N' if priority == suggested else 'Y'")])
+
+
+def run(folder, orders, key="config"):
+    """ Computes the new columns of the (external_id, priority, ge01) orders as the single export does, returns the snapshot and the outputs """
+
+    snapshot = AuditSnapshot(folder, key, CALCULATOR.input_fields, CALCULATOR.output_fields)
+    blank_outputs = [None] * len(CALCULATOR.output_fields)
+    outputs = dict()
+
+    for external_id, *inputs in orders:
+        inputs = tuple(inputs)
+        values = snapshot.outputs(external_id, inputs)
+        if values is None:
+            values = tuple(CALCULATOR.calculate(list(inputs) + blank_outputs)[len(inputs):])
+            snapshot.recomputed += 1
+        snapshot.record(external_id, inputs, values)
+        outputs[external_id] = values
+
+    snapshot.save()
+
+    return snapshot, outputs
+
+
+def test_only_changed_orders_are_recomputed(tmp_path):
+    first = [("a", 714, 1), ("b", 723, 0), ("c", 736, 1), ("d", 745, None)]
+    snapshot, outputs = run(tmp_path, first)
+    assert snapshot.counts() == {"inserted": 4, "updated": 0, "deleted": 0, "recomputed": 4}
+
+    # b is reprioritized, c is gone, e is new, a and d are unchanged
+    second = [("a", 714, 1), ("b", 724, 0), ("d", 745, None), ("e", 750, 0)]
+    snapshot, outputs = run(tmp_path, second)
+
+    assert snapshot.counts() == {"inserted": 1, "updated": 1, "deleted": 1, "recomputed": 2}
+    assert outputs == run(tmp_path / "full", second)[1]
+    assert list(tmp_path.glob("*.parquet")) == [tmp_path / "config.parquet"]
+
+    snapshot, outputs = run(tmp_path, second)
+    assert snapshot.counts() == {"inserted": 0, "updated": 0, "deleted": 0, "recomputed": 0}
+
+
+def test_snapshot_of_another_config_is_not_reused(tmp_path):
+    orders = [("a", 714, 1), ("b", 723, 0)]
+    run(tmp_path, orders)
+
+    snapshot, outputs = run(tmp_path, orders, key="changed")
+
+    assert snapshot.counts() == {"inserted": 2, "updated": 0, "deleted": 0, "recomputed": 2}
+    assert list(tmp_path.glob("*.parquet")) == [tmp_path / "changed.parquet"]
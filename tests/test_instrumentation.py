@@ -0,0 +1,35 @@
+# This file contains the tests of the run log written by the audits
+
+import json
+
+import pytest
+
+from Deck_Queries_with_shapefile import Queries
+from deck_audit.cli import main
+from synthetic_deck import make_customers, make_parameters
+
+
+def test_failed_queries_run_is_logged(tmp_path):
+    """ The deck shapefile is missing, the run fails in its first stage and is still written to the run log """
+
+    queries = Queries(make_parameters(make_customers(50)), tmp_path, run=False)
+
+    with pytest.raises(Exception):
+        queries.run_audit()
+
+    record = json.loads(queries.run_log_path.read_text().splitlines()[-1])
+    assert record["workflow"] == "Queries"
+    assert record["error"]
+    assert record["stages"][0]["name"] == "load_and_priority" and "error" in record["stages"][0]
+
+
+def test_failed_command_line_run_is_logged(tmp_path):
+    config = tmp_path / "Sensitive_Parameters.json"
+    config.write_text(json.dumps(make_parameters(make_customers(50))))
+
+    with pytest.raises(Exception):
+        main([str(tmp_path / "missing.csv"), "--config", str(config), "--output-dir", str(tmp_path / "out")])
+
+    record = json.loads((tmp_path / "out" / "Audit_Log.jsonl").read_text().splitlines()[-1])
+    assert record["workflow"] == "deck_audit"
+    assert record["error"]
@@ -0,0 +1,29 @@
+# This file contains the tests of the multi-process audit against the serial one
+
+import pytest
+
+from deck_audit.parallel import ParallelAuditor
+from synthetic_deck import make_customers, make_deck, make_query_input
+
+
+@pytest.mark.parametrize("partition_by", ["customer", "responsiveness"])
+def test_two_workers_match_serial(partition_by):
+    customers = make_customers(100)
+    query_input = make_query_input(customers)
+    orders = make_deck(3000, customers)
+
+    # The results are merged back on the row order, not on the index
+    orders.index = orders["external_id"].str[-6:]
+
+    with ParallelAuditor(query_input) as serial:
+        suggested, mask = serial.audit(orders)
+        _, _, reasons = serial.explain(orders)
+
+    with ParallelAuditor(query_input, 2, partition_by) as parallel:
+        parallel_suggested, parallel_mask = parallel.audit(orders)
+        _, _, parallel_reasons = parallel.explain(orders)
+
+    assert parallel_suggested.equals(suggested)
+    assert parallel_mask.equals(mask)
+    assert parallel_reasons.equals(reasons)
+    assert parallel_suggested.index.equals(orders.index)
@@ -0,0 +1,85 @@
+# This file contains the regression tests of the columnar priority engine and Queries against the original row-wise decision tree
+
+from math import floor
+
+import numpy as np
+import pytest
+
+from Deck_Queries_with_shapefile import Queries
+from deck_audit.compact import CompactSchema
+from deck_audit.priority import PriorityEngine
+from synthetic_deck import make_customers, make_deck, make_parameters
+
+
+@pytest.fixture(scope="module")
+def deck():
+    """ A small synthetic deck and its config, with customers in several digit lists so the list precedence is exercised """
+
+    customers = make_customers(200)
+    parameters = make_parameters(customers, seed=1)
+    orders = make_deck(5000, customers, seed=1)
+
+    # Orders of customers in no list, and of a missing customer id
+    orders.loc[::97, "sap_customer_identifier"] = "unlisted"
+    orders.loc[::101, "sap_customer_identifier"] = None
+
+    return parameters, orders
+
+
+def decision_tree(query_input, priority, cust, ge01, wv02, wv01):
+    """ The original list-walking decision tree of Queries.correct_priority, kept as the reference the customer index is checked against """
+
+    # Sets the middle digit, the lists are checked in this order and the first one holding the customer wins
+    middle_digit = floor((priority - 700)/10)
+    for digit in "1234567890":
+        if cust in query_input["middle_digit_cust_list"].get(digit, []):
+            middle_digit = int(digit)
+            break
+
+    # Sets the ending digit
+    ending_digit = 3 if (ge01 == 0) and (wv02 == 0) and (wv01 == 0) else 4
+    for digit in "1267890":
+        if cust in query_input["ending_digit_cust_list"].get(digit, []):
+            ending_digit = int(digit)
+            break
+
+    return 700 + (middle_digit * 10) + ending_digit
+
+
+def order_rows(orders):
+    return orders[["tasking_priority", "sap_customer_identifier", "ge01", "wv02", "wv01"]].itertuples(index=False)
+
+
+def reference_priorities(parameters, orders):
+    """ Returns the suggested priority of each order from the original decision tree, one row at a time """
+
+    return np.array([decision_tree(parameters["query_inputs"], *row) for row in order_rows(orders)])
+
+
+def test_queries_matches_decision_tree(deck, tmp_path):
+    parameters, orders = deck
+    queries = Queries(parameters, tmp_path, run=False)
+
+    suggested = np.array([queries.correct_priority(*row) for row in order_rows(orders)])
+
+    assert (suggested == reference_priorities(parameters, orders)).all()
+
+
+def test_engine_matches_decision_tree(deck):
+    parameters, orders = deck
+
+    suggested = PriorityEngine(parameters["query_inputs"]).suggested_priority(orders)
+
+    assert (suggested.to_numpy() == reference_priorities(parameters, orders)).all()
+    assert suggested.index.equals(orders.index)
+
+
+def test_engine_matches_decision_tree_on_compact_deck(deck):
+    """ The compact deck has categorical customers and the spacecraft flags packed in one column """
+
+    parameters, orders = deck
+    compact = CompactSchema().compact(orders)
+
+    suggested = PriorityEngine(parameters["query_inputs"]).suggested_priority(compact)
+
+    assert (suggested.to_numpy() == reference_priorities(parameters, orders)).all()
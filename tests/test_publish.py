@@ -0,0 +1,80 @@
+# This file contains the tests of the shapefile publisher versions and rollback
+
+import os
+
+import pytest
+
+from deck_audit import publish as publish_module
+from deck_audit.publish import ShapefilePublisher, content_hash
+
+
+def publish(publisher, content):
+    """ Stages a shapefile whose files hold the given content and publishes it """
+
+    publisher.clear_staging()
+    for extension in [".shp", ".shx", ".dbf"]:
+        with open(f"{publisher.staging_dir}/{publisher.name}{extension}", 'w') as file:
+            file.write(content)
+
+    assert publisher.publish()
+
+
+def published(publisher):
+    with open(f"{publisher.output_dir}/{publisher.name}.shp", 'r') as file:
+        return file.read()
+
+
+def make_publisher(tmp_path):
+    return ShapefilePublisher(tmp_path / "out", "Rivedo", tmp_path / "staging", tmp_path / "versions", keep_versions=3)
+
+
+def test_rollback_steps_back_one_publish_per_call(tmp_path):
+    publisher = make_publisher(tmp_path)
+    for content in ["first", "second", "third"]:
+        publish(publisher, content)
+
+    publisher.rollback()
+    assert published(publisher) == "second"
+
+    publisher.rollback()
+    assert published(publisher) == "first"
+    assert publisher.versions() == []
+
+
+def test_rollback_to_a_version_keeps_the_current_files(tmp_path):
+    publisher = make_publisher(tmp_path)
+    for content in ["first", "second"]:
+        publish(publisher, content)
+
+    first = publisher.versions()[0]
+    publisher.rollback(first)
+    assert published(publisher) == "first"
+
+    publisher.rollback()
+    assert published(publisher) == "second"
+
+
+def test_an_interrupted_swap_puts_the_previous_version_back(tmp_path, monkeypatch):
+    publisher = make_publisher(tmp_path)
+    publish(publisher, "first")
+    published_hash = publisher.published_hash()
+
+    # Fail the rename of the .shx, after the .dbf of the new version is already in place
+    replace = os.replace
+
+    def interrupted(source, destination):
+        if str(source).endswith(".shx") and "staging" in str(source):
+            with open(f"{publisher.output_dir}/Rivedo.dbf", 'r') as file:
+                assert file.read() == "second"
+            raise OSError("interrupted")
+        replace(source, destination)
+
+    monkeypatch.setattr(publish_module.os, "replace", interrupted)
+
+    with pytest.raises(OSError):
+        publish(publisher, "second")
+
+    for extension in [".shp", ".shx", ".dbf"]:
+        with open(f"{publisher.output_dir}/Rivedo{extension}", 'r') as file:
+            assert file.read() == "first"
+    assert publisher.published_hash() == published_hash == content_hash(publisher.output_dir, "Rivedo")
@@ -0,0 +1,71 @@
+# This file contains the tests of the explain mode's reason codes against each branch of the decision tree
+
+import pandas as pd
+
+from deck_audit.engine import DeckAudit
+from deck_audit.priority import REASON_FIELDS, PriorityEngine
+from deck_audit.results_store import flag_orders
+
+
+QUERY_INPUT = {"middle_digit_cust_list": {"3": ["M3"]},
+               "ending_digit_cust_list": {"6": ["E6"]},
+               "orders_at_high_pri": {"None": {"pri": 720, "excluded_cust": ["XH", "XB"]}},
+               "orders_at_low_pri": {"None": {"pri": 780, "excluded_cust": ["XL", "XB"]}}}
+
+# external_id, tasking_priority, customer, responsiveness, ge01, wv01, wv02, then the expected suggested priority and reason codes
+ORDERS = [("no_list_no_craft", 754, "A", "None", 0, 0, 0, 753, "current_priority", "no_spacecraft", "Standard"),
+          ("no_list_craft", 754, "A", "None", 0, 1, 0, 754, "current_priority", "spacecraft", "Standard"),
+          ("middle_list", 714, "M3", "None", 0, 0, 1, 734, "middle_list_3", "spacecraft", "High"),
+          ("ending_list", 754, "E6", "None", 0, 0, 0, 756, "current_priority", "ending_list_6", "Standard"),
+          ("low", 790, "A", "None", 1, 0, 0, 794, "current_priority", "spacecraft", "Low"),
+          ("low_excluded", 790, "XL", "None", 1, 0, 0, 794, "current_priority", "spacecraft", "Excluded_low"),
+          ("low_excluded_high_only", 790, "XH", "None", 1, 0, 0, 794, "current_priority", "spacecraft", "Low"),
+          ("high_excluded", 710, "XH", "None", 1, 0, 0, 714, "current_priority", "spacecraft", "Excluded_high"),
+          ("high_excluded_low_only", 710, "XL", "None", 1, 0, 0, 714, "current_priority", "spacecraft", "High"),
+          ("both_excluded_low", 790, "XB", "None", 1, 0, 0, 794, "current_priority", "spacecraft", "Excluded_low"),
+          ("both_excluded_high", 710, "XB", "None", 1, 0, 0, 714, "current_priority", "spacecraft", "Excluded_high"),
+          ("no_thresholds", 704, "A", "Select", 1, 0, 0, 704, "current_priority", "spacecraft", "Standard")]
+
+COLUMNS = ["external_id", "tasking_priority", "sap_customer_identifier", "responsiveness_level", "ge01", "wv01", "wv02"]
+
+
+def orders():
+    return pd.DataFrame([order[:7] for order in ORDERS], columns=COLUMNS).assign(wv03=0)
+
+
+def expected_reasons():
+    return pd.DataFrame([order[8:] for order in ORDERS], columns=REASON_FIELDS, index=[order[0] for order in ORDERS])
+
+
+def as_text(reasons, external_ids):
+    return reasons.loc[:, REASON_FIELDS].astype(str).set_axis(list(external_ids))
+
+
+def test_reason_codes_of_each_branch():
+    frame = orders()
+
+    suggested, flagged, reasons = PriorityEngine(QUERY_INPUT).explain(frame)
+
+    assert suggested.tolist() == [order[7] for order in ORDERS]
+    pd.testing.assert_frame_equal(as_text(reasons, frame["external_id"]), expected_reasons())
+    assert frame["external_id"][~flagged].tolist() == ["no_list_craft", "no_thresholds"]
+
+
+def test_flagged_orders_keep_the_reason_codes():
+    flags = flag_orders(orders(), QUERY_INPUT, explain=True)
+
+    expected = expected_reasons().drop(["no_list_craft", "no_thresholds"])
+    pd.testing.assert_frame_equal(as_text(flags, flags["external_id"]), expected)
+
+
+def test_audit_explain_writes_the_reason_codes(tmp_path):
+    audit = DeckAudit({"query_input": QUERY_INPUT, "columns_to_display": ["external_id", "tasking_priority"], "excluded_priorities": [], "explain": True})
+
+    flagged = audit.flag_orders(audit.clean_chunks([orders()]))
+    audit.write_reasons(flagged, tmp_path / "flag_reasons.parquet")
+    written = pd.read_parquet(tmp_path / "flag_reasons.parquet")
+
+    expected = expected_reasons().drop(["no_list_craft", "no_thresholds"])
+    pd.testing.assert_frame_equal(as_text(flagged, flagged["external_id"]), expected)
+    pd.testing.assert_frame_equal(as_text(written, written["external_id"]), expected)
+    assert written["wrong_ending"].tolist() == [order[1] % 10 != order[7] % 10 for order in ORDERS if order[0] in expected.index]
@@ -0,0 +1,39 @@
+# This file contains the golden tests of the report table formatter against DataFrame.to_string
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from deck_audit.report import can_format_fast, frame_to_string
+
+
+def mixed_widths():
+    return pd.DataFrame({"external_id": ["1", "123456789012", "42"],
+                         "tasking_priority": np.array([714, 7, 799], dtype="int16"),
+                         "sap_customer_identifier": pd.Categorical(["A", "LONG_CUSTOMER_NAME", "A"]),
+                         "x": [1, 22, 333],
+                         "Suggested_Priority": [714, 704, 733]},
+                        index=[3, 1200, 7])
+
+
+def negative_numbers():
+    return pd.DataFrame({"change": [-5, 10, -100], "label": ["up", "down", "a much longer label"], "n": [0, -1, 2]})
+
+
+def missing_values():
+    return pd.DataFrame({"external_id": ["1", None, "3"], "tasking_priority": [714.0, np.nan, 799.0],
+                         "responsiveness_level": ["None", "Select", None]})
+
+
+@pytest.mark.parametrize("frame", [mixed_widths(), negative_numbers()])
+def test_fast_path_matches_to_string(frame):
+    assert can_format_fast(frame)
+    assert frame_to_string(frame) == frame.to_string()
+
+
+def test_missing_values_fall_back_to_to_string():
+    frame = missing_values()
+
+    assert not can_format_fast(frame)
+    assert frame_to_string(frame) == frame.to_string()
+    assert frame_to_string(frame.iloc[0:0]) == frame.iloc[0:0].to_string()
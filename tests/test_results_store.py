@@ -0,0 +1,57 @@
+# This file contains the tests of the SQLite store of flagged orders and its history queries
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from deck_audit.results_store import FLAG_COLUMNS, ResultsStore
+
+
+NOW = datetime(2026, 10, 1, 12, 0, 0)
+
+
+def flags(*orders):
+    """ Returns a flagged orders dataframe of (external_id, customer, tasking priority, suggested priority) """
+
+    return pd.DataFrame([(ext_id, cust, "None", pri, suggested, True, False, False) for ext_id, cust, pri, suggested in orders], columns=FLAG_COLUMNS)
+
+
+def test_history_queries(tmp_path):
+    with ResultsStore(tmp_path / "results.sqlite") as store:
+        first = store.record_run(flags(("1", "A", 714, 713), ("2", "A", 724, 723), ("3", "B", 734, 733)), {"Orders": 3}, "user", 10, NOW - timedelta(days=40))
+        second = store.record_run(flags(("1", "A", 714, 713), ("2", "A", 725, 723), ("4", "B", 744, 743)), run_time=NOW - timedelta(days=2))
+        third = store.record_run(flags(("1", "A", 714, 713), ("2", "A", 726, 723), ("5", "C", 754, 753)), run_time=NOW - timedelta(days=1))
+
+        assert store.runs() == [(third, (NOW - timedelta(days=1)).isoformat()), (second, (NOW - timedelta(days=2)).isoformat()),
+                                (first, (NOW - timedelta(days=40)).isoformat())]
+        assert store.runs(limit=1) == [(third, (NOW - timedelta(days=1)).isoformat())]
+
+        # Flagged in every run, in the last two only, in an earlier run only
+        assert store.misprioritized_for("1") == (timedelta(days=39), 3)
+        assert store.misprioritized_for("5") == (timedelta(0), 1)
+        assert store.misprioritized_for("3") is None
+        assert store.misprioritized_for("9") is None
+
+        # The first run falls outside a 30 day window
+        assert store.flag_counts_by_customer(days=30, now=NOW) == {"A": 4, "B": 1, "C": 1}
+        assert store.flag_counts_by_customer(days=60, now=NOW) == {"A": 6, "B": 2, "C": 1}
+        assert store.orders_flagged_for_customer("B", days=30, now=NOW) == ["4"]
+        assert store.orders_flagged_for_customer("B", days=60, now=NOW) == ["3", "4"]
+
+        assert store.changes_since_previous() == {"new": ["5"], "resolved": ["4"], "changed": ["2"]}
+
+        store.prune(keep_days=(datetime.now() - NOW).days + 10)
+        assert [run_id for run_id, run_time in store.runs()] == [third, second]
+        assert store.flag_counts_by_customer(days=60, now=NOW) == {"A": 4, "B": 1, "C": 1}
+
+
+def test_null_customers_and_priorities_are_stored_as_null(tmp_path):
+    with ResultsStore(tmp_path / "results.sqlite") as store:
+        store.record_run(flags(("1", None, 714, 713), ("2", "A", None, None), ("3", float("nan"), 724, 723)), run_time=NOW - timedelta(days=1))
+        store.record_run(flags(("1", None, 714, 713), ("2", "A", None, None), ("3", float("nan"), 724, 723)), run_time=NOW)
+
+        stored = store.connection.execute("SELECT external_id, customer, tasking_priority, suggested_priority FROM flags ORDER BY run_id, external_id").fetchall()
+
+        assert stored[:3] == [("1", None, 714, 713), ("2", "A", None, None), ("3", None, 724, 723)]
+        assert store.flag_counts_by_customer(days=30, now=NOW) == {None: 4, "A": 2}
+        assert store.changes_since_previous() == {"new": [], "resolved": [], "changed": []}
@@ -0,0 +1,104 @@
+# This file contains the tests of the remove rules evaluated over arcpy cursor rows
+
+import pandas as pd
+
+from deck_audit import rules
+from deck_audit.row_filter import cursor_row_reason
+from deck_audit.compact import CompactSchema
+from deck_audit.rules import CHECKS, RuleSet, legacy_rules
+
+
+FIELDS = ["external_id", "tasking_priority", "sap_customer_identifier", "responsiveness_level", "ge01", "wv01", "wv02", "wv03"]
+
+CONFIG = {"excluded_priorities": [800],
+          "customer_info": {"idi_customers": ["IDI"]},
+          "query_input": {"middle_digit_cust_list": {"3": ["M3"]},
+                          "ending_digit_cust_list": {"6": ["E6"]},
+                          "orders_at_high_pri": {"None": {"pri": 700, "excluded_cust": []}},
+                          "orders_at_low_pri": {"None": {"pri": 790, "excluded_cust": []}}}}
+
+
+def rule_set():
+    return RuleSet(legacy_rules(CONFIG), CONFIG, {"hotlist": ["HOT"]})
+
+
+def test_already_correct_on_cursor_rows():
+    """ A cursor row ends with the geometry, the check values must not be read from it """
+
+    reason = cursor_row_reason(rule_set(), FIELDS)
+    geometry = object()
+
+    # Customer in no list with spacecraft set: suggested priority keeps the middle digit and ends in 4
+    assert reason(("x", 714, "A", "None", 1, 1, 1, 1, geometry)) == "already_correct"
+    assert reason(("x", 713, "A", "None", 1, 1, 1, 1, geometry)) is None
+    assert reason(("x", 736, "M3", "None", 1, 0, 0, 0, geometry)) is None
+    assert reason(("x", 734, "M3", "None", 1, 0, 0, 0, geometry)) == "already_correct"
+
+
+def test_cursor_rows_match_rows_without_geometry():
+    rules = rule_set()
+    reason = rules.row_reason(FIELDS)
+    cursor_reason = cursor_row_reason(rules, FIELDS)
+
+    rows = [("HOT", 714, "A", "None", 1, 1, 1, 1), ("x", 714, "IDI", "None", 1, 1, 1, 1), ("x", 800, "A", "None", 1, 1, 1, 1),
+            ("x", 714, "A", "None", 0, 0, 0, 0), ("x", 714, "A", "None", 1, 1, 1, 1), ("x", 795, "A", "None", 1, 1, 1, 1),
+            ("x", 766, "E6", "None", 1, 0, 0, 0), ("x", 764, "E6", "None", 1, 0, 0, 0)]
+
+    assert [cursor_reason(row + (None,)) for row in rows] == [reason(row) for row in rows]
+    assert [reason(row) for row in rows] == ["hotlist", "idi_customer", "excluded_priority", "no_spacecraft", "already_correct", None,
+                                             "already_correct", None]
+
+
+def test_metrics_over_several_row_blocks(monkeypatch):
+    monkeypatch.setattr(rules, "ROW_BLOCK", 3)
+    config = dict(CONFIG, metrics={"Orders": ["", 0], "High": ["tasking_priority < 720", 0], "Wrong ending": ["tasking_priority = 713", 0]})
+    rows = [("x", 700 + number, "A", "None", 1, 1, 1, 1) for number in range(20)]
+
+    result = RuleSet.from_config(config, {"hotlist": []}).evaluate_rows(rows, FIELDS)
+
+    assert result.counts == {"Orders": 0, "High": 20, "Wrong ending": 1}
+    assert result.rows == 20
+    assert list(result.timings) == ["Orders", "High", "Wrong ending"]
+
+
+def test_checks_of_a_level_missing_from_the_config_match_the_engine():
+    config = dict(CONFIG, rules=[{"name": check, "action": "metric", "when": {"check": check}} for check in ["too_high", "too_low", "already_correct"]])
+    rows = [("x", 704, "A", "Select", 1, 1, 1, 1), ("x", 794, "A", "Select", 1, 1, 1, 1), ("x", 794, "A", None, 1, 1, 1, 1)]
+    rule_set = RuleSet.from_config(config)
+
+    by_rows = rule_set.evaluate_rows(rows, FIELDS).counts
+    masks = rule_set.evaluate_frame(pd.DataFrame(rows, columns=FIELDS))
+
+    assert by_rows == {name: int(mask.sum()) for name, mask in masks.items()}
+    assert by_rows == {"too_high": 0, "too_low": 0, "already_correct": 3}
+
+
+def test_already_correct_of_a_level_without_a_low_threshold():
+    """ A Select order too high for its level must not be removed as already correct, even with no Select low threshold """
+
+    query_input = dict(CONFIG["query_input"], orders_at_high_pri={"None": {"pri": 700, "excluded_cust": []}, "Select": {"pri": 730, "excluded_cust": []}})
+    config = dict(CONFIG, query_input=query_input, rules=[{"name": "ac", "action": "remove", "when": {"check": "already_correct"}}])
+    rows = [("x", 714, "A", "Select", 1, 1, 1, 1), ("x", 734, "A", "Select", 1, 1, 1, 1), ("x", 714, "A", "None", 1, 1, 1, 1)]
+    rule_set = RuleSet.from_config(config)
+
+    by_rows = [rule_set.row_reason(FIELDS)(row) for row in rows]
+    by_frame = rule_set.removal_reasons(pd.DataFrame(rows, columns=FIELDS)).tolist()
+
+    assert by_frame == by_rows == [None, "ac", "ac"]
+
+
+def test_checks_on_a_compact_chunk_match_the_rows():
+    """ The compact chunk holds the responsiveness levels as a categorical, every level has both thresholds """
+
+    query_input = dict(CONFIG["query_input"], orders_at_high_pri={"None": {"pri": 700, "excluded_cust": []}, "Select": {"pri": 720, "excluded_cust": []}},
+                       orders_at_low_pri={"None": {"pri": 790, "excluded_cust": []}, "Select": {"pri": 780, "excluded_cust": []}})
+    config = dict(CONFIG, query_input=query_input, rules=[{"name": check, "action": "metric", "when": {"check": check}} for check in CHECKS])
+    rows = [("x", 695 + number, customer, level, number % 2, 0, int(number % 3 == 0), 0)
+            for number in range(100) for customer, level in [("A", "None"), ("M3", "Select"), ("E6", "None")]]
+    frame = pd.DataFrame(rows, columns=FIELDS)
+    rule_set = RuleSet.from_config(config)
+
+    masks = rule_set.evaluate_frame(CompactSchema().compact(frame))
+
+    assert {name: int(mask.sum()) for name, mask in masks.items()} == rule_set.evaluate_rows(rows, FIELDS).counts
+    assert all(mask.any() for mask in masks.values())
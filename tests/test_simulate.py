@@ -0,0 +1,61 @@
+# This file contains the tests of the what-if simulation of config variants against the priority engine
+
+import pytest
+
+from deck_audit import simulate
+from deck_audit.compact import CompactSchema
+from deck_audit.config import AuditConfig
+from deck_audit.priority import PriorityEngine
+from deck_audit.simulate import ConfigSimulation
+from synthetic_deck import make_customers, make_deck, make_parameters
+
+
+@pytest.fixture(scope="module")
+def deck():
+    customers = make_customers(100)
+    return AuditConfig(make_parameters(customers)), make_deck(4000, customers)
+
+
+def engine_counts(query_input, orders):
+    """ Returns the flag counts of the priority engine under the given query inputs, the reference of the simulation """
+
+    engine = PriorityEngine(query_input)
+    suggested = engine.suggested_priority(orders)
+    wrong_ending = (orders["tasking_priority"] % 10) != (suggested % 10)
+    too_high, too_low = engine.too_high(orders), engine.too_low(orders)
+
+    return {"flagged": int((wrong_ending | too_high | too_low).sum()), "wrong_ending": int(wrong_ending.sum()),
+            "too_high": int(too_high.sum()), "too_low": int(too_low.sum())}
+
+
+def test_variant_equal_to_the_config_changes_nothing(deck, monkeypatch):
+    config, orders = deck
+    monkeypatch.setattr(simulate, "ROW_BLOCK", 1500)
+
+    variants = {"empty": {}, "restated": {"orders_at_high_pri": config.query_input["orders_at_high_pri"]}}
+    counts = ConfigSimulation(config, orders, variants).run().counts()
+
+    assert counts.loc["empty"].equals(counts.loc["current"])
+    assert counts.loc["restated"].equals(counts.loc["current"])
+    assert counts.loc["current", ["flagged", "wrong_ending", "too_high", "too_low"]].to_dict() == engine_counts(config.query_input, orders)
+    assert counts[["newly_flagged", "no_longer_flagged", "priority_changed", "orders_changed"]].eq(0).all().all()
+
+
+def test_threshold_shift_changes_the_high_counts(deck):
+    config, orders = deck
+    shifted = {level: {"pri": settings["pri"] + 5} for level, settings in config.query_input["orders_at_high_pri"].items()}
+
+    simulation = ConfigSimulation(config, CompactSchema().compact(orders), {"high_plus_5": {"orders_at_high_pri": shifted}}).run()
+    counts = simulation.counts()
+
+    variant_input = simulate.merge_settings(config.query_input, {"orders_at_high_pri": shifted})
+    expected = engine_counts(variant_input, orders)
+
+    assert counts.loc["high_plus_5", ["flagged", "wrong_ending", "too_high", "too_low"]].to_dict() == expected
+    assert counts.loc["high_plus_5", "too_high"] > counts.loc["current", "too_high"]
+
+    # Only the high check moved: more orders are flagged, none stop being flagged and no suggested priority changes
+    assert counts.loc["high_plus_5", "no_longer_flagged"] == 0
+    assert counts.loc["high_plus_5", "priority_changed"] == 0
+    assert counts.loc["high_plus_5", "orders_changed"] == counts.loc["high_plus_5", "too_high"] - counts.loc["current", "too_high"] > 0
+    assert len(simulation.diff("high_plus_5")) == counts.loc["high_plus_5", "orders_changed"]
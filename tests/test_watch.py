@@ -0,0 +1,35 @@
+# This file contains the tests of the watch mode re-running the audit from the stage a change affects
+
+import json
+
+from deck_audit.watch import DeckWatcher
+from synthetic_deck import make_customers, make_deck, make_parameters
+
+
+def write_config(path, parameters, idi_customers):
+    parameters = dict(parameters, customer_info={"idi_customers": idi_customers})
+    path.write_text(json.dumps(parameters))
+
+
+def test_editing_a_rule_set_cleans_the_deck_again(tmp_path):
+    customers = make_customers(20)
+    deck = make_deck(500, customers)
+    deck.to_csv(tmp_path / "deck.csv", index=False)
+
+    parameters = dict(make_parameters(customers), rules=[{"name": "idi_customer", "action": "remove",
+                                                          "when": {"field": "sap_customer_identifier", "in_set": "customer_info.idi_customers"}}])
+    config = tmp_path / "Sensitive_Parameters.json"
+    write_config(config, parameters, [customers[0]])
+
+    watcher = DeckWatcher(str(tmp_path / "deck.csv"), str(config), tmp_path / "out")
+    first = watcher.run_once(set(watcher.inputs))
+    kept = sum(len(chunk) for chunk in watcher.cleaned)
+    assert first["error"] is None
+    assert kept == (deck["sap_customer_identifier"] != customers[0]).sum()
+
+    # Only the contents of the set change, the rule itself is the same
+    write_config(config, parameters, [customers[0], customers[1]])
+    second = watcher.run_once({"config"})
+
+    assert second["stages_run"] == ["clean", "flag", "report"]
+    assert sum(len(chunk) for chunk in watcher.cleaned) == (~deck["sap_customer_identifier"].isin(customers[:2])).sum()